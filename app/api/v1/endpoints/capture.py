@@ -1,16 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Query, Form
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Query, Form, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from typing import List, Optional, Any, Dict
 from app.api.deps import get_db, get_current_tenant
 from app.schemas.tenant import Tenant
 from app.models.conversation import ConversationRead, ConversationDetails
 from app.crud.crud_audio import crud_audio
+from app.crud.crud_conversation import crud_conversation
 from app.schemas.audio import Audio
 from app.models.audio import AudioCreate
 from app.models.line import LineRead
 from app.models.search_history import SearchHistoryRead
 from app.services.conversation_service import ConversationService
 from app.services.plan_service import PlanService
+from app.utils.progress import stream_progress
 
 router = APIRouter()
 
@@ -72,6 +75,29 @@ async def get_recording_details(
             detail=f"Recording not found: {str(e)}"
         )
 
+@router.get("/recordings/{conversation_id}/events")
+async def stream_recording_events(
+    conversation_id: int,
+    request: Request,
+    current_tenant: Tenant = Depends(get_current_tenant),
+    db: Session = Depends(get_db)
+):
+    """以 SSE 推送录音处理进度（preprocess / transcribe / segment_analysis / conversation_summary），替代轮询 /recordings"""
+    conversation = crud_conversation.get(db, conversation_id)
+    if not conversation or str(conversation.tenant_id) != str(current_tenant.id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Recording not found"
+        )
+    audio_id = conversation.audio_id
+    # 推送期间不占用数据库连接
+    db.close()
+    return StreamingResponse(
+        stream_progress(audio_id, request),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.get("/recordings/{conversation_id}/basic_summary", response_model=str)
 async def get_basic_summary(
     conversation_id: int,
@@ -39,6 +39,7 @@ class Settings(BaseSettings):
     DATABASE_POOL_OVERFLOW: int = 20
     DATABASE_POOL_TIMEOUT: int = 30
     DATABASE_POOL_RECYCLE: int = 3600
+    LINE_INSERT_CHUNK_SIZE: int = 1000  # 转写结果批量入库时每条 INSERT 的行数
 
     @field_validator("DATABASE_URL", mode="before")
     @classmethod
@@ -85,6 +86,49 @@ class Settings(BaseSettings):
     ASR_SERVICE_URL: Optional[str] = None
     ASR_API_KEY: Optional[str] = None
 
+    # 转写服务 HTTP 客户端配置（后端地址/密钥见 TRANSCRIBE_BACKEND / WHISPERX_URL / ASSEMBLYAI_*）
+    TRANSCRIBE_CONNECT_TIMEOUT: float = 10.0  # 建立连接超时（秒）
+    TRANSCRIBE_READ_TIMEOUT: float = 1800.0  # 读取响应超时（秒），WhisperX 同步转写长录音需较长
+    TRANSCRIBE_POOL_SIZE: int = 8  # 每个后端的 keep-alive 连接池大小
+    TRANSCRIBE_CHUNK_SEC: float = 0.0  # >0 时按静音边界把预处理音频切成约该长度（秒）的分块并行转写；0 关闭
+    TRANSCRIBE_CHUNK_OVERLAP_SEC: float = 30.0  # 每块重传上一块末尾的时长（秒），用于跨块对齐说话人；未在重叠段说话的人会得到新标签
+    TRANSCRIBE_CHUNK_WORKERS: int = 4  # 分块并行转写的并发请求数
+    TRANSCRIBE_CHUNK_ATTEMPTS: int = 3  # 每个分块的最大尝试次数（只重试失败的分块）
+    TRANSCRIBE_ASYNC_POLL: bool = True  # AssemblyAI 提交后释放 worker，由 collect_transcription 以 countdown 重试轮询
+    ASSEMBLYAI_POLL_INITIAL: float = 1.0  # 轮询初始间隔（秒），之后指数退避
+    ASSEMBLYAI_POLL_MAX: float = 30.0  # 轮询最大间隔（秒）
+    ASSEMBLYAI_POLL_TIMEOUT: float = 3600.0  # 轮询总超时（秒）
+
+    # 结果缓存配置（转写 / LLM 等外部调用结果，zlib 压缩存储）
+    RESULT_CACHE_DIR: str = "./result_cache"  # disk 后端的缓存目录
+    RESULT_CACHE_REDIS_URL: Optional[str] = None  # redis 后端地址，为空则使用 CELERY_BROKER_URL
+    TRANSCRIPT_CACHE_BACKEND: str = "disk"  # 转写结果缓存：disk / redis / none（关闭）
+    TRANSCRIPT_CACHE_TTL_SEC: float = 30 * 24 * 3600.0  # 转写结果缓存有效期（秒）
+    TRANSCRIPT_CACHE_MAX_MB: float = 512.0  # disk 后端容量上限（MB），超出后按最近最少使用淘汰
+    LLM_CACHE_BACKEND: str = "disk"  # LLM 响应缓存：memory（进程内 LRU）/ disk / redis / none（关闭）
+    LLM_CACHE_TTL_SEC: float = 7 * 24 * 3600.0  # LLM 响应缓存默认有效期（秒），调用方可单独指定
+    LLM_CACHE_MAX_MB: float = 256.0  # memory / disk 后端容量上限（MB）
+    LLM_CACHE_MAX_TEMPERATURE: float = 0.5  # 温度高于此值的调用（创意类文本）默认不缓存
+
+    # 音频预处理配置
+    VAD_MODEL_PATH: Optional[str] = None  # 本地 silero_vad.jit 或 silero-vad 仓库目录；为空则使用 silero-vad 包自带权重
+    VAD_WARMUP_ON_WORKER_INIT: bool = True  # worker 子进程启动时预加载 VAD 模型
+    VAD_WORKERS: int = 1  # 长录音分块并行 VAD 的线程数，1 表示单线程整段检测
+    PREPROCESS_STREAMING: bool = False  # 分块流式预处理，内存占用与录音时长无关（适合全天录音）
+    PREPROCESS_STREAM_WINDOW_SEC: float = 300.0  # 流式模式下 VAD 窗口长度（秒），决定内存上限
+    PREPROCESS_STRETCH_WORKERS: int = 1  # 分组变速（time-stretch）的并行线程数
+    PREPROCESS_BYPASS_MIN_SAVINGS: float = 0.05  # VAD 可裁剪比例低于该值时跳过预处理，直接转写原始文件；0 关闭
+    PREPROCESS_OUTPUT_CODEC: str = "wav"  # 预处理输出编码：wav / flac（无损）/ opus（有损，上传体积最小）
+    PREPROCESS_OPUS_BITRATE: str = "32k"  # opus 编码码率
+    PREPROCESS_CACHE_DIR: str = "./preprocess_cache"  # 预处理结果缓存目录（按源文件内容哈希 + 参数索引）
+    PREPROCESS_CACHE_MAX_MB: float = 2048.0  # 缓存容量上限（MB），超出后按最近最少使用淘汰；<=0 关闭缓存
+    PREPROCESS_CACHE_GRACE_SEC: float = 3600.0  # 最近该时长内被使用的条目不淘汰（可能仍在上传 / 转写）
+
+    # 处理进度推送（Redis pub/sub + SSE /capture/recordings/{id}/events）
+    PROGRESS_EVENTS_ENABLED: bool = True
+    PROGRESS_REDIS_URL: Optional[str] = None  # 为空则使用 CELERY_BROKER_URL
+    PROGRESS_SSE_KEEPALIVE_SEC: float = 15.0  # SSE 心跳间隔（秒），防止代理断开空闲连接
+
     # Celery 配置
     CELERY_BROKER_URL: str = "redis://localhost:6379/0"
     CELERY_RESULT_BACKEND: str = "redis://localhost:6379/0"
@@ -100,6 +144,8 @@ class Settings(BaseSettings):
     ANALYSIS_TEMPERATURE: float = 0.2
     ANALYSIS_MAX_TOKENS: int = 4096
     ANALYSIS_MODEL_NAME: str = "gpt-3.5-turbo"
+    ANALYSIS_PARALLEL_WORKERS: int = 1  # >1 时长对话按重叠窗口并行分析（并发 LLM 请求数）；1 为顺序模式
+    ANALYSIS_OVERLAP_TOKENS: int = 1500  # 并行模式下相邻窗口重叠的 utterance token 数
 
     # ✅ pydantic-settings v2 的写法
     model_config = SettingsConfigDict(
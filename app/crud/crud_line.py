@@ -1,5 +1,5 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import text, or_
+from sqlalchemy import text, or_, insert
 from typing import List, Optional, Any, Dict, Union
 from datetime import datetime
 from app.schemas.line import Line
@@ -59,6 +59,34 @@ class CRUDLine:
         
         return db_objs
     
+    def bulk_insert(
+        self,
+        db: Session,
+        *,
+        lines_data: List[Dict[str, Any]],
+        chunk_size: int = 1000
+    ) -> List[int]:
+        """
+        批量写入文本行：按 chunk_size 分块执行 INSERT ... VALUES (...), (...) RETURNING id，
+        全部在同一个事务中提交一次。不创建 ORM 对象、不逐行 refresh，适合转写结果入库。
+        返回与 lines_data 顺序一致的 id 列表。
+        """
+        if not lines_data:
+            return []
+        # 多行 INSERT 要求每行字段一致，缺失字段补 None
+        columns = sorted({key for line_data in lines_data for key in line_data})
+        rows = [{column: line_data.get(column) for column in columns} for line_data in lines_data]
+        stmt = insert(Line).returning(Line.id, sort_by_parameter_order=True)
+        ids: List[int] = []
+        try:
+            for start in range(0, len(rows), chunk_size):
+                ids.extend(db.execute(stmt, rows[start:start + chunk_size]).scalars().all())
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        return ids
+
     def get_multi_by_segment(
         self,
         db: Session,
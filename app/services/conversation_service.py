@@ -13,6 +13,7 @@ from app.services.storage_service import StorageService
 from app.services.transcription_service import TranscriptionService
 from app.workers.tasks import transcription_tasks, analysis_tasks, graph_tasks
 from app.utils.tools import format_duration, format_datetime
+from app.utils.progress import publish_progress
 from datetime import datetime, timezone
 
 
@@ -82,6 +83,9 @@ class ConversationService:
         }
         conversation = crud_conversation.create(db=self.db, obj_in=conversation_obj)
         print("Audio created:", audio.id)
+        # 先写入 queued 状态覆盖该录音上一次处理留下的最终事件，
+        # 避免在新任务发布第一个事件前连上的 SSE 客户端收到旧的 completed/failed 后立即断开
+        publish_progress(audio.id, "preprocess", "queued")
         # 异步触发音频分析和智能分析任务（串联，分析需等音频处理完）
         # 只传递 audio.id，worker 端任务内部自行创建 session
         chain(
@@ -16,6 +16,9 @@ from app.crud.crud_reminder import crud_reminder
 from app.crud.crud_line import crud_line
 from app.crud.crud_conversation import crud_conversation
 
+# 首页统计类 LLM 调用的缓存有效期（秒）；提示词包含数据本身，数据变化即换 key
+DASHBOARD_CACHE_TTL = 15 * 60
+
 class MomentService:
     """Core business logic for moments and summary functionality"""
     
@@ -345,7 +348,8 @@ class MomentService:
             """
             
             try:
-                ai_response = chat_with_qwen(categorization_prompt, temperature=0.1)
+                ai_response = chat_with_llm(categorization_prompt, temperature=0.1,
+                                            call_site="moment.time_overview", cache_ttl=DASHBOARD_CACHE_TTL)
                 # Clean response like in retrieval_service
                 if "```json" in ai_response:
                     ai_response = ai_response.split("```json")[1].split("```")[0]
@@ -489,7 +493,8 @@ Positive moments: {'. '.join([line.text[:50] + '...' for line in meaningful_line
 Please write a warm, encouraging paragraph (maximum 120 words) that highlights the user's productivity, positive engagement, and meaningful connections. Focus on their achievements, growth, and relationships. Write in a supportive, personal tone as plain text without any formatting."""
             
             try:
-                recap = chat_with_qwen(recap_prompt, temperature=0.7)
+                # 创意文本，每次刷新希望得到不同表述，不走响应缓存
+                recap = chat_with_llm(recap_prompt, temperature=0.7, use_cache=False)
                 # Clean any potential JSON formatting
                 recap_text = recap.strip()
                 if recap_text.startswith('"') and recap_text.endswith('"'):
@@ -620,7 +625,8 @@ Please write a warm, encouraging paragraph (maximum 120 words) that highlights t
             """
             
             try:
-                ai_response = chat_with_qwen(categorization_prompt, temperature=0.3)
+                ai_response = chat_with_llm(categorization_prompt, temperature=0.3,
+                                            call_site="moment.key_points", cache_ttl=DASHBOARD_CACHE_TTL)
                 # Clean response like in retrieval_service
                 if "```json" in ai_response:
                     ai_response = ai_response.split("```json")[1].split("```")[0]
@@ -753,8 +759,8 @@ Please write a warm, encouraging paragraph (maximum 120 words) that highlights t
                 e.g. "I know that will be hard, but I decided to go for it. - Speaker A, 2025-08-26 20:55:29"
         """
 
-            selected_line = chat_with_qwen(ai_prompt, temperature=0.7,
-            response_format={"type": "text"},system_content="").strip()
+            selected_line = chat_with_llm(ai_prompt, temperature=0.7,
+            response_format={"type": "text"},system_content="", use_cache=False).strip()
 
             # Ensure the output is clean and formatted correctly
             if not selected_line or len(selected_line.strip()) < 10:
@@ -9,6 +9,7 @@ from app.utils.llm_selector import chat_with_llm
 from app.models.moment import Node, Edge, SearchResult
 from app.schemas import Segment, Task, Note, Schedule, Reminder, Conversation, Line
 from app.utils.schema_generator import generate_schema_description
+from app.utils import prompt_registry
 from app.crud.crud_segment import crud_segment
 from app.crud.crud_task import crud_task
 from app.crud.crud_note import crud_note
@@ -19,9 +20,16 @@ from app.crud.crud_relationship import crud_relationship
 from app.crud.crud_conversation import crud_conversation
 
 
+# 模型定义在进程内不变，schema 描述只生成一次
+prompt_registry.register_fragment("schema_description", generate_schema_description)
+
+# LLM 响应缓存有效期（秒）：查询计划只取决于问题和 schema，可长期复用；溯源摘要随数据更新，缓存较短
+PLANNER_CACHE_TTL = 24 * 3600
+SUMMARY_CACHE_TTL = 3600
+
 def _get_system_prompt():
     # Dynamically generate the schema description
-    schema_desc = generate_schema_description()
+    schema_desc = prompt_registry.get_fragment("schema_description")
     
     return f"""
     You are an expert query planner for a PostgreSQL database. Your task is to translate user questions into a structured JSON object that can be used to query the database with SQLAlchemy.
@@ -116,7 +124,7 @@ class Planner:
         prompt = f"{system_prompt}\n\nUser Question: \"{user_input}\"\n\nYour JSON Output:"
 
         try:
-            content = chat_with_qwen(prompt, temperature=0.0)
+            content = chat_with_llm(prompt, temperature=0.0, call_site="retrieval.planner", cache_ttl=PLANNER_CACHE_TTL)
             # Clean the response to get only the JSON
             if "```json" in content:
                 content = content.split("```json")[1].split("```")[0]
@@ -923,7 +931,7 @@ class SegmentAncestryTracker:
         )
 
         print(f"Prompt for summarization: {prompt}")
-        summary = chat_with_qwen(prompt, temperature=0.0)
+        summary = chat_with_llm(prompt, temperature=0.0, call_site="retrieval.path_summary", cache_ttl=SUMMARY_CACHE_TTL)
         return summary
     
     def _generate_path_summary_for_entity(self, source_node, ancestry_path, related_segments, ancestry_path_items):
@@ -997,7 +1005,8 @@ class SegmentAncestryTracker:
             Direct output the plain text summary:
             """
             
-            summary = chat_with_qwen(prompt, temperature=0.2,response_format={"type": "text"},system_content="")
+            summary = chat_with_llm(prompt, temperature=0.2,response_format={"type": "text"},system_content="",
+                                   call_site="retrieval.origin_summary", cache_ttl=SUMMARY_CACHE_TTL)
             
             # Clean the returned content to ensure it's plain text
             summary = summary.strip()
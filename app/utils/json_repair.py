@@ -0,0 +1,239 @@
+# json_repair.py
+# Local repair of almost-JSON LLM output, tried before asking the model to fix its own answer.
+# Handles code fences, prose before/after the object, trailing commas, unescaped quotes and raw
+# control characters inside strings, Python literals, mismatched or missing closing brackets,
+# and truncated output (the incomplete last element is dropped).
+# parse_llm_json() optionally validates the result with a pydantic model and counts outcomes in
+# app.utils.metrics as "<metric>.direct" (valid as returned), "<metric>.repaired" (valid after
+# local repair) and "<metric>.failed" (caller falls back to an LLM fix-up round-trip).
+
+import re
+import json
+from typing import Any, List, Optional, Tuple, Type
+
+from pydantic import BaseModel, ValidationError
+
+from app.utils import metrics
+
+_FENCE_RE = re.compile(r"```[a-zA-Z]*[ \t]*\n?(.*?)(?:```|$)", re.S)
+_CLOSERS = {"{": "}", "[": "]"}
+_OPENERS = {"}": "{", "]": "["}
+_ESCAPES = '"\\/bfnrtu'
+_CONTROL = {"\n": "\\n", "\r": "\\r", "\t": "\\t", "\b": "\\b", "\f": "\\f"}
+_LITERALS = {"True": "true", "False": "false", "None": "null"}
+_VALUE_START = '"{[]-0123456789tfn'
+# 截断输出时最多尝试回退的逗号位置数
+MAX_CUTS = 64
+
+
+class JSONRepairError(ValueError):
+    """Raised when the text cannot be turned into JSON (or does not match the schema) locally."""
+
+
+def strip_code_fences(text: str) -> str:
+    """Content of the first ``` fenced block that contains JSON, else the text unchanged."""
+    if "```" not in text:
+        return text
+    for block in _FENCE_RE.findall(text):
+        if "{" in block or "[" in block:
+            return block
+    return text
+
+
+def _closes_string(text: str, k: int, stack: List[str]) -> bool:
+    """Whether a quote followed by text[k:] ends the string (otherwise it is an unescaped inner quote)."""
+    n = len(text)
+    while k < n and text[k].isspace():
+        k += 1
+    if k >= n or text[k] in ":}]":
+        return True
+    if text[k] != ",":
+        return False
+    k += 1
+    while k < n and text[k].isspace():
+        k += 1
+    if k >= n:
+        return True
+    # 对象中逗号后应是下一个 key，数组中是下一个值
+    return text[k] in ('"}' if stack and stack[-1] == "{" else _VALUE_START)
+
+
+def _drop_trailing_comma(out: List[str], cuts: List[Tuple[int, tuple]]) -> None:
+    j = len(out) - 1
+    while j >= 0 and out[j].isspace():
+        j -= 1
+    if j >= 0 and out[j] == ",":
+        del out[j]
+        if cuts and cuts[-1][0] == j:
+            cuts.pop()
+
+
+def _scan(text: str):
+    """
+    One pass over the first JSON value in text, fixing strings, literals, trailing commas and
+    closing brackets on the way. Stops after the value closes (trailing text is dropped).
+    Returns (pieces, open brackets, ends inside a string, cut points); a cut point is the
+    position of a top-level-safe comma with the brackets open there, used for truncated output.
+    """
+    starts = [i for i in (text.find("{"), text.find("[")) if i >= 0]
+    if not starts:
+        raise JSONRepairError("no JSON object or array found")
+    i, n = min(starts), len(text)
+    out: List[str] = []
+    stack: List[str] = []
+    cuts: List[Tuple[int, tuple]] = []
+    in_string = False
+    while i < n:
+        ch = text[i]
+        if in_string:
+            if ch == "\\":
+                nxt = text[i + 1] if i + 1 < n else ""
+                if nxt and nxt in _ESCAPES:
+                    out.append(ch + nxt)
+                    i += 2
+                else:
+                    out.append("\\\\")
+                    i += 1
+                continue
+            if ch == '"':
+                if _closes_string(text, i + 1, stack):
+                    in_string = False
+                    out.append(ch)
+                else:
+                    out.append('\\"')
+            else:
+                out.append(_CONTROL.get(ch, ch))
+            i += 1
+            continue
+
+        if ch == '"':
+            in_string = True
+        elif ch in _CLOSERS:
+            stack.append(ch)
+        elif ch in _OPENERS:
+            if _OPENERS[ch] not in stack:
+                i += 1  # 多余的右括号
+                continue
+            _drop_trailing_comma(out, cuts)
+            while stack[-1] != _OPENERS[ch]:
+                out.append(_CLOSERS[stack.pop()])  # 补上缺失的右括号
+            stack.pop()
+            if not stack:
+                out.append(ch)
+                break
+        elif ch == ",":
+            cuts.append((len(out), tuple(stack)))
+        elif ch.isalpha():
+            j = i
+            while j < n and text[j].isalnum():
+                j += 1
+            word = text[i:j]
+            out.append(_LITERALS.get(word, word))
+            i = j
+            continue
+        out.append(ch)
+        i += 1
+    return out, stack, in_string, cuts
+
+
+def _close(text: str, stack, in_string: bool) -> str:
+    if in_string:
+        text += '"'
+    text = text.rstrip().rstrip(",").rstrip()
+    if text.endswith(":"):
+        text += " null"
+    return text + "".join(_CLOSERS[c] for c in reversed(stack))
+
+
+def validate(data: Any, schema: Type[BaseModel]) -> Any:
+    """Validate against a pydantic model; returns plain data with only the fields that were present."""
+    try:
+        return schema.model_validate(data).model_dump(exclude_unset=True)
+    except ValidationError as e:
+        raise JSONRepairError(f"schema validation failed: {e}") from e
+
+
+def _candidates(text: str):
+    yield text
+    out, stack, in_string, cuts = _scan(strip_code_fences(text))
+    if not stack and not in_string:
+        yield "".join(out)
+    # 输出被截断（到结尾仍有未闭合的字符串或括号）时，最后一个元素可能不完整（如 [4 实为 [4, 9]），
+    # 不直接补全，而是依次回退到前面的逗号，丢弃不完整的最后一个元素
+    for pos, cut_stack in reversed(cuts[-MAX_CUTS:]):
+        yield _close("".join(out[:pos]), cut_stack, False)
+
+
+def repair_json(text: str, schema: Optional[Type[BaseModel]] = None) -> Any:
+    """
+    Parse text as JSON, repairing common LLM formatting errors locally. With a schema, the
+    first repair candidate that also validates is returned.
+    Raises JSONRepairError if no candidate works (message of the last error).
+    """
+    error = "local JSON repair failed"
+    for candidate in _candidates(text):
+        try:
+            data = json.loads(candidate)
+        except ValueError as e:
+            error = str(e)
+            continue
+        if schema is None:
+            return data
+        try:
+            return validate(data, schema)
+        except JSONRepairError as e:
+            error = str(e)
+    raise JSONRepairError(error)
+
+
+def is_valid_json(text: str, schema: Optional[Type[BaseModel]] = None) -> bool:
+    """
+    cache_if helper for LLM calls: the response parses (and validates) as returned, without
+    repair, so a repaired (possibly lossy) answer is never stored in the response cache.
+    """
+    try:
+        data = json.loads(text)
+        if schema is not None:
+            validate(data, schema)
+        return True
+    except (TypeError, ValueError):
+        return False
+
+
+def parse_llm_json(text: str, schema: Optional[Type[BaseModel]] = None, metric: str = "json_repair") -> Any:
+    """
+    json.loads (+ schema validation), falling back to local repair.
+    Raises JSONRepairError when the caller should fall back to an LLM fix-up call.
+    Args:
+        text: raw LLM response
+        schema: pydantic model the parsed object must satisfy
+        metric: metrics prefix for direct / repaired / failed counters
+    """
+    try:
+        data = json.loads(text)
+        data = validate(data, schema) if schema is not None else data
+        metrics.incr(f"{metric}.direct")
+        return data
+    except (TypeError, ValueError):
+        pass
+    try:
+        data = repair_json(text or "", schema)
+    except JSONRepairError:
+        metrics.incr(f"{metric}.failed")
+        raise
+    metrics.incr(f"{metric}.repaired")
+    return data
+
+
+def get_repair_stats(metric: str = "json_repair") -> dict:
+    """Local-repair success rate: repaired / (repaired + failed), i.e. fix-up calls avoided."""
+    counters = metrics.get_metrics()["counters"]
+    direct = counters.get(f"{metric}.direct", 0)
+    repaired = counters.get(f"{metric}.repaired", 0)
+    failed = counters.get(f"{metric}.failed", 0)
+    return {
+        "direct": direct,
+        "repaired": repaired,
+        "failed": failed,
+        "repair_success_rate": repaired / (repaired + failed) if repaired + failed else 0.0,
+    }
@@ -0,0 +1,104 @@
+# llm_cache.py
+# Content-addressed cache for LLM chat completions, used by chat_with_qwen and chat_with_openai
+# (and therefore chat_with_llm). The key is a hash of model, system prompt, user prompt,
+# temperature, response_format and max_tokens, so identical requests from any worker hit the
+# same entry when the backend is shared (disk on one host, Redis across hosts).
+# Calls with temperature above LLM_CACHE_MAX_TEMPERATURE (creative text) are not cached unless
+# the call site asks for it. Call sites can pass their own TTL.
+# Metrics: llm_cache.hit / llm_cache.miss / llm_cache.bypass, per call site
+# llm_cache.<call_site>.hit / .miss, and llm_cache.saved_input_tokens / saved_output_tokens.
+
+import json
+from typing import Callable, Optional, Tuple
+
+from app.core.config import settings
+from app.utils import metrics
+from app.utils.result_cache import ResultCache, get_result_cache, make_key
+
+NAMESPACE = "llm_cache"
+
+
+def get_llm_cache() -> Optional[ResultCache]:
+    """LLM response cache configured by LLM_CACHE_* (None when disabled)."""
+    return get_result_cache(
+        NAMESPACE,
+        settings.LLM_CACHE_BACKEND,
+        ttl=settings.LLM_CACHE_TTL_SEC,
+        max_mb=settings.LLM_CACHE_MAX_MB,
+    )
+
+
+def llm_cache_key(model, system_content, prompt, temperature, response_format, max_tokens) -> str:
+    return make_key("llm", model, system_content, prompt, float(temperature), response_format, max_tokens)
+
+
+def is_json(text: str) -> bool:
+    """cache_if helper: only keep responses that parse as JSON."""
+    try:
+        json.loads(text)
+        return True
+    except (TypeError, ValueError):
+        return False
+
+
+def cached_completion(
+    complete: Callable[[], Tuple[str, int, int]],
+    model: str,
+    prompt: str,
+    system_content: str,
+    temperature: float,
+    max_tokens: int,
+    response_format: Optional[dict] = None,
+    call_site: Optional[str] = None,
+    ttl: Optional[float] = None,
+    use_cache: Optional[bool] = None,
+    cache_if: Optional[Callable[[str], bool]] = None,
+) -> str:
+    """
+    Return the cached response for this request, or run complete() and cache its result.
+    Args:
+        complete: performs the real call, returns (response_text, input_tokens, output_tokens)
+        call_site: name for per-call-site hit/miss counters (e.g. "retrieval.planner")
+        ttl: time-to-live for this call site (None = LLM_CACHE_TTL_SEC)
+        use_cache: True/False forces caching on/off; None caches only when
+            temperature <= LLM_CACHE_MAX_TEMPERATURE
+        cache_if: only store responses for which cache_if(text) is true (e.g. is_json), so a
+            malformed answer is not replayed on retry
+    """
+    if use_cache is None:
+        use_cache = temperature <= settings.LLM_CACHE_MAX_TEMPERATURE
+    cache = get_llm_cache() if use_cache else None
+    if cache is None:
+        metrics.incr(f"{NAMESPACE}.bypass")
+        return complete()[0]
+
+    key = llm_cache_key(model, system_content, prompt, temperature, response_format, max_tokens)
+    entry = cache.get(key)
+    if entry is not None:
+        if call_site:
+            metrics.incr(f"{NAMESPACE}.{call_site}.hit")
+        metrics.incr(f"{NAMESPACE}.saved_input_tokens", entry.get("input_tokens", 0))
+        metrics.incr(f"{NAMESPACE}.saved_output_tokens", entry.get("output_tokens", 0))
+        return entry["text"]
+
+    if call_site:
+        metrics.incr(f"{NAMESPACE}.{call_site}.miss")
+    text, input_tokens, output_tokens = complete()
+    if text is not None and (cache_if is None or cache_if(text)):
+        cache.set(key, {"text": text, "input_tokens": input_tokens, "output_tokens": output_tokens}, ttl=ttl)
+    return text
+
+
+def get_llm_cache_stats() -> dict:
+    """Hit ratio and token savings of this process, from the metrics counters."""
+    counters = metrics.get_metrics()["counters"]
+    hits = counters.get(f"{NAMESPACE}.hit", 0)
+    misses = counters.get(f"{NAMESPACE}.miss", 0)
+    return {
+        "hits": hits,
+        "misses": misses,
+        "bypassed": counters.get(f"{NAMESPACE}.bypass", 0),
+        "hit_ratio": hits / (hits + misses) if hits + misses else 0.0,
+        "saved_input_tokens": counters.get(f"{NAMESPACE}.saved_input_tokens", 0),
+        "saved_output_tokens": counters.get(f"{NAMESPACE}.saved_output_tokens", 0),
+    }
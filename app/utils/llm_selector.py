@@ -3,7 +3,8 @@ import os
 from app.utils.qianwen_chat import chat_with_qwen
 from app.utils.openai_chat import chat_with_openai
 
-def chat_with_llm(prompt: str, temperature: float = 0.7, max_tokens: int = 16000, system_content: str = "You are a helpful assistant.", response_format: dict = None):
+def chat_with_llm(prompt: str, temperature: float = 0.7, max_tokens: int = 16000, system_content: str = "You are a helpful assistant.", response_format: dict = None,
+                  call_site: str = None, cache_ttl: float = None, use_cache: bool = None, cache_if=None):
     """
     A unified function to chat with an LLM, selected based on the LLM_MODEL environment variable.
 
@@ -13,11 +14,16 @@ def chat_with_llm(prompt: str, temperature: float = 0.7, max_tokens: int = 16000
         max_tokens (int): The maximum number of tokens to generate.
         system_content (str): The system message to set the context for the assistant.
         response_format (dict): The response format to use (e.g., {"type": "json_object"}).
+        call_site (str): Name of the caller, used for per-call-site cache metrics.
+        cache_ttl (float): Cache time-to-live for this call site (None = LLM_CACHE_TTL_SEC).
+        use_cache (bool): Force the response cache on/off; None caches only low-temperature calls.
+        cache_if (callable): Only cache responses for which cache_if(text) is true.
 
     Returns:
         str: The response from the selected LLM.
     """
     llm_model = os.getenv("LLM_MODEL", "QWEN").upper()
+    cache_options = dict(call_site=call_site, cache_ttl=cache_ttl, use_cache=use_cache, cache_if=cache_if)
 
     if llm_model == "QWEN":
         # Qianwen's DashScope compatible API uses the openai library, so we can pass response_format
@@ -27,7 +33,8 @@ def chat_with_llm(prompt: str, temperature: float = 0.7, max_tokens: int = 16000
             prompt=prompt,
             temperature=temperature,
             max_tokens=max_tokens,
-            system_content=system_content
+            system_content=system_content,
+            **cache_options
         )
     elif llm_model == "CHATGPT":
         return chat_with_openai(
@@ -35,7 +42,8 @@ def chat_with_llm(prompt: str, temperature: float = 0.7, max_tokens: int = 16000
             temperature=temperature,
             max_tokens=max_tokens,
             system_content=system_content,
-            response_format=response_format
+            response_format=response_format,
+            **cache_options
         )
     else:
         raise ValueError(f"Unsupported LLM_MODEL: {llm_model}. Please use 'QWEN' or 'CHATGPT'.")
@@ -0,0 +1,70 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Any
+
+# 进程内指标：计数器与数值观测（耗时、字节数等），由 worker/API 自行上报或打印
+_LOCK = threading.Lock()
+_COUNTERS: Dict[str, float] = {}
+_OBSERVATIONS: Dict[str, Dict[str, float]] = {}
+
+
+def incr(name: str, value: float = 1) -> None:
+    """
+    Increase a process-wide counter.
+    Args:
+        name: metric name, e.g. "vad.model_load.count"
+        value: increment
+    """
+    with _LOCK:
+        _COUNTERS[name] = _COUNTERS.get(name, 0) + value
+
+
+def observe(name: str, value: float) -> None:
+    """
+    Record one observation (duration, size, ...) for a metric.
+    Keeps count/sum/min/max/last so the snapshot stays O(1) in memory.
+    Args:
+        name: metric name, e.g. "vad.model_load.seconds"
+        value: observed value
+    """
+    value = float(value)
+    with _LOCK:
+        obs = _OBSERVATIONS.get(name)
+        if obs is None:
+            _OBSERVATIONS[name] = {"count": 1, "sum": value, "min": value, "max": value, "last": value}
+            return
+        obs["count"] += 1
+        obs["sum"] += value
+        obs["min"] = min(obs["min"], value)
+        obs["max"] = max(obs["max"], value)
+        obs["last"] = value
+
+
+@contextmanager
+def timed(name: str):
+    """
+    Context manager that observes the wall-clock duration (seconds) of its body.
+    """
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - t0)
+
+
+def get_metrics() -> Dict[str, Any]:
+    """
+    Return a snapshot of all counters and observations.
+    """
+    with _LOCK:
+        return {
+            "counters": dict(_COUNTERS),
+            "observations": {k: dict(v) for k, v in _OBSERVATIONS.items()},
+        }
+
+
+def reset_metrics() -> None:
+    with _LOCK:
+        _COUNTERS.clear()
+        _OBSERVATIONS.clear()
@@ -1,7 +1,9 @@
 from app.core.config import settings
 import json
-import tiktoken
+import threading
 import openai
+from app.utils import prompt_registry
+from app.utils.llm_cache import cached_completion
 
 # 统一从 config 读取 Azure/OpenAI 配置
 AZURE_OPENAI_ENDPOINT = settings.AZURE_OPENAI_ENDPOINT
@@ -19,46 +21,55 @@ client = client = openai.AzureOpenAI(
 
 LLM_TOTAL_INPUT_TOKENS = 0
 LLM_TOTAL_OUTPUT_TOKENS = 0
+# 并行分析时多个线程同时累加 token 计数
+_TOKEN_LOCK = threading.Lock()
 
 # 统一统计token
 def count_tokens(text, model=None):
-    model = model or AZURE_OPENAI_DEPLOYMENT
-    try:
-        enc = tiktoken.encoding_for_model(model)
-    except Exception:
-        enc = tiktoken.get_encoding("cl100k_base")
-    return len(enc.encode(text))
+    return prompt_registry.count_tokens(text, model or AZURE_OPENAI_DEPLOYMENT)
 
-def chat_with_openai(prompt, temperature=0.7, max_tokens=16000,response_format={"type": "json_object"}, system_content="You are a dialogue analysis expert. You need to reply the answer always in JSON format"):
-    global LLM_TOTAL_INPUT_TOKENS, LLM_TOTAL_OUTPUT_TOKENS
-    response = client.chat.completions.create(
-        model=AZURE_OPENAI_DEPLOYMENT,
-        messages=[
-            {"role": "system", "content": system_content},
-            {"role": "user", "content": prompt}
-        ],
-        temperature=temperature,
-        max_tokens=max_tokens,
-        response_format=response_format
+def chat_with_openai(prompt, temperature=0.7, max_tokens=16000,response_format={"type": "json_object"}, system_content="You are a dialogue analysis expert. You need to reply the answer always in JSON format",
+                     call_site=None, cache_ttl=None, use_cache=None, cache_if=None):
+
+    def complete():
+        global LLM_TOTAL_INPUT_TOKENS, LLM_TOTAL_OUTPUT_TOKENS
+        response = client.chat.completions.create(
+            model=AZURE_OPENAI_DEPLOYMENT,
+            messages=[
+                {"role": "system", "content": system_content},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=temperature,
+            max_tokens=max_tokens,
+            response_format=response_format
+        )
+        response_text = response.choices[0].message.content
+        input_tokens = count_tokens(prompt)
+        output_tokens = count_tokens(response_text)
+        with _TOKEN_LOCK:
+            LLM_TOTAL_INPUT_TOKENS += input_tokens
+            LLM_TOTAL_OUTPUT_TOKENS += output_tokens
+        return response_text, input_tokens, output_tokens
+
+    # 相同请求（模型、提示词、温度、response_format 等）命中缓存时不再调用 API
+    return cached_completion(
+        complete, AZURE_OPENAI_DEPLOYMENT, prompt, system_content, temperature, max_tokens,
+        response_format=response_format, call_site=call_site, ttl=cache_ttl, use_cache=use_cache, cache_if=cache_if
     )
-    response_text = response.choices[0].message.content
-    input_tokens = count_tokens(prompt)
-    output_tokens = count_tokens(response_text)
-    LLM_TOTAL_INPUT_TOKENS += input_tokens
-    LLM_TOTAL_OUTPUT_TOKENS += output_tokens
-    return response_text
 
 def get_llm_token_stats():
     global LLM_TOTAL_INPUT_TOKENS, LLM_TOTAL_OUTPUT_TOKENS
-    return {
-        'input': LLM_TOTAL_INPUT_TOKENS,
-        'output': LLM_TOTAL_OUTPUT_TOKENS
-    }
+    with _TOKEN_LOCK:
+        return {
+            'input': LLM_TOTAL_INPUT_TOKENS,
+            'output': LLM_TOTAL_OUTPUT_TOKENS
+        }
 
 def reset_llm_token_stats():
     global LLM_TOTAL_INPUT_TOKENS, LLM_TOTAL_OUTPUT_TOKENS
-    LLM_TOTAL_INPUT_TOKENS = 0
-    LLM_TOTAL_OUTPUT_TOKENS = 0
+    with _TOKEN_LOCK:
+        LLM_TOTAL_INPUT_TOKENS = 0
+        LLM_TOTAL_OUTPUT_TOKENS = 0
 
 if __name__ == "__main__":
     prompt = """ How are you? """
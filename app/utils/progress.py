@@ -0,0 +1,143 @@
+# progress.py
+# Pipeline progress events for uploaded recordings. Worker tasks publish stage transitions
+# to a Redis pub/sub channel per audio; the API streams them to clients
+# (GET /capture/recordings/{id}/events) instead of clients re-polling /capture/recordings.
+# The latest event is also kept under a key so a client that connects mid-pipeline
+# immediately gets the current state. Dispatching the pipeline overwrites it with a "queued"
+# event, so a previous run's terminal event cannot end a new subscription.
+
+import json
+import time
+import threading
+from typing import Optional
+
+from app.core.config import settings
+
+CHANNEL_PREFIX = "capsoul:progress:"
+LAST_EVENT_PREFIX = "capsoul:progress:last:"
+LAST_EVENT_TTL = 24 * 3600
+
+# 各阶段在整体进度中所占区间（百分比）
+STAGES = {
+    "preprocess": (0, 20),
+    "transcribe": (20, 60),
+    "segment_analysis": (60, 90),
+    "conversation_summary": (90, 100),
+}
+FINAL_STAGE = "conversation_summary"
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def redis_url() -> str:
+    return settings.PROGRESS_REDIS_URL or settings.CELERY_BROKER_URL
+
+
+def channel(audio_id) -> str:
+    return f"{CHANNEL_PREFIX}{audio_id}"
+
+
+def last_event_key(audio_id) -> str:
+    return f"{LAST_EVENT_PREFIX}{audio_id}"
+
+
+def _get_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                import redis
+
+                _client = redis.Redis.from_url(redis_url())
+    return _client
+
+
+def overall_percent(stage: str, stage_percent: float) -> float:
+    """Map a stage-local percentage onto the whole pipeline."""
+    lo, hi = STAGES.get(stage, (0, 100))
+    return round(lo + (hi - lo) * max(0.0, min(100.0, stage_percent)) / 100.0, 1)
+
+
+def is_terminal(event: dict) -> bool:
+    """Pipeline finished (last stage completed) or any stage failed."""
+    return event.get("status") == "failed" or (event.get("stage") == FINAL_STAGE and event.get("status") == "completed")
+
+
+def publish_progress(audio_id, stage: str, status: str, stage_percent: Optional[float] = None, **extra) -> None:
+    """
+    Publish one progress event; never raises (progress reporting must not fail the pipeline).
+    Args:
+        audio_id: recording (audios.id)
+        stage: preprocess / transcribe / segment_analysis / conversation_summary
+        status: queued / started / progress / completed / failed
+        stage_percent: completion within the stage (0-100); defaults from status
+        extra: additional JSON-serialisable fields (e.g. error, segments)
+    """
+    if not settings.PROGRESS_EVENTS_ENABLED:
+        return
+    if stage_percent is None:
+        stage_percent = 100.0 if status == "completed" else 0.0
+    event = {
+        "audio_id": audio_id,
+        "stage": stage,
+        "status": status,
+        "stage_percent": round(float(stage_percent), 1),
+        "percent": overall_percent(stage, stage_percent),
+        "ts": time.time(),
+    }
+    event.update(extra)
+    try:
+        data = json.dumps(event, ensure_ascii=False, default=str)
+        client = _get_client()
+        pipe = client.pipeline(transaction=False)
+        pipe.set(last_event_key(audio_id), data, ex=LAST_EVENT_TTL)
+        pipe.publish(channel(audio_id), data)
+        pipe.execute()
+    except Exception as e:
+        print(f"[progress] publish failed for audio {audio_id}: {e}")
+
+
+def format_sse(event: dict, name: str = "progress") -> str:
+    return f"event: {name}\ndata: {json.dumps(event, ensure_ascii=False, default=str)}\n\n"
+
+
+async def stream_progress(audio_id, request=None, keepalive_sec: Optional[float] = None):
+    """
+    Server-sent events for one recording: the latest known event first, then every new one,
+    until the pipeline finishes or fails or the client disconnects.
+    Comment lines are sent every keepalive_sec so proxies keep the idle connection open.
+    """
+    import redis.asyncio as aioredis
+
+    keepalive_sec = keepalive_sec or settings.PROGRESS_SSE_KEEPALIVE_SEC
+    client = aioredis.Redis.from_url(redis_url())
+    pubsub = client.pubsub()
+    # 先订阅再读最新状态，避免两者之间发布的事件丢失（可能重复一次，客户端按 ts 去重即可）
+    await pubsub.subscribe(channel(audio_id))
+    try:
+        last = await client.get(last_event_key(audio_id))
+        if last is not None:
+            event = json.loads(last)
+            yield format_sse(event)
+            if is_terminal(event):
+                return
+        last_sent = time.monotonic()
+        while True:
+            if request is not None and await request.is_disconnected():
+                return
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            if message is None:
+                if time.monotonic() - last_sent >= keepalive_sec:
+                    yield ": keepalive\n\n"
+                    last_sent = time.monotonic()
+                continue
+            event = json.loads(message["data"])
+            yield format_sse(event)
+            last_sent = time.monotonic()
+            if is_terminal(event):
+                return
+    finally:
+        await pubsub.unsubscribe(channel(audio_id))
+        await pubsub.close()
+        await client.close()
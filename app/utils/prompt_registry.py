@@ -0,0 +1,151 @@
+# prompt_registry.py
+# Process-wide registry of tokenizers and static prompt material.
+# - tiktoken encoders are created once per model.
+# - Fragments (taxonomy brief, relationship definitions, DB schema description, ...) are built
+#   once; file-backed fragments are rebuilt when the file's mtime changes.
+# - Templates are pre-formatted with their fragments, so rendering only inserts the dynamic
+#   fields, and know their own token overhead (the prompt with empty dynamic fields).
+
+import os
+import re
+import string
+import threading
+from typing import Any, Callable, Dict, Iterable, Optional
+
+import tiktoken
+
+DEFAULT_ENCODING = "cl100k_base"
+_SENTINEL_RE = re.compile("\x00(\\w+)\x00")
+
+_lock = threading.RLock()
+_encodings: Dict[str, Any] = {}
+_fragments: Dict[str, "Fragment"] = {}
+_templates: Dict[str, "PromptTemplate"] = {}
+
+
+def get_encoding(model_name: Optional[str] = None):
+    """tiktoken encoder for a model (cl100k_base for unknown models), created once per process."""
+    key = model_name or DEFAULT_ENCODING
+    enc = _encodings.get(key)
+    if enc is None:
+        with _lock:
+            enc = _encodings.get(key)
+            if enc is None:
+                try:
+                    enc = tiktoken.encoding_for_model(model_name) if model_name else tiktoken.get_encoding(DEFAULT_ENCODING)
+                except Exception:
+                    enc = tiktoken.get_encoding(DEFAULT_ENCODING)
+                _encodings[key] = enc
+    return enc
+
+
+def register_encoding(model_name: str, enc) -> None:
+    """Use a given encoder for a model (e.g. a local encoding when BPE files cannot be downloaded)."""
+    with _lock:
+        _encodings[model_name] = enc
+
+
+def count_tokens(text: str, model_name: Optional[str] = None) -> int:
+    return len(get_encoding(model_name).encode(text))
+
+
+class Fragment:
+    """
+    A lazily built value. With a path, it is rebuilt whenever the file's mtime changes
+    (builder receives the path); without, it is built once.
+    """
+
+    def __init__(self, name: str, builder: Callable, path: Optional[str] = None):
+        self.name = name
+        self.builder = builder
+        self.path = path
+        self.version = 0
+        self._mtime = None
+        self._value = None
+        self._loaded = False
+
+    def _current_mtime(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def get(self):
+        mtime = self._current_mtime() if self.path else None
+        if not self._loaded or mtime != self._mtime:
+            with _lock:
+                if not self._loaded or mtime != self._mtime:
+                    self._value = self.builder(self.path) if self.path else self.builder()
+                    self._mtime = mtime
+                    self._loaded = True
+                    self.version += 1
+        return self._value
+
+
+class PromptTemplate:
+    """
+    str.format template whose non-dynamic fields are filled from fragments of the same name.
+    The fragment part is formatted once (again after a fragment reloads); render() only
+    concatenates the dynamic values.
+    """
+
+    def __init__(self, name: str, template: str, dynamic: Iterable[str]):
+        self.name = name
+        self.template = template
+        self.dynamic = tuple(dynamic)
+        self._parts = None
+        self._order = None
+        self._versions = None
+        self._overhead: Dict[str, int] = {}
+
+    def _fragment_names(self):
+        names = {f for _, f, _, _ in string.Formatter().parse(self.template) if f}
+        return sorted(names - set(self.dynamic))
+
+    def _compile(self):
+        fragments = {name: get_fragment(name) for name in self._fragment_names()}
+        versions = {name: _fragments[name].version for name in fragments}
+        if self._parts is not None and versions == self._versions:
+            return
+        text = self.template.format(**fragments, **{f: f"\x00{f}\x00" for f in self.dynamic})
+        # 按占位符切分：[固定片段, 字段, 固定片段, 字段, ...]
+        pieces = _SENTINEL_RE.split(text)
+        with _lock:
+            self._parts, self._order, self._versions = pieces[0::2], pieces[1::2], versions
+            self._overhead = {}
+
+    def render(self, **values) -> str:
+        self._compile()
+        out = [self._parts[0]]
+        for field, part in zip(self._order, self._parts[1:]):
+            out.append(str(values.get(field, "")))
+            out.append(part)
+        return "".join(out)
+
+    def overhead_tokens(self, model_name: Optional[str] = None) -> int:
+        """Tokens of the prompt with all dynamic fields empty."""
+        self._compile()
+        key = model_name or DEFAULT_ENCODING
+        if key not in self._overhead:
+            self._overhead[key] = count_tokens("".join(self._parts), model_name)
+        return self._overhead[key]
+
+
+def register_fragment(name: str, builder: Callable, path: Optional[str] = None) -> None:
+    """Register a fragment; with path, builder(path) is re-run when the file changes."""
+    with _lock:
+        _fragments[name] = Fragment(name, builder, path)
+
+
+def get_fragment(name: str):
+    return _fragments[name].get()
+
+
+def register_template(name: str, template: str, dynamic: Iterable[str]) -> PromptTemplate:
+    with _lock:
+        _templates[name] = PromptTemplate(name, template, dynamic)
+    return _templates[name]
+
+
+def get_template(name: str) -> PromptTemplate:
+    return _templates[name]
@@ -0,0 +1,233 @@
+# result_cache.py
+# Small key/value cache for JSON-serialisable results of expensive external calls
+# (transcription, LLM). Values are stored zlib-compressed, either in process memory
+# or on local disk (TTL + size-bounded LRU eviction), or in Redis (TTL, Redis handles
+# memory limits).
+# Hits and misses are counted in app.utils.metrics as "<namespace>.hit" / "<namespace>.miss".
+
+import os
+import json
+import time
+import zlib
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from app.utils import metrics
+
+_MISSING = object()
+
+
+def hash_file(path: str, chunk_bytes: int = 1024 * 1024) -> str:
+    """sha256 of a file's content, read in chunks."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_bytes), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def make_key(*parts: Any) -> str:
+    """sha256 over the JSON encoding of parts (dicts with sorted keys)."""
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _encode(value: Any) -> bytes:
+    return zlib.compress(json.dumps(value, ensure_ascii=False).encode("utf-8"), 6)
+
+
+def _decode(data: bytes) -> Any:
+    return json.loads(zlib.decompress(data).decode("utf-8"))
+
+
+class ResultCache:
+    """Base class: get/set with hit/miss counters; subclasses implement _get/_set."""
+
+    def __init__(self, namespace: str, ttl: Optional[float] = None):
+        self.namespace = namespace
+        self.ttl = ttl
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            value = self._get(key)
+        except Exception as e:
+            print(f"[{self.namespace}] cache read failed: {e}")
+            value = _MISSING
+        if value is _MISSING:
+            metrics.incr(f"{self.namespace}.miss")
+            return default
+        metrics.incr(f"{self.namespace}.hit")
+        return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        try:
+            self._set(key, value, self.ttl if ttl is None else ttl)
+        except Exception as e:
+            # 缓存写入失败不影响主流程
+            print(f"[{self.namespace}] cache write failed: {e}")
+
+    def _get(self, key: str) -> Any:
+        raise NotImplementedError
+
+    def _set(self, key: str, value: Any, ttl: Optional[float]) -> None:
+        raise NotImplementedError
+
+
+class DiskResultCache(ResultCache):
+    """
+    One compressed file per key under cache_dir/<namespace>/. Expired entries are dropped
+    on read; when the directory exceeds max_bytes the least recently used files are removed.
+    """
+
+    def __init__(self, namespace: str, cache_dir: str, max_bytes: int, ttl: Optional[float] = None):
+        super().__init__(namespace, ttl)
+        self.dir = os.path.join(cache_dir, namespace)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(self.dir, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.dir, key + ".json.z")
+
+    def _get(self, key: str) -> Any:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                entry = _decode(f.read())
+        except FileNotFoundError:
+            return _MISSING
+        if entry.get("expires_at") is not None and entry["expires_at"] < time.time():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return _MISSING
+        os.utime(path)  # mark as recently used
+        return entry["value"]
+
+    def _set(self, key: str, value: Any, ttl: Optional[float]) -> None:
+        entry = {"value": value, "expires_at": time.time() + ttl if ttl else None}
+        fd, tmp = tempfile.mkstemp(dir=self.dir, prefix=".tmp-")
+        with os.fdopen(fd, "wb") as f:
+            f.write(_encode(entry))
+        os.replace(tmp, self._path(key))
+        self.evict()
+
+    def evict(self) -> None:
+        with self._lock:
+            files = []
+            total = 0
+            for e in os.scandir(self.dir):
+                if not e.is_file() or e.name.startswith(".tmp-"):
+                    continue
+                try:
+                    st = e.stat()
+                except OSError:
+                    continue
+                files.append((st.st_mtime, st.st_size, e.path))
+                total += st.st_size
+            if total <= self.max_bytes:
+                return
+            files.sort()
+            for _, size, path in files:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                metrics.incr(f"{self.namespace}.evicted")
+
+
+class MemoryResultCache(ResultCache):
+    """
+    In-process LRU: compressed entries in an OrderedDict, bounded by max_bytes.
+    Not shared between processes; useful for the API server and for tests.
+    """
+
+    def __init__(self, namespace: str, max_bytes: int, ttl: Optional[float] = None):
+        super().__init__(namespace, ttl)
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at, data)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def _get(self, key: str) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return _MISSING
+            expires_at, data = entry
+            if expires_at is not None and expires_at < time.time():
+                del self._entries[key]
+                self._bytes -= len(data)
+                return _MISSING
+            self._entries.move_to_end(key)
+        return _decode(data)
+
+    def _set(self, key: str, value: Any, ttl: Optional[float]) -> None:
+        data = _encode(value)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old[1])
+            self._entries[key] = (time.time() + ttl if ttl else None, data)
+            self._bytes += len(data)
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                metrics.incr(f"{self.namespace}.evicted")
+
+
+class RedisResultCache(ResultCache):
+    """Compressed values under "<prefix>:<namespace>:<key>" with a per-key TTL."""
+
+    def __init__(self, namespace: str, url: str, ttl: Optional[float] = None, prefix: str = "capsoul:cache"):
+        super().__init__(namespace, ttl)
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.prefix = f"{prefix}:{namespace}:"
+
+    def _get(self, key: str) -> Any:
+        data = self.client.get(self.prefix + key)
+        return _MISSING if data is None else _decode(data)
+
+    def _set(self, key: str, value: Any, ttl: Optional[float]) -> None:
+        self.client.set(self.prefix + key, _encode(value), ex=int(ttl) if ttl else None)
+
+
+_CACHES: Dict[str, Optional[ResultCache]] = {}
+_CACHES_LOCK = threading.Lock()
+
+
+def get_result_cache(namespace: str, backend: str, ttl: Optional[float] = None, max_mb: float = 512.0) -> Optional[ResultCache]:
+    """
+    Process-wide cache for a namespace.
+    Args:
+        namespace: key space and metrics prefix (e.g. "transcript_cache")
+        backend: "memory", "disk", "redis" or "none" (caching disabled, returns None)
+        ttl: default time-to-live in seconds (None = no expiry)
+        max_mb: size bound of the memory and disk backends
+    """
+    with _CACHES_LOCK:
+        if namespace not in _CACHES:
+            from app.core.config import settings
+
+            backend = (backend or "none").lower()
+            if backend == "memory":
+                cache = MemoryResultCache(namespace, int(max_mb * 1024 * 1024), ttl)
+            elif backend == "disk":
+                cache = DiskResultCache(namespace, settings.RESULT_CACHE_DIR, int(max_mb * 1024 * 1024), ttl)
+            elif backend == "redis":
+                cache = RedisResultCache(namespace, settings.RESULT_CACHE_REDIS_URL or settings.CELERY_BROKER_URL, ttl)
+            elif backend == "none":
+                cache = None
+            else:
+                raise ValueError(f"Unknown cache backend: {backend}")
+            _CACHES[namespace] = cache
+        return _CACHES[namespace]
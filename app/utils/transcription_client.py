@@ -0,0 +1,291 @@
+# transcription_client.py
+# HTTP clients for the transcription backends (WhisperX, AssemblyAI).
+# One pooled keep-alive requests.Session per backend and process, uploads streamed from
+# disk, explicit connect/read timeouts, and exponential backoff when polling AssemblyAI.
+
+import os
+import time
+import uuid
+import threading
+from typing import Dict, Iterator, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from app.core.config import settings
+from app.utils import metrics
+from app.utils.result_cache import ResultCache, get_result_cache, hash_file, make_key
+
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+
+_SESSIONS: Dict[str, requests.Session] = {}
+_SESSIONS_LOCK = threading.Lock()
+
+
+def get_session(backend: str) -> requests.Session:
+    """
+    Process-wide pooled session for a backend. Connections are kept alive across
+    uploads and polls; idempotent requests are retried on connection errors and 5xx.
+    """
+    session = _SESSIONS.get(backend)
+    if session is None:
+        with _SESSIONS_LOCK:
+            session = _SESSIONS.get(backend)
+            if session is None:
+                session = requests.Session()
+                retry = Retry(
+                    total=3,
+                    backoff_factor=0.5,
+                    status_forcelist=(502, 503, 504),
+                    allowed_methods=frozenset(["GET"]),
+                )
+                adapter = HTTPAdapter(
+                    pool_connections=4,
+                    pool_maxsize=settings.TRANSCRIBE_POOL_SIZE,
+                    max_retries=retry,
+                )
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _SESSIONS[backend] = session
+    return session
+
+
+def default_timeout() -> tuple:
+    """(connect, read) timeout in seconds for transcription requests."""
+    return (settings.TRANSCRIBE_CONNECT_TIMEOUT, settings.TRANSCRIBE_READ_TIMEOUT)
+
+
+def backoff_intervals(initial: float, maximum: float, factor: float = 2.0) -> Iterator[float]:
+    """Poll intervals: initial, initial * factor, ... capped at maximum."""
+    interval = initial
+    while True:
+        yield interval
+        interval = min(interval * factor, maximum)
+
+
+class FileStream:
+    """
+    File body for requests that is read from disk in chunks while sending.
+    Exposes __len__ so requests sends a Content-Length instead of chunked encoding.
+    """
+
+    def __init__(self, path: str, chunk_size: int = UPLOAD_CHUNK_BYTES):
+        self.path = path
+        self.chunk_size = chunk_size
+        self._size = os.path.getsize(path)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __iter__(self) -> Iterator[bytes]:
+        with open(self.path, "rb") as f:
+            while True:
+                chunk = f.read(self.chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+
+class MultipartFileStream:
+    """
+    multipart/form-data body with form fields and one file part, streamed from disk.
+    requests' files= builds the whole body in memory; this keeps only one chunk at a time.
+    """
+
+    def __init__(self, path: str, field: str, fields: Optional[dict] = None, chunk_size: int = UPLOAD_CHUNK_BYTES):
+        self.boundary = uuid.uuid4().hex
+        self.content_type = f"multipart/form-data; boundary={self.boundary}"
+        head = []
+        for name, value in (fields or {}).items():
+            head.append(
+                f'--{self.boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'
+            )
+        head.append(
+            f'--{self.boundary}\r\nContent-Disposition: form-data; name="{field}"; '
+            f'filename="{os.path.basename(path)}"\r\nContent-Type: application/octet-stream\r\n\r\n'
+        )
+        self._head = "".join(head).encode("utf-8")
+        self._tail = f"\r\n--{self.boundary}--\r\n".encode("utf-8")
+        self._file = FileStream(path, chunk_size)
+
+    def __len__(self) -> int:
+        return len(self._head) + len(self._file) + len(self._tail)
+
+    def __iter__(self) -> Iterator[bytes]:
+        yield self._head
+        yield from self._file
+        yield self._tail
+
+
+class WhisperXClient:
+    """Client for the self-hosted WhisperX /transcribe service (synchronous, multipart upload)."""
+
+    backend = "WHISPERX"
+
+    def __init__(self, url: Optional[str] = None, timeout: Optional[tuple] = None, batch_size: int = 16, diarize: bool = True):
+        self.url = url or os.getenv("WHISPERX_URL")
+        if not self.url:
+            raise RuntimeError("WHISPERX_URL is required for WHISPERX backend")
+        self.timeout = timeout or default_timeout()
+        self.session = get_session(self.backend)
+        self.options = {"batch_size": batch_size, "diarize": diarize, "return_char_alignments": False}
+
+    @property
+    def endpoint(self) -> str:
+        return self.url
+
+    def transcribe(self, audio_path: str) -> List[dict]:
+        body = MultipartFileStream(audio_path, "file", {
+            k: ("true" if v else "false") if isinstance(v, bool) else v for k, v in self.options.items()
+        })
+        with metrics.timed("transcribe.whisperx.seconds"):
+            response = self.session.post(
+                self.url, data=body, headers={"Content-Type": body.content_type}, timeout=self.timeout
+            )
+        response.raise_for_status()
+        return response.json()["segments"]
+
+
+class AssemblyAIClient:
+    """Client for the AssemblyAI v2 API: upload, submit, poll."""
+
+    backend = "ASSEMBLYAI"
+
+    def __init__(self, base_url: Optional[str] = None, api_key: Optional[str] = None, timeout: Optional[tuple] = None):
+        self.base_url = (base_url or os.getenv("ASSEMBLYAI_URL") or "https://api.assemblyai.com").rstrip("/")
+        api_key = api_key or os.getenv("ASSEMBLYAI_API_KEY")
+        if not api_key:
+            raise RuntimeError("ASSEMBLYAI_API_KEY is required for ASSEMBLYAI backend")
+        self.headers = {"authorization": api_key}
+        self.timeout = timeout or default_timeout()
+        self.session = get_session(self.backend)
+        self.options = {
+            "speaker_labels": True,
+            "language_detection": True,
+            "punctuate": True,
+            "format_text": True,
+            "speech_model": "universal",
+        }
+
+    @property
+    def endpoint(self) -> str:
+        return self.base_url
+
+    def upload(self, audio_path: str) -> str:
+        """Stream a local file to /v2/upload and return its upload_url."""
+        with metrics.timed("transcribe.assemblyai.upload.seconds"):
+            response = self.session.post(
+                self.base_url + "/v2/upload", headers=self.headers, data=FileStream(audio_path), timeout=self.timeout
+            )
+        response.raise_for_status()
+        return response.json()["upload_url"]
+
+    def submit(self, audio_url: str, options: Optional[dict] = None) -> str:
+        """Create a transcript job and return its id."""
+        data = {"audio_url": audio_url, **self.options, **(options or {})}
+        response = self.session.post(
+            self.base_url + "/v2/transcript", json=data, headers=self.headers, timeout=self.timeout
+        )
+        response.raise_for_status()
+        return response.json()["id"]
+
+    def get(self, transcript_id: str) -> dict:
+        """Current state of a transcript job."""
+        response = self.session.get(
+            self.base_url + "/v2/transcript/" + transcript_id, headers=self.headers, timeout=self.timeout
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def wait(self, transcript_id: str, timeout: Optional[float] = None) -> dict:
+        """
+        Poll a transcript job with exponential backoff until it completes.
+        Raises:
+            RuntimeError: the job failed
+            TimeoutError: still not finished after timeout seconds
+        """
+        timeout = timeout or settings.ASSEMBLYAI_POLL_TIMEOUT
+        start_ts = time.time()
+        for interval in backoff_intervals(settings.ASSEMBLYAI_POLL_INITIAL, settings.ASSEMBLYAI_POLL_MAX):
+            results = self.get(transcript_id)
+            metrics.incr("transcribe.assemblyai.polls")
+            if results["status"] == "completed":
+                return results
+            if results["status"] == "error":
+                raise RuntimeError(f"Transcription failed: {results.get('error')}")
+            if time.time() - start_ts > timeout:
+                raise TimeoutError(f"Polling timed out after {timeout:.0f} seconds (id={transcript_id})")
+            time.sleep(interval)
+
+    def transcribe(self, audio_path: str) -> List[dict]:
+        transcript_id = self.submit(self.upload(audio_path))
+        results = self.wait(transcript_id)
+        print(f"Transcript ID:{transcript_id}")
+        return utterances_to_segments(results.get("utterances") or [])
+
+
+def utterances_to_segments(utterances: List[dict]) -> List[dict]:
+    """
+    将 AssemblyAI 的 utterances 时间戳（毫秒）转换为秒。
+    """
+    segments = []
+    for u in utterances:
+        words = u.get("words", [])
+        for w in words:
+            w["start"] = w["start"] / 1000.0 if w.get("start") is not None else None
+            w["end"] = w["end"] / 1000.0 if w.get("end") is not None else None
+        u["start"] = u.get("start") / 1000.0 if u.get("start") is not None else None
+        u["end"] = u.get("end") / 1000.0 if u.get("end") is not None else None
+        segments.append(u)
+    return segments
+
+
+def get_backend() -> str:
+    return os.getenv("TRANSCRIBE_BACKEND", "WHISPERX").upper()  # WHISPERX or ASSEMBLYAI
+
+
+def get_transcription_client(backend: Optional[str] = None):
+    """Client for the configured (or given) backend."""
+    backend = (backend or get_backend()).upper()
+    if backend == "WHISPERX":
+        return WhisperXClient()
+    if backend == "ASSEMBLYAI":
+        return AssemblyAIClient()
+    raise ValueError(f"Unknown transcription backend: {backend}")
+
+
+def get_transcript_cache() -> Optional[ResultCache]:
+    """Transcript cache configured by TRANSCRIPT_CACHE_* (None when disabled)."""
+    return get_result_cache(
+        "transcript_cache",
+        settings.TRANSCRIPT_CACHE_BACKEND,
+        ttl=settings.TRANSCRIPT_CACHE_TTL_SEC,
+        max_mb=settings.TRANSCRIPT_CACHE_MAX_MB,
+    )
+
+
+def transcript_cache_key(client, audio_path: str) -> str:
+    """
+    Cache key: content hash of the audio sent to the backend + backend name + endpoint URL +
+    request options, so a mock server and the real service never share entries.
+    """
+    return make_key("transcript", hash_file(audio_path), client.backend, client.endpoint, client.options)
+
+
+def transcribe_cached(client, audio_path: str) -> List[dict]:
+    """
+    client.transcribe with the transcript cache in front: re-running a recording (retry,
+    replay, reprocessing with unchanged preprocessing) does not call the backend again.
+    """
+    cache = get_transcript_cache()
+    if cache is None:
+        return client.transcribe(audio_path)
+    key = transcript_cache_key(client, audio_path)
+    segments = cache.get(key)
+    if segments is not None:
+        print(f"[transcript_cache] hit {client.backend} {key[:12]}")
+        return segments
+    segments = client.transcribe(audio_path)
+    cache.set(key, segments)
+    return segments
@@ -1,8 +1,14 @@
 # ================== 常量与路径 ==================
 import json
 import os
-import tiktoken
+import bisect
+import textwrap
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, List
+from pydantic import BaseModel, ConfigDict, Field
+from app.utils import prompt_registry
 from app.utils.llm_selector import chat_with_llm
+from app.utils.json_repair import JSONRepairError, is_valid_json, parse_llm_json
 
 TAXONOMY_PATH = os.path.join(os.path.dirname(__file__), "dialogue_taxonomy_en_full.json")
 RELATION_PATH = os.path.join(os.path.dirname(__file__), "event_relationship.json")
@@ -351,6 +357,76 @@ def extract_event_relationship_definitions(json_path=RELATION_PATH):
         lines.append(f"# {rel_type}\n  - Description:    * {desc}")
     return '\n'.join(lines)
 
+# taxonomy / 关系定义进程内只解析一次（文件修改后自动重新加载），prompt 模板预先填入这些固定片段
+prompt_registry.register_fragment("taxonomy_brief", extract_taxonomy_full_brief, TAXONOMY_PATH)
+prompt_registry.register_fragment("event_relationship_definitions", extract_event_relationship_definitions, RELATION_PATH)
+prompt_registry.register_template("segmentation", ONE_IN_ALL_PROMPT, dynamic=["conversation_json_str"])
+prompt_registry.register_template("conversation_summary", CONVERSATION_SUMMARY_PROMPT, dynamic=["segments"])
+
+
+# LLM 输出的校验模型：只约束后续代码依赖的字段，其余字段原样保留
+class SuspiciousUtterance(BaseModel):
+    model_config = ConfigDict(extra="allow")
+    index: int
+
+
+class SegmentOutput(BaseModel):
+    model_config = ConfigDict(extra="allow")
+    chunk_range: List[int] = Field(min_length=2, max_length=2)  # [start, end]，下游按两个值解包
+    attention_items: List[Dict[str, Any]] = []
+    suspicious_utterances: List[SuspiciousUtterance] = []
+
+
+class SegmentationOutput(BaseModel):
+    model_config = ConfigDict(extra="allow")
+    segments: List[SegmentOutput]
+    suspicious_utterances: List[SuspiciousUtterance] = []
+    speaker_role: List[Dict[str, Any]] = []
+    named_of_context: List[Dict[str, Any]] = []
+    event_relationships: List[Dict[str, Any]] = []
+
+
+class ConversationSummaryOutput(BaseModel):
+    model_config = ConfigDict(extra="allow")
+    title: str
+    summary: str
+    topics: List[str] = []
+
+
+def _segmentation_valid(text):
+    return is_valid_json(text, SegmentationOutput)
+
+
+def _summary_valid(text):
+    return is_valid_json(text, ConversationSummaryOutput)
+
+
+def parse_with_llm_fix(response, schema, metric, max_tokens, cache_if, fix_attempts=3):
+    """
+    Parse an LLM response locally (json.loads, then json_repair + schema validation); only when
+    that fails, ask the LLM to fix the JSON, up to fix_attempts times. Returns None if all fail.
+    """
+    try:
+        return parse_llm_json(response, schema, metric=metric)
+    except JSONRepairError as e:
+        Error_Message = str(e)
+        print(f"[ERROR] JSON parsing failed: {Error_Message}")
+    for _ in range(fix_attempts):
+        fix_prompt = (
+            f"Please strictly convert the following content to a valid JSON object. "
+            f"If there is any error, please fix it. "
+            f"The original error was: {Error_Message}\n"
+            f"Content to fix:\n{response}"
+        )
+        fixed_response = chat_with_llm(fix_prompt, temperature=0.1, max_tokens=max_tokens,
+                                       call_site="analysis.json_fix", cache_if=cache_if)
+        try:
+            return parse_llm_json(fixed_response, schema, metric="json_repair.llm_fix")
+        except JSONRepairError as inner_e:
+            Error_Message = str(inner_e)
+            print(f"[ERROR] JSON correction failed: {Error_Message}")
+    return None
+
 # 只保留 index、speaker、content 字段，简化 utterances
 def filter_utterances_minimal(utterances):
     filtered = []
@@ -370,13 +446,64 @@ def build_full_dialogue_segmentation_prompt(conversation_json, save_debug=False,
         conversation_json_str = json.dumps(conversation_json, ensure_ascii=False, indent=2)
     else:
         conversation_json_str = conversation_json
-    prompt = ONE_IN_ALL_PROMPT.format(conversation_json_str=conversation_json_str, taxonomy_brief=extract_taxonomy_full_brief(),event_relationship_definitions=extract_event_relationship_definitions())
+    prompt = prompt_registry.get_template("segmentation").render(conversation_json_str=conversation_json_str)
     if save_debug and debug_path:
         os.makedirs(os.path.dirname(debug_path), exist_ok=True)
         with open(debug_path, 'w', encoding='utf-8') as f:
             f.write(prompt)
     return prompt
 
+# 分段 prompt 的块边界查找：每条 utterance 的 token 数只编码一次，prompt 固定部分只测一次，
+# 用前缀和二分查找候选边界，再用完整 prompt 精确计数校正，边界与逐条扩展、每步重编码完整 prompt 的结果一致
+class ChunkBoundaryFinder:
+    """
+    Finds chunk ends for analyze_conversation_with_threshold without re-encoding the whole
+    prompt for every candidate end.
+    """
+
+    def __init__(self, conversation, max_input_token, enc):
+        self.conversation = conversation
+        self.max_input_token = max_input_token
+        self.enc = enc
+        self.exact_calls = 0
+        # 每条 utterance 在 json.dumps(indent=2) 列表中的文本（含分隔符），index 取 0 估计
+        self.prefix = [0]
+        for utt in filter_utterances_minimal(conversation):
+            utt['index'] = 0
+            text = textwrap.indent(json.dumps(utt, ensure_ascii=False, indent=2), "  ") + ",\n"
+            self.prefix.append(self.prefix[-1] + len(enc.encode(text)))
+        self.overhead = len(enc.encode(build_full_dialogue_segmentation_prompt([])))  # 含空列表 "[]"
+
+    def prompt_tokens(self, start, end):
+        """Exact token count of the segmentation prompt for conversation[start:end+1]."""
+        self.exact_calls += 1
+        return len(self.enc.encode(build_full_dialogue_segmentation_prompt(self.conversation[start:end + 1])))
+
+    def first_exceeding(self, offset):
+        """First end >= offset whose prompt exceeds max_input_token, or len(conversation) if none."""
+        n = len(self.conversation)
+        budget = self.prefix[offset] + self.max_input_token - self.overhead
+        end = bisect.bisect_right(self.prefix, budget, lo=offset + 1) - 1
+        end = min(max(end, offset), n)
+        # 估计值可能因 BPE 合并、index 位数差几个 token，用精确计数向两侧校正
+        while end < n and self.prompt_tokens(offset, end) <= self.max_input_token:
+            end += 1
+        while end > offset and self.prompt_tokens(offset, end - 1) > self.max_input_token:
+            end -= 1
+        return end
+
+    def chunk_end(self, offset):
+        """
+        Last utterance index of the chunk starting at offset (inclusive), with the same
+        semantics as the original scan: the chunk stops two before the first exceeding
+        end, and always contains at least the utterance at offset.
+        """
+        n = len(self.conversation)
+        end = self.first_exceeding(offset)
+        if end == n:
+            return n - 1
+        return max(end - 2, offset)
+
 # 将原始 utterances 按 chunk_range 加入每个 segment
 def insert_current_chunk_to_segments(conversation, segments):
     for seg in segments:
@@ -519,27 +646,12 @@ def analyze_conversation_with_one_in_all(
     response = None
     parsed_response = None
     for retry in range(max_retry):
-        response = chat_with_qwen(prompt, temperature=temperature, max_tokens=max_tokens)
-        try:
-            parsed_response = json.loads(response)
-        except Exception as e:
-            Error_Message = str(e)
-            print(f"[ERROR] JSON parsing failed: {Error_Message}")
-            for _ in range(3):
-                fix_prompt = (
-                    f"Please strictly convert the following content to a valid JSON object. "
-                    f"If there is any error, please fix it. "
-                    f"The original error was: {Error_Message}\n"
-                    f"Content to fix:\n{response}"
-                )
-                fixed_response = chat_with_qwen(fix_prompt, temperature=0.1, max_tokens=max_tokens)
-                try:
-                    parsed_response = json.loads(fixed_response)
-                    break
-                except Exception as inner_e:
-                    Error_Message = str(inner_e)
-                    print(f"[ERROR] JSON correction failed: {Error_Message}")
-                    continue
+        response = chat_with_llm(prompt, temperature=temperature, max_tokens=max_tokens,
+                                call_site="analysis.segmentation", cache_if=_segmentation_valid)
+        parsed = parse_with_llm_fix(response, SegmentationOutput, "json_repair.segmentation",
+                                    max_tokens, _segmentation_valid)
+        if parsed is not None:
+            parsed_response = parsed
         segments = parsed_response.get('segments', []) if parsed_response else []
         suspicious_utterances = parsed_response.get('suspicious_utterances', []) if parsed_response else []
         all_indices = set(range(len(conversation)))
@@ -593,8 +705,13 @@ def analyze_conversation_with_threshold(
     max_tokens=4096,
     max_retry=3,
     model_name="gpt-3.5-turbo",
-    save_prompt_debug=False
+    save_prompt_debug=False,
+    progress_cb=None
 ):
+    """
+    按 max_input_token 将对话切块逐块分析，并合并为一个结果。
+    progress_cb: 可选，每块分析完成后调用 progress_cb(已处理 utterance 数, 总数)
+    """
     n = len(conversation)
     results_segments = []
     all_speaker_roles = []
@@ -605,29 +722,15 @@ def analyze_conversation_with_threshold(
     results_overlap_indices = []
     offset = 0
     print(f"Total utterances: {n}, max_input_token: {max_input_token}, model_name: {model_name}")
+    enc = prompt_registry.get_encoding(model_name)
+    boundaries = ChunkBoundaryFinder(conversation, max_input_token, enc)
     while offset < n:
-        enc = tiktoken.encoding_for_model(model_name)
-        end = offset
-        while end < n:
-            test_chunk = conversation[offset:end+1]
-            prompt = build_full_dialogue_segmentation_prompt(test_chunk, save_debug=False)
-            token_count = len(enc.encode(prompt))
-            if token_count > max_input_token:
-                if end == offset:
-                    break
-                else:
-                    end -= 1
-                    break
-            end += 1
         real_start = offset
-        real_end = end - 1
-        if real_end < real_start:
-            real_end = real_start
+        real_end = boundaries.chunk_end(offset)
         chunk_to_analyze = conversation[real_start:real_end+1]
-        debug_path = None
         if save_prompt_debug:
             debug_path = f"temp/prompt_{real_start}_{real_end}.txt"
-        prompt = build_full_dialogue_segmentation_prompt(chunk_to_analyze, save_debug=save_prompt_debug, debug_path=debug_path)
+            build_full_dialogue_segmentation_prompt(chunk_to_analyze, save_debug=True, debug_path=debug_path)
         # print(f"prompt =" f"\n{prompt}\n")
         result = analyze_conversation_with_one_in_all(
             chunk_to_analyze,
@@ -697,6 +800,8 @@ def analyze_conversation_with_threshold(
         results_missing_indices.extend(result.get('missing_indices', []))
         results_invalid_suspicious_indices.extend(result.get('invalid_suspicious_indices', []))
         results_overlap_indices.extend(result.get('overlap_indices', []))
+        if progress_cb is not None:
+            progress_cb(min(offset, n), n)
     final_result = {
         'segments': results_segments,
         'speaker_role': all_speaker_roles,
@@ -709,6 +814,179 @@ def analyze_conversation_with_threshold(
         save_json_debug(final_result, "temp/result_final.json")
     return final_result
 
+# ================== 并行分析（窗口重叠 + 确定性合并） ==================
+# 顺序模式下一块的起点取决于上一块 LLM 返回的最后一个 segment，只能串行；
+# 并行模式预先按 token 预算切出带固定 token 重叠的窗口，并发分析后在重叠区确定性地选取切分点合并。
+def plan_analysis_windows(boundaries, overlap_tokens):
+    """
+    Windows (start, end) covering the conversation; each fits max_input_token and starts
+    about overlap_tokens before the previous window's end. The overlap is capped below half of
+    the window's utterance tokens and a window never starts inside the window before the
+    previous one, so every utterance lies in at most two consecutive windows.
+    Args:
+        boundaries: ChunkBoundaryFinder of the conversation
+        overlap_tokens: utterance tokens shared by consecutive windows
+    """
+    n = len(boundaries.conversation)
+    prefix = boundaries.prefix
+    windows = []
+    start = 0
+    prev_end = -1
+    while start < n:
+        end = max(boundaries.first_exceeding(start) - 1, start)
+        windows.append((start, end))
+        if end >= n - 1:
+            break
+        # 重叠不超过窗口 utterance token 数的一半，否则下一窗口会伸进上上个窗口，合并切分点不再递增
+        overlap = min(overlap_tokens, (prefix[end + 1] - prefix[start] - 1) // 2)
+        # 最早的 s 使 [s, end] 的 utterance token 数不超过 overlap
+        s = bisect.bisect_left(prefix, prefix[end + 1] - overlap, lo=0, hi=end + 1)
+        # 任一 utterance 最多落在相邻两个窗口中：下一窗口从上上个窗口结束之后开始
+        start, prev_end = min(max(s, start + 1, prev_end + 1), end + 1), end
+    return windows
+
+def choose_overlap_cut(prev_segments, next_segments, overlap_start, overlap_end):
+    """
+    Cut index b in [overlap_start, overlap_end + 1]: utterances before b come from the previous
+    window, from b on from the next one. Prefers a segment boundary both windows agree on,
+    then any boundary either window placed in the overlap, then the middle of the overlap;
+    ties go to the boundary closest to the middle, then the smaller index.
+    """
+    middle = (overlap_start + overlap_end + 1) / 2.0
+
+    def starts(segments, lo):
+        return {seg['chunk_range'][0] for seg in segments if lo <= seg['chunk_range'][0] <= overlap_end}
+
+    prev_starts = starts(prev_segments, overlap_start)
+    # 下一窗口在 overlap_start 处的起点是窗口切分造成的，不算作它给出的分段边界
+    next_starts = starts(next_segments, overlap_start + 1)
+    for candidates in (prev_starts & (next_starts | {overlap_start}), prev_starts | next_starts):
+        if candidates:
+            return min(candidates, key=lambda b: (abs(b - middle), b))
+    return int(middle)
+
+def clip_segment(seg, lo, hi):
+    """Clamp a segment's chunk_range to [lo, hi] and drop items that fall outside; None if empty."""
+    start, end = seg['chunk_range'][0], seg['chunk_range'][-1]
+    new_start, new_end = max(start, lo), min(end, hi)
+    if new_start > new_end:
+        return None
+    if (new_start, new_end) != (start, end):
+        for cut_lo, cut_hi in ((start, new_start - 1), (new_end + 1, end)):
+            if cut_lo > cut_hi:
+                continue
+            if 'attention_items' in seg:
+                seg['attention_items'] = filter_attention_items(seg.get('attention_items', []), cut_lo, cut_hi)
+            if 'suspicious_utterances' in seg:
+                seg['suspicious_utterances'] = filter_suspicious_utterances(seg.get('suspicious_utterances', []), cut_lo, cut_hi)
+        seg['chunk_range'] = [new_start, new_end]
+    return seg
+
+def merge_window_results(windows, results, conversation):
+    """
+    Merge per-window results (indices already shifted to conversation positions) into the
+    analyze_conversation_with_threshold output schema.
+    """
+    n = len(windows)
+    # 每个窗口实际负责的区间 [lo, hi]，由相邻窗口重叠区的切分点决定
+    spans = []
+    lo = windows[0][0] if windows else 0
+    for i in range(n):
+        if i + 1 < n:
+            overlap_start, overlap_end = windows[i + 1][0], windows[i][1]
+            if overlap_start <= overlap_end:
+                cut = choose_overlap_cut(results[i]['segments'], results[i + 1]['segments'], overlap_start, overlap_end)
+                cut = max(cut, lo)  # 切分点不能早于本窗口负责区间的起点，否则前面的 utterance 会重复输出
+            else:
+                cut = overlap_start
+        else:
+            cut = windows[i][1] + 1
+        spans.append((lo, cut - 1))
+        lo = cut
+
+    merged = {
+        'segments': [], 'speaker_role': [], 'named_of_context': [], 'event_relationships': [],
+        'missing_indices': [], 'invalid_suspicious_indices': [], 'overlap_indices': []
+    }
+    for (lo, hi), result in zip(spans, results):
+        range_map = {}
+        for seg in result['segments']:
+            old_range = tuple(seg['chunk_range'])
+            seg = clip_segment(seg, lo, hi)
+            range_map[old_range] = seg['chunk_range'] if seg is not None else None
+            if seg is not None:
+                merged['segments'].append(seg)
+        for rel in result.get('event_relationships', []):
+            src = range_map.get(tuple(rel.get('source_event', {}).get('chunk_range') or ()))
+            tgt = range_map.get(tuple(rel.get('target_event', {}).get('chunk_range') or ()))
+            if src and tgt:
+                rel['source_event']['chunk_range'] = list(src)
+                rel['target_event']['chunk_range'] = list(tgt)
+                merged['event_relationships'].append(rel)
+        merged['speaker_role'].extend(result.get('speaker_role', []))
+        merged['named_of_context'].extend(result.get('named_of_context', []))
+        merged['missing_indices'].extend(i for i in result.get('missing_indices', []) if lo <= i <= hi)
+        merged['invalid_suspicious_indices'].extend(result.get('invalid_suspicious_indices', []))
+        merged['overlap_indices'].extend(i for i in result.get('overlap_indices', []) if lo <= i <= hi)
+    merged['segments'].sort(key=lambda seg: seg['chunk_range'][0])
+    for seg in merged['segments']:
+        start_idx, end_idx = seg['chunk_range']
+        seg['started_at'] = conversation[start_idx].get('start_time')
+        seg['ended_at'] = conversation[end_idx].get('end_time')
+    merged['missing_indices'] = sorted(set(merged['missing_indices']))
+    merged['overlap_indices'] = sorted(set(merged['overlap_indices']))
+    return merged
+
+def analyze_conversation_parallel(
+    conversation,
+    max_input_token=12800,
+    temperature=0.2,
+    max_tokens=4096,
+    max_retry=3,
+    model_name="gpt-3.5-turbo",
+    overlap_tokens=1500,
+    max_workers=4,
+    progress_cb=None
+):
+    """
+    并行版 analyze_conversation_with_threshold：预切带 overlap_tokens 重叠的窗口，最多 max_workers
+    个窗口同时调用 analyze_conversation_with_one_in_all，再在重叠区合并，输出结构与顺序模式相同。
+    progress_cb: 可选，每个窗口完成后调用 progress_cb(已完成窗口数, 窗口总数)
+    """
+    n = len(conversation)
+    if n == 0:
+        return merge_window_results([], [], conversation)
+    enc = prompt_registry.get_encoding(model_name)
+    boundaries = ChunkBoundaryFinder(conversation, max_input_token, enc)
+    windows = plan_analysis_windows(boundaries, overlap_tokens)
+    print(f"Total utterances: {n}, windows: {len(windows)}, overlap_tokens: {overlap_tokens}, workers: {max_workers}")
+
+    def analyze_window(window):
+        start, end = window
+        result = analyze_conversation_with_one_in_all(
+            conversation[start:end + 1],
+            temperature=temperature,
+            max_tokens=max_tokens,
+            max_retry=max_retry
+        )
+        for seg in result['segments']:
+            adjust_indices_for_segment(seg, start)
+        adjust_event_relationship_indices(result.get('event_relationships', []), start)
+        result['missing_indices'] = [i + start for i in result.get('missing_indices', [])]
+        result['overlap_indices'] = [i + start for i in result.get('overlap_indices', [])]
+        return result
+
+    results = [None] * len(windows)
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        futures = {pool.submit(analyze_window, w): i for i, w in enumerate(windows)}
+        done = 0
+        for future in as_completed(futures):
+            results[futures[future]] = future.result()
+            done += 1
+            if progress_cb is not None:
+                progress_cb(done, len(windows))
+    return merge_window_results(windows, results, conversation)
+
 def analyze_conversation_summary(
     segments_summaries,
     max_input_token=12800,
@@ -718,43 +996,36 @@ def analyze_conversation_summary(
     model_name="gpt-3.5-turbo",
     save_prompt_debug=False
 ):
-    enc = tiktoken.encoding_for_model(model_name)
-    final_chunk = []
+    enc = prompt_registry.get_encoding(model_name)
+    template = prompt_registry.get_template("conversation_summary")
+
+    def fits(k):
+        prompt = template.render(segments="\n".join(segments_summaries[:k]))
+        return len(enc.encode(prompt)) <= max_input_token
+
+    # 用模板固定开销 + 每条 slice 的 token 数估计可放入的条数，再用完整 prompt 精确计数校正
+    budget = max_input_token - template.overhead_tokens(model_name)
+    k = 0
+    used = 0
     for seg in segments_summaries:
-        test_chunk = final_chunk.copy()
-        test_chunk.append(seg)
-        prompt = CONVERSATION_SUMMARY_PROMPT.format(segments="\n".join(test_chunk))
-        token_count = len(enc.encode(prompt))
-        if token_count > max_input_token:
+        used += len(enc.encode(seg)) + (1 if k else 0)
+        if used > budget:
             break
-        final_chunk = test_chunk
+        k += 1
+    while k < len(segments_summaries) and fits(k + 1):
+        k += 1
+    while k > 0 and not fits(k):
+        k -= 1
+    final_chunk = segments_summaries[:k]
 
-    prompt = CONVERSATION_SUMMARY_PROMPT.format(segments="\n".join(final_chunk))
+    prompt = template.render(segments="\n".join(final_chunk))
     response = None
     parsed_response = None
     for retry in range(max_retry):
-        response = chat_with_qwen(prompt, temperature=temperature, max_tokens=max_tokens)
-        try:
-            parsed_response = json.loads(response)
-            break
-        except Exception as e:
-            Error_Message = str(e)
-            print(f"[ERROR] JSON parsing failed: {Error_Message}")
-            for _ in range(3):
-                fix_prompt = (
-                    f"Please strictly convert the following content to a valid JSON object. "
-                    f"If there is any error, please fix it. "
-                    f"The original error was: {Error_Message}\n"
-                    f"Content to fix:\n{response}"
-                )
-                fixed_response = chat_with_qwen(fix_prompt, temperature=0.1, max_tokens=max_tokens)
-                try:
-                    parsed_response = json.loads(fixed_response)
-                    break
-                except Exception as inner_e:
-                    Error_Message = str(inner_e)
-                    print(f"[ERROR] JSON correction failed: {Error_Message}")
-                    continue
+        response = chat_with_llm(prompt, temperature=temperature, max_tokens=max_tokens,
+                                call_site="analysis.summary", cache_if=_summary_valid)
+        parsed_response = parse_with_llm_fix(response, ConversationSummaryOutput, "json_repair.summary",
+                                             max_tokens, _summary_valid)
         if parsed_response is not None:
             break
     if parsed_response is None:
@@ -0,0 +1,234 @@
+# audio_io.py
+# Audio decode/encode helpers for the preprocessing pipeline.
+# Decoding goes through an ffmpeg pipe (mono, 16 kHz, s16le) so callers can consume
+# fixed-size blocks without holding the whole recording in memory.
+# Encoding writes WAV directly, or pipes PCM into ffmpeg for compressed outputs (FLAC/Opus).
+
+import os
+import wave
+import subprocess
+import numpy as np
+from typing import Iterator, Optional
+
+FFMPEG_BIN = os.getenv("FFMPEG_BIN", "ffmpeg")
+
+# codec -> file extension of the encoded output
+OUTPUT_CODECS = {
+    "wav": ".wav",
+    "flac": ".flac",
+    "opus": ".ogg",
+}
+DEFAULT_OPUS_BITRATE = "32k"
+
+
+def ffmpeg_decode_cmd(path: str, sr: int) -> list:
+    """
+    Build the ffmpeg command that decodes any input to mono s16le PCM on stdout.
+    Samples are converted to s16 before resampling: resampling the float output of
+    lossy decoders near digital silence hits denormals and was ~2x slower.
+    """
+    return [
+        FFMPEG_BIN, "-nostdin", "-v", "error",
+        "-i", path,
+        "-af", f"aformat=sample_fmts=s16,aresample={sr}",
+        "-f", "s16le", "-acodec", "pcm_s16le",
+        "-ac", "1", "-ar", str(sr),
+        "-",
+    ]
+
+
+def decode_audio(path: str, sr: int) -> np.ndarray:
+    """
+    Decode an audio file to mono int16 PCM at sr in a single ffmpeg call.
+    Replaces the pydub from_file/set_channels/set_frame_rate/set_sample_width chain,
+    where every step copied the whole recording.
+    Args:
+        path: input audio file
+        sr: output sample rate
+    Returns:
+        np.ndarray: read-only int16 view over ffmpeg's output (no extra copy)
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(path)
+    proc = subprocess.run(ffmpeg_decode_cmd(path, sr), stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if proc.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed to decode {path}: {proc.stderr.decode(errors='ignore').strip()}")
+    data = proc.stdout
+    if len(data) % 2:
+        data = data[:-1]
+    return np.frombuffer(data, dtype=np.int16)
+
+
+def iter_pcm_blocks(path: str, sr: int, block_samples: int) -> Iterator[np.ndarray]:
+    """
+    Decode an audio file through ffmpeg and yield int16 blocks of at most block_samples.
+    Args:
+        path: input audio file
+        sr: output sample rate
+        block_samples: samples per block
+    Yields:
+        np.ndarray: int16 samples
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(path)
+    proc = subprocess.Popen(ffmpeg_decode_cmd(path, sr), stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    finished = False
+    try:
+        nbytes = int(block_samples) * 2
+        while True:
+            data = proc.stdout.read(nbytes)
+            if not data:
+                break
+            if len(data) % 2:
+                data = data[:-1]
+            yield np.frombuffer(data, dtype=np.int16)
+        finished = True
+    finally:
+        proc.stdout.close()
+        if not finished:
+            # 调用方提前结束迭代（或出错），直接终止 ffmpeg
+            proc.kill()
+        err = proc.stderr.read().decode(errors="ignore")
+        proc.stderr.close()
+        returncode = proc.wait()
+        if finished and returncode != 0:
+            raise RuntimeError(f"ffmpeg failed to decode {path}: {err.strip()}")
+
+
+class WavWriter:
+    """
+    Incremental mono 16-bit WAV writer; the header is finalised on close().
+    """
+
+    def __init__(self, path: str, sr: int):
+        self._wf = wave.open(path, "wb")
+        self._wf.setnchannels(1)
+        self._wf.setsampwidth(2)
+        self._wf.setframerate(sr)
+        self.frames = 0
+
+    def write(self, pcm: np.ndarray) -> None:
+        pcm = np.ascontiguousarray(pcm, dtype="<i2")
+        self._wf.writeframes(memoryview(pcm).cast("B"))
+        self.frames += len(pcm)
+
+    def close(self) -> None:
+        self._wf.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def output_extension(codec: str) -> str:
+    """
+    File extension for an output codec (wav / flac / opus).
+    """
+    try:
+        return OUTPUT_CODECS[codec.lower()]
+    except KeyError:
+        raise ValueError(f"Unsupported output codec: {codec} (expected one of {', '.join(OUTPUT_CODECS)})")
+
+
+def ffmpeg_encode_cmd(path: str, sr: int, codec: str, bitrate: Optional[str] = None) -> list:
+    """
+    Build the ffmpeg command that encodes mono s16le PCM from stdin to path.
+    FLAC is lossless. Ogg/Opus records the encoder pre-skip and the exact end granule,
+    so decoders return exactly the samples written and processed-time offsets are kept.
+    """
+    codec = codec.lower()
+    if codec == "flac":
+        codec_args = ["-c:a", "flac", "-compression_level", "5"]
+    elif codec == "opus":
+        # complexity 5 encodes ~3x faster than the default 10 with little loss at speech bitrates
+        codec_args = ["-c:a", "libopus", "-b:a", bitrate or DEFAULT_OPUS_BITRATE,
+                      "-compression_level", "5", "-f", "ogg"]
+    else:
+        raise ValueError(f"ffmpeg encoding is not used for codec: {codec}")
+    return [
+        FFMPEG_BIN, "-nostdin", "-v", "error", "-y",
+        "-f", "s16le", "-ac", "1", "-ar", str(sr), "-i", "-",
+        *codec_args,
+        path,
+    ]
+
+
+class FfmpegWriter:
+    """
+    Incremental mono 16-bit writer that pipes PCM into ffmpeg for compressed outputs.
+    Same interface as WavWriter.
+    """
+
+    def __init__(self, path: str, sr: int, codec: str, bitrate: Optional[str] = None):
+        self.path = path
+        self._proc = subprocess.Popen(
+            ffmpeg_encode_cmd(path, sr, codec, bitrate),
+            stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+        )
+        self.frames = 0
+
+    def write(self, pcm: np.ndarray) -> None:
+        pcm = np.ascontiguousarray(pcm, dtype="<i2")
+        try:
+            self._proc.stdin.write(memoryview(pcm).cast("B"))
+        except BrokenPipeError:
+            # ffmpeg 已退出，输出不完整
+            code, err = self._finish()
+            raise RuntimeError(f"ffmpeg exited ({code}) while encoding {self.path}: {err}") from None
+        self.frames += len(pcm)
+
+    def _finish(self):
+        """Close stdin, wait for ffmpeg; returns (exit code, stderr)."""
+        try:
+            self._proc.stdin.close()
+        except BrokenPipeError:
+            pass
+        err = self._proc.stderr.read().decode(errors="ignore")
+        self._proc.stderr.close()
+        return self._proc.wait(), err.strip()
+
+    def close(self) -> None:
+        if self._proc.stdin.closed:
+            return
+        code, err = self._finish()
+        if code != 0:
+            raise RuntimeError(f"ffmpeg failed to encode {self.path}: {err}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def open_audio_writer(path: str, sr: int, codec: str = "wav", bitrate: Optional[str] = None):
+    """
+    Open an incremental writer for the given output codec.
+    Args:
+        path: output path
+        sr: sample rate
+        codec: wav / flac / opus
+        bitrate: Opus bitrate (e.g. "32k"), ignored for other codecs
+    Returns:
+        WavWriter or FfmpegWriter
+    """
+    output_extension(codec)  # validate
+    if codec.lower() == "wav":
+        return WavWriter(path, sr)
+    return FfmpegWriter(path, sr, codec, bitrate)
+
+
+def write_audio(path: str, pcm: np.ndarray, sr: int, codec: str = "wav", bitrate: Optional[str] = None) -> None:
+    """
+    Write mono int16 samples to path in the given output codec.
+    Args:
+        path: output path
+        pcm: int16 samples
+        sr: sample rate
+        codec: wav / flac / opus
+        bitrate: Opus bitrate (e.g. "32k"), ignored for other codecs
+    """
+    with open_audio_writer(path, sr, codec, bitrate) as writer:
+        writer.write(pcm)
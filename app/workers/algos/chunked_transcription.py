@@ -0,0 +1,217 @@
+# chunked_transcription.py
+# Parallel transcription of long recordings: the preprocessed audio is cut at span boundaries
+# (the silences VAD removed), chunks are transcribed concurrently, and their segments are shifted
+# back onto the processed timeline. remap_segments_to_original_timeline then maps them to
+# original time exactly as for a single request.
+# Diarization runs per request, so each chunk also re-transcribes the last overlap_sec of the
+# previous one; speakers are matched across chunks by how long they talk at the same time in
+# that overlap, and the overlap copy is dropped.
+
+import os
+import re
+import shutil
+import string
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app.utils import metrics
+from app.workers.algos.audio_io import decode_audio, output_extension, write_audio
+from app.workers.algos.preprocess_audio import TARGET_SAMPLE_RATE, SegmentMapping
+
+
+def plan_chunks(mapping: List[SegmentMapping], chunk_sec: float) -> List[Tuple[float, float]]:
+    """
+    Split the processed timeline into chunks of about chunk_sec, cutting only between spans.
+    Args:
+        mapping: SegmentMapping list of the processed audio
+        chunk_sec: target chunk length (sec, processed time)
+    Returns:
+        list of (proc_start, proc_end) in seconds, covering the whole processed audio
+    """
+    if not mapping:
+        return []
+    chunks = []
+    start = mapping[0].proc_start
+    for m in mapping[:-1]:
+        # 在片段边界处切分：当前块已达到目标长度时结束
+        if m.proc_end - start >= chunk_sec:
+            chunks.append((start, m.proc_end))
+            start = m.proc_end
+    chunks.append((start, mapping[-1].proc_end))
+    return chunks
+
+
+def _segment_objects(seg: dict) -> List[dict]:
+    return [seg] + (seg.get("words") if isinstance(seg.get("words"), list) else [])
+
+
+def offset_segments(segments: List[dict], offset: float) -> List[dict]:
+    """Shift segment/word timestamps by offset (sec)."""
+    for seg in segments:
+        for obj in _segment_objects(seg):
+            for k in ("start", "end"):
+                if obj.get(k) is not None:
+                    obj[k] = float(obj[k]) + offset
+    return segments
+
+
+def _midpoint(seg: dict) -> float:
+    return (float(seg.get("start") or 0.0) + float(seg.get("end") or seg.get("start") or 0.0)) / 2
+
+
+def match_speakers(segments: List[dict], reference: List[dict]) -> Dict[str, str]:
+    """
+    One-to-one speaker matching by co-speaking time: pairs (label in segments, label in reference)
+    are taken greedily by how many seconds their segments overlap.
+    Returns:
+        {label in segments: label in reference} for the matched speakers
+    """
+    overlap: Dict[Tuple[str, str], float] = {}
+    for seg in segments:
+        if seg.get("speaker") is None:
+            continue
+        for ref in reference:
+            if ref.get("speaker") is None:
+                continue
+            d = min(seg["end"], ref["end"]) - max(seg["start"], ref["start"])
+            if d > 0:
+                key = (seg["speaker"], ref["speaker"])
+                overlap[key] = overlap.get(key, 0.0) + d
+    matched: Dict[str, str] = {}
+    for (label, ref_label), _ in sorted(overlap.items(), key=lambda kv: -kv[1]):
+        if label not in matched and ref_label not in matched.values():
+            matched[label] = ref_label
+    return matched
+
+
+def _fresh_label(label: str, taken: set) -> str:
+    """label itself if unused, else the first unused label of the same form (SPEAKER_NN / A-Z)."""
+    if label not in taken:
+        return label
+    if len(label) == 1 and label in string.ascii_uppercase:
+        candidates = iter(string.ascii_uppercase)
+    else:
+        m = re.match(r"^(.*?)(\d+)$", label)
+        prefix, width = (m.group(1), len(m.group(2))) if m else (f"{label}_", 2)
+        candidates = (f"{prefix}{n:0{width}d}" for n in range(len(taken) + 2))
+    for candidate in candidates:
+        if candidate not in taken:
+            return candidate
+    return f"{label}_{len(taken)}"
+
+
+def reconcile_chunk_speakers(results: List[List[dict]], chunks: List[Tuple[float, float]]) -> List[dict]:
+    """
+    Join per-chunk segments (processed timeline) into one transcript with consistent speakers.
+    Segments of chunk i whose midpoint lies before chunks[i][0] belong to the overlap with the
+    previous chunk: they are only used to match chunk i's speakers to the labels already
+    assigned, then dropped. Speakers that do not talk in the overlap cannot be matched and get
+    a label not used so far.
+    """
+    merged: List[dict] = []
+    used: set = set()
+    for i, segments in enumerate(results):
+        overlap, core = [], []
+        for seg in segments:
+            (overlap if i > 0 and _midpoint(seg) < chunks[i][0] else core).append(seg)
+        overlap_start = min((seg["start"] for seg in overlap), default=chunks[i][0])
+        reference = [seg for seg in merged if seg["end"] > overlap_start]
+        labels = {seg["speaker"] for seg in segments if seg.get("speaker") is not None}
+        rename = match_speakers(overlap, reference) if overlap else {}
+        taken = used | set(rename.values())
+        unmatched = sorted(labels - set(rename))
+        for label in unmatched:
+            rename[label] = _fresh_label(label, taken)
+            taken.add(rename[label])
+        if i > 0 and unmatched:
+            metrics.incr("transcribe.chunk_speakers_unmatched", len(unmatched))
+        for seg in core:
+            for obj in _segment_objects(seg):
+                if obj.get("speaker") is not None:
+                    obj["speaker"] = rename.get(obj["speaker"], obj["speaker"])
+        merged.extend(core)
+        used = taken
+    return merged
+
+
+def transcribe_chunked(
+    audio_path: str,
+    mapping: List[SegmentMapping],
+    transcribe_fn: Callable[[str], List[dict]],
+    chunk_sec: float = 600.0,
+    overlap_sec: float = 30.0,
+    workers: int = 4,
+    max_attempts: int = 3,
+    codec: Optional[str] = None,
+    progress_cb: Optional[Callable[[int, int], None]] = None
+) -> List[dict]:
+    """
+    Transcribe the preprocessed audio as concurrent chunks cut at span boundaries.
+    Only chunks that fail are retried (up to max_attempts times each).
+    Args:
+        audio_path: preprocessed audio file
+        mapping: SegmentMapping list of that file
+        transcribe_fn: transcribes one file, returns segments in seconds (e.g. client.transcribe)
+        chunk_sec: target chunk length in processed time (sec)
+        overlap_sec: audio of the previous chunk re-sent with each chunk for speaker matching (sec)
+        workers: concurrent requests
+        max_attempts: attempts per chunk before giving up
+        codec: chunk file codec, defaults to the extension of audio_path (wav/flac/opus)
+        progress_cb: called as progress_cb(chunks_done, chunks_total) after each chunk completes
+    Returns:
+        segments on the processed timeline, ordered by chunk, speakers reconciled across chunks
+    """
+    chunks = plan_chunks(mapping, chunk_sec)
+    if len(chunks) <= 1:
+        return transcribe_fn(audio_path)
+    # 每块从上一块末尾 overlap_sec 处开始，用于跨块匹配说话人
+    audio_starts = [start if i == 0 else max(chunks[i - 1][0], start - overlap_sec)
+                    for i, (start, _) in enumerate(chunks)]
+
+    sr = TARGET_SAMPLE_RATE
+    if codec is None:
+        ext = os.path.splitext(audio_path)[1].lower()
+        codec = {".flac": "flac", ".ogg": "opus"}.get(ext, "wav")
+    pcm = decode_audio(audio_path, sr)
+    tmp_dir = tempfile.mkdtemp(prefix="chunks-")
+    try:
+        paths = []
+        for i, (start, (_, end)) in enumerate(zip(audio_starts, chunks)):
+            path = os.path.join(tmp_dir, f"chunk_{i:04d}{output_extension(codec)}")
+            write_audio(path, pcm[int(round(start * sr)):int(round(end * sr))], sr, codec)
+            paths.append(path)
+        del pcm
+
+        results: List[Optional[List[dict]]] = [None] * len(chunks)
+        errors = {}
+        pending = list(range(len(chunks)))
+        for attempt in range(1, max_attempts + 1):
+            failed = []
+            with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+                futures = {pool.submit(transcribe_fn, paths[i]): i for i in pending}
+                for future in as_completed(futures):
+                    i = futures[future]
+                    try:
+                        results[i] = offset_segments(future.result(), audio_starts[i])
+                    except Exception as e:
+                        errors[i] = e
+                        failed.append(i)
+                        continue
+                    if progress_cb is not None:
+                        progress_cb(sum(r is not None for r in results), len(chunks))
+            metrics.incr("transcribe.chunks", len(pending) - len(failed))
+            if not failed:
+                break
+            metrics.incr("transcribe.chunk_failures", len(failed))
+            print(f"[chunked] attempt {attempt}/{max_attempts}: {len(failed)} of {len(chunks)} chunks failed")
+            pending = sorted(failed)
+        else:
+            raise RuntimeError(
+                f"{len(pending)} of {len(chunks)} chunks failed after {max_attempts} attempts: "
+                + "; ".join(f"chunk {i}: {errors[i]}" for i in pending)
+            )
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    return reconcile_chunk_speakers(results, chunks)
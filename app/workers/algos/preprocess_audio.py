@@ -7,20 +7,20 @@
 import os
 import math
 import time
-import torch
-import torchaudio
 import numpy as np
-from pydub import AudioSegment
-from typing import List, Tuple, Optional
-from dataclasses import dataclass
-
-# --- Constants and Model ---
-VAD_MODEL, utils = torch.hub.load(
-    repo_or_dir='snakers4/silero-vad',
-    model='silero_vad',
-    trust_repo=True
-)
-(get_speech_timestamps, _, _, _, _) = utils
+from collections import Counter
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple, Optional
+from dataclasses import dataclass, asdict, field
+
+from app.utils import metrics
+from app.workers.algos.vad_model import get_vad_model, acquire_vad_model
+from app.workers.algos.audio_io import decode_audio, iter_pcm_blocks, open_audio_writer, write_audio
+
+# --- Constants ---
+# torch/torchaudio and the VAD model are imported lazily (see vad_model.py),
+# so importing this module is cheap for processes that never preprocess audio.
 TARGET_SAMPLE_RATE = 16000
 VAD_PADDING_SEC = 0.2
 
@@ -32,6 +32,26 @@ CLIPPING_THRESHOLD = 0.015
 OCCUPANCY_SLOW = 0.60
 OCCUPANCY_MID = 0.75
 
+# Streaming mode: VAD runs over windows of STREAM_WINDOW_SEC that overlap by STREAM_OVERLAP_SEC,
+# so peak memory depends on the window, not on the recording length.
+STREAM_WINDOW_SEC = 300.0
+STREAM_OVERLAP_SEC = 5.0
+STREAM_BLOCK_SEC = 10.0
+VAD_OPTIONS = dict(threshold=0.5, min_speech_duration_ms=600, min_silence_duration_ms=200)
+
+# Chunked VAD: the waveform is split into VAD_CHUNK_SEC pieces, each analysed with
+# VAD_CHUNK_OVERLAP_SEC of context on both sides, on a pool of vad_workers threads.
+VAD_CHUNK_SEC = 300.0
+VAD_CHUNK_OVERLAP_SEC = 5.0
+
+# Batched time-stretch: consecutive spans with the same factor are stretched in one sox call,
+# up to STRETCH_BATCH_MAX_SEC of input per call.
+STRETCH_BATCH_MAX_SEC = 600.0
+
+# Adaptive bypass: when VAD would trim less than this fraction of the recording,
+# stretch/export are skipped and the original file is transcribed as-is (0 disables).
+BYPASS_MIN_SAVINGS = 0.05
+
 @dataclass
 class SegmentMapping:
     """
@@ -55,29 +75,285 @@ class SegmentMapping:
     a: float
     b: float
 
-def load_audio(path: str) -> AudioSegment:
+@dataclass
+class PreprocessStats:
+    """
+    Statistics of one preprocessing run, returned alongside the mapping.
+    Attributes:
+        stages: wall-clock seconds per stage (decode, vad, merge, features, stretch, export)
+        input_duration: original audio duration (seconds)
+        output_duration: processed audio duration (seconds)
+        span_count: number of emitted speech spans
+        stretch_histogram: span count per time-stretch factor ("1.00", "1.03", ...)
+        bytes_written: size of the processed file (0 when bypassed)
+        bypassed: stretch/export skipped by the adaptive bypass
+        streaming: produced by preprocess_audio_streaming
+    """
+    stages: Dict[str, float] = field(default_factory=dict)
+    input_duration: float = 0.0
+    output_duration: float = 0.0
+    span_count: int = 0
+    stretch_histogram: Dict[str, int] = field(default_factory=dict)
+    bytes_written: int = 0
+    bypassed: bool = False
+    streaming: bool = False
+
+    @contextmanager
+    def stage(self, name: str):
+        """Add the wall time of the enclosed block to stages[name]."""
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - t0
+
+    @property
+    def total_seconds(self) -> float:
+        return sum(self.stages.values())
+
+    def finish(self, mapping: List["SegmentMapping"], output_path: Optional[str] = None) -> "PreprocessStats":
+        """Fill span count, output duration, histogram and file size from the final mapping."""
+        self.span_count = len(mapping)
+        self.output_duration = mapping[-1].proc_end if mapping else 0.0
+        self.stretch_histogram = dict(sorted(Counter(f"{m.atempo:.2f}" for m in mapping).items()))
+        if output_path and os.path.exists(output_path):
+            self.bytes_written = os.path.getsize(output_path)
+        return self
+
+    def to_dict(self) -> dict:
+        d = asdict(self)
+        d["total_seconds"] = self.total_seconds
+        return d
+
+    def emit(self) -> None:
+        """Report the run to the process-wide metrics sink (app.utils.metrics)."""
+        for name, seconds in self.stages.items():
+            metrics.observe(f"preprocess.stage.{name}.seconds", seconds)
+        metrics.observe("preprocess.total.seconds", self.total_seconds)
+        if self.input_duration > 0:
+            metrics.observe("preprocess.realtime_factor", self.total_seconds / self.input_duration)
+            metrics.observe("preprocess.output_ratio", self.output_duration / self.input_duration)
+        metrics.observe("preprocess.span_count", self.span_count)
+        metrics.observe("preprocess.bytes_written", self.bytes_written)
+        for factor, count in self.stretch_histogram.items():
+            metrics.incr(f"preprocess.stretch.{factor}", count)
+
+def mapping_to_dicts(mapping: List[SegmentMapping]) -> List[dict]:
+    """
+    Serialize a mapping to JSON-compatible dicts (floats round-trip exactly through json).
+    """
+    return [asdict(m) for m in mapping]
+
+def mapping_from_dicts(items: List[dict]) -> List[SegmentMapping]:
+    """
+    Inverse of mapping_to_dicts.
+    """
+    return [SegmentMapping(**item) for item in items]
+
+def preprocess_params(
+    streaming: bool = False,
+    window_sec: float = STREAM_WINDOW_SEC,
+    vad_workers: int = 1,
+    codec: str = "wav",
+    bitrate: Optional[str] = None,
+    bypass_min_savings: float = BYPASS_MIN_SAVINGS
+) -> dict:
+    """
+    All parameters that influence the processed audio and mapping, used as part of the
+    preprocessing cache key. Anything added here invalidates previously cached outputs.
+    """
+    params = {
+        "sample_rate": TARGET_SAMPLE_RATE,
+        "vad_padding_sec": VAD_PADDING_SEC,
+        "vad_options": VAD_OPTIONS,
+        "use_time_stretch": USE_TIME_STRETCH,
+        "time_stretch_choices": TIME_STRETCH_CHOICES,
+        "min_speech_segment_sec": MIN_SPEECH_SEGMENT_SEC,
+        "snr_db_threshold": SNR_DB_THRESHOLD,
+        "clipping_threshold": CLIPPING_THRESHOLD,
+        "occupancy_slow": OCCUPANCY_SLOW,
+        "occupancy_mid": OCCUPANCY_MID,
+        "streaming": streaming,
+        "codec": codec,
+        "bypass_min_savings": bypass_min_savings,
+        "stretch_batch_max_sec": 0.0 if streaming else STRETCH_BATCH_MAX_SEC,
+    }
+    if codec == "opus":
+        params["bitrate"] = bitrate
+    if streaming:
+        params["stream_window_sec"] = window_sec
+        params["stream_overlap_sec"] = STREAM_OVERLAP_SEC
+    elif vad_workers > 1:
+        # chunk boundaries can shift detections slightly; the worker count itself does not
+        params["vad_chunk_sec"] = VAD_CHUNK_SEC
+        params["vad_chunk_overlap_sec"] = VAD_CHUNK_OVERLAP_SEC
+    return params
+
+def make_segment_mapping(
+    index: int,
+    orig_start: float,
+    orig_end: float,
+    proc_start: float,
+    proc_end: float,
+    atempo: float
+) -> SegmentMapping:
+    """
+    Build the mapping entry for one emitted span, with orig = a * proc + b inside the span.
+    """
+    if proc_end - proc_start > 1e-6:
+        a = (orig_end - orig_start) / (proc_end - proc_start)
+        b = orig_start - a * proc_start
+    else:
+        a = 1.0
+        b = orig_start
+    return SegmentMapping(
+        index=index,
+        orig_start=orig_start,
+        orig_end=orig_end,
+        proc_start=proc_start,
+        proc_end=proc_end,
+        atempo=atempo,
+        a=a,
+        b=b
+    )
+
+def identity_mapping(duration: float) -> List[SegmentMapping]:
+    """
+    Mapping for audio that was not preprocessed: processed time == original time.
+    """
+    return [make_segment_mapping(0, 0.0, duration, 0.0, duration, 1.0)]
+
+def is_identity_mapping(mapping: List[SegmentMapping]) -> bool:
+    """
+    True if the mapping comes from a bypassed run, i.e. the original file should be
+    transcribed instead of a processed output.
+    """
+    return (
+        len(mapping) == 1
+        and mapping[0].orig_start == 0.0 and mapping[0].proc_start == 0.0
+        and mapping[0].orig_end == mapping[0].proc_end and mapping[0].atempo == 1.0
+    )
+
+def load_audio(path: str) -> np.ndarray:
     """
-    Load audio file, convert to mono, 16kHz, 16-bit PCM.
+    Load audio file as mono, 16kHz, 16-bit PCM with a single ffmpeg decode.
     Args:
         path: Path to audio file.
     Returns:
-        AudioSegment: normalized audio.
+        np.ndarray: int16 samples (read-only view, no copy).
     """
-    audio = AudioSegment.from_file(path).set_channels(1).set_frame_rate(TARGET_SAMPLE_RATE).set_sample_width(2)
-    return audio
+    return decode_audio(path, TARGET_SAMPLE_RATE)
 
-def audiosegment_to_np_array(audio: AudioSegment) -> np.ndarray:
+def pcm_to_float32(pcm: np.ndarray) -> np.ndarray:
     """
-    Convert AudioSegment to float32 numpy array in [-1, 1].
+    Convert int16 samples to a float32 waveform in [-1, 1].
     Args:
-        audio: AudioSegment
+        pcm: int16 samples
     Returns:
         np.ndarray: waveform
     """
-    arr = np.array(audio.get_array_of_samples(), dtype=np.float32)
+    arr = pcm.astype(np.float32)
     arr /= np.iinfo(np.int16).max
     return arr
 
+class PcmBuffer:
+    """
+    Append-only int16 buffer with geometric growth.
+    Replaces repeated pydub AudioSegment concatenation, which copied the whole
+    accumulated audio on every append (quadratic in the number of spans).
+    """
+
+    def __init__(self, capacity: int):
+        self._data = np.empty(max(int(capacity), 1), dtype=np.int16)
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def append(self, pcm: np.ndarray) -> None:
+        n = len(pcm)
+        if self._size + n > len(self._data):
+            grown = np.empty(max(self._size + n, 2 * len(self._data)), dtype=np.int16)
+            grown[:self._size] = self._data[:self._size]
+            self._data = grown
+        self._data[self._size:self._size + n] = pcm
+        self._size += n
+
+    def view(self) -> np.ndarray:
+        return self._data[:self._size]
+
+def _vad_chunk(
+    waveform: np.ndarray,
+    core_start: int,
+    core_end: int,
+    overlap: int,
+    sr: int
+) -> List[Tuple[float, float]]:
+    """
+    Run VAD on [core_start - overlap, core_end + overlap) and return the detected
+    spans (seconds, absolute) clipped to the core region [core_start, core_end).
+    """
+    win_start = max(0, core_start - overlap)
+    win_end = min(len(waveform), core_end + overlap)
+    with acquire_vad_model() as (vad_model, get_speech_timestamps):
+        speech_timestamps = get_speech_timestamps(
+            waveform[win_start:win_end], vad_model, sampling_rate=sr,
+            return_seconds=True, **VAD_OPTIONS
+        )
+    lo, hi = core_start / sr, core_end / sr
+    spans = []
+    for d in speech_timestamps:
+        start = max(lo, win_start / sr + float(d["start"]))
+        end = min(hi, win_start / sr + float(d["end"]))
+        if end > start:
+            spans.append((start, end))
+    return spans
+
+def detect_speech(
+    waveform: np.ndarray,
+    sr: int = TARGET_SAMPLE_RATE,
+    workers: int = 1,
+    chunk_sec: float = VAD_CHUNK_SEC,
+    overlap_sec: float = VAD_CHUNK_OVERLAP_SEC,
+    torch_threads: Optional[int] = None
+) -> List[Tuple[float, float]]:
+    """
+    Voice activity detection over the whole waveform, optionally chunked across threads.
+    With workers > 1 the waveform is cut into chunk_sec cores; each core is analysed
+    with overlap_sec of context on both sides by its own model instance (torch releases
+    the GIL during inference), and detections are clipped to their core. Speech crossing
+    a core boundary comes back as two touching spans, which merge_and_pad_segments joins.
+    Args:
+        waveform: float32 waveform
+        sr: sample rate
+        workers: number of concurrent VAD threads (1 = single pass)
+        chunk_sec: core length per chunk (sec)
+        overlap_sec: context added on each side of a core (sec)
+        torch_threads: intra-op threads per inference (torch.set_num_threads), default cpu_count // workers
+    Returns:
+        list of (start, end) in seconds, sorted
+    """
+    chunk = int(chunk_sec * sr)
+    if workers <= 1 or len(waveform) <= chunk:
+        vad_model, get_speech_timestamps = get_vad_model()
+        speech_timestamps = get_speech_timestamps(
+            waveform, vad_model, sampling_rate=sr, return_seconds=True, **VAD_OPTIONS
+        )
+        return [(float(d["start"]), float(d["end"])) for d in speech_timestamps]
+
+    import torch
+    overlap = int(overlap_sec * sr)
+    cores = [(s, min(s + chunk, len(waveform))) for s in range(0, len(waveform), chunk)]
+    prev_threads = torch.get_num_threads()
+    torch.set_num_threads(torch_threads or max(1, (os.cpu_count() or 1) // workers))
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = pool.map(lambda c: _vad_chunk(waveform, c[0], c[1], overlap, sr), cores)
+            spans = [span for chunk_spans in results for span in chunk_spans]
+    finally:
+        torch.set_num_threads(prev_threads)
+    return spans
+
 def merge_and_pad_segments(
     segments: List[Tuple[float, float]],
     total_duration: float
@@ -109,7 +385,43 @@ def merge_and_pad_segments(
     merged.append((cur_start, cur_end))
     return merged
 
-def compute_voiced_occupancy(x: np.ndarray, sr: int = TARGET_SAMPLE_RATE, win: float = 0.025, hop: float = 0.010) -> float:
+# Frames are evaluated in blocks so the strided view never materialises more than
+# FRAME_BLOCK x nwin floats at once (a 1 h recording has ~360k frames).
+FRAME_BLOCK = 8192
+
+def compute_frame_energies(
+    x2: np.ndarray,
+    sr: int = TARGET_SAMPLE_RATE,
+    win: float = 0.025,
+    hop: float = 0.010
+) -> np.ndarray:
+    """
+    Compute short-time energy (mean of squared samples + 1e-12) for every hop in one NumPy pass.
+    Args:
+        x2: squared waveform (x ** 2)
+        sr: sample rate
+        win: window size (sec)
+        hop: hop size (sec)
+    Returns:
+        np.ndarray: per-frame energies, empty if there is no full frame
+    """
+    nwin = int(sr * win)
+    nhop = int(sr * hop)
+    if len(x2) < nwin:
+        x2 = np.pad(x2, (0, nwin - len(x2)))
+    frames = np.lib.stride_tricks.sliding_window_view(x2, nwin)[::nhop]
+    E = np.empty(len(frames), dtype=x2.dtype)
+    for i in range(0, len(frames), FRAME_BLOCK):
+        E[i:i + FRAME_BLOCK] = frames[i:i + FRAME_BLOCK].mean(axis=1)
+    return E + 1e-12
+
+def compute_voiced_occupancy(
+    x: np.ndarray,
+    sr: int = TARGET_SAMPLE_RATE,
+    win: float = 0.025,
+    hop: float = 0.010,
+    x2: Optional[np.ndarray] = None
+) -> float:
     """
     Compute voiced occupancy (proxy for speech rate/pauses) using short-time energy.
     Args:
@@ -117,48 +429,73 @@ def compute_voiced_occupancy(x: np.ndarray, sr: int = TARGET_SAMPLE_RATE, win: f
         sr: sample rate
         win: window size (sec)
         hop: hop size (sec)
+        x2: optional precomputed x ** 2 (shared with estimate_snr_db)
     Returns:
         float: ratio of voiced frames
     """
-    nwin = int(sr * win)
-    nhop = int(sr * hop)
-    if len(x) < nwin:
-        x = np.pad(x, (0, nwin - len(x)))
-    frames = []
-    for i in range(0, len(x) - nwin + 1, nhop):
-        frame = x[i:i + nwin]
-        energy = np.mean(frame ** 2) + 1e-12
-        frames.append(energy)
-    if not frames:
+    if x2 is None:
+        x2 = x ** 2
+    E = compute_frame_energies(x2, sr=sr, win=win, hop=hop)
+    if E.size == 0:
         return 1.0
-    E = np.array(frames)
     threshold = max(np.median(E) * 0.5, 1e-10)
     return float((E > threshold).mean())
 
-def estimate_snr_db(x: np.ndarray) -> Tuple[float, float, float]:
+def estimate_snr_db(
+    x: np.ndarray,
+    absx: Optional[np.ndarray] = None,
+    x2: Optional[np.ndarray] = None
+) -> Tuple[float, float, float]:
     """
     Estimate SNR (dB) using RMS and 10th percentile as noise floor.
     Args:
         x: waveform
+        absx: optional precomputed np.abs(x)
+        x2: optional precomputed x ** 2
     Returns:
         (snr_db, rms, noise_floor)
     """
-    absx = np.abs(x)
-    rms = np.sqrt(np.mean(x ** 2) + 1e-12)
+    if absx is None:
+        absx = np.abs(x)
+    if x2 is None:
+        x2 = x ** 2
+    rms = np.sqrt(np.mean(x2) + 1e-12)
     noise = np.percentile(absx, 10) + 1e-12
     snr = 20 * math.log10(max(rms, 1e-8) / noise) if noise > 0 else 60.0
     return snr, rms, noise
 
-def compute_clipping_rate(x: np.ndarray, threshold: float = 0.98) -> float:
+def compute_clipping_rate(
+    x: np.ndarray,
+    threshold: float = 0.98,
+    absx: Optional[np.ndarray] = None
+) -> float:
     """
     Compute fraction of samples above threshold (clipping rate).
     Args:
         x: waveform
         threshold: abs value threshold
+        absx: optional precomputed np.abs(x)
     Returns:
         float: clipping rate
     """
-    return float((np.abs(x) >= threshold).mean())
+    if absx is None:
+        absx = np.abs(x)
+    return float((absx >= threshold).mean())
+
+def compute_segment_features(x: np.ndarray) -> Tuple[float, float, float]:
+    """
+    Compute all stretch-decision features with a single abs/square pass over the segment.
+    Args:
+        x: waveform
+    Returns:
+        (snr_db, clipping_rate, voiced_occupancy)
+    """
+    absx = np.abs(x)
+    x2 = x ** 2
+    snr_db, _, _ = estimate_snr_db(x, absx=absx, x2=x2)
+    clip = compute_clipping_rate(x, absx=absx)
+    voiced_occ = compute_voiced_occupancy(x, x2=x2)
+    return snr_db, clip, voiced_occ
 
 def choose_time_stretch(x: np.ndarray, duration: float) -> float:
     """
@@ -171,9 +508,7 @@ def choose_time_stretch(x: np.ndarray, duration: float) -> float:
     """
     if duration < MIN_SPEECH_SEGMENT_SEC:
         return TIME_STRETCH_CHOICES[0]
-    snr_db, _, _ = estimate_snr_db(x)
-    clip = compute_clipping_rate(x)
-    voiced_occ = compute_voiced_occupancy(x)
+    snr_db, clip, voiced_occ = compute_segment_features(x)
     if snr_db < SNR_DB_THRESHOLD or clip > CLIPPING_THRESHOLD:
         return TIME_STRETCH_CHOICES[0]
     if voiced_occ < OCCUPANCY_SLOW:
@@ -183,122 +518,396 @@ def choose_time_stretch(x: np.ndarray, duration: float) -> float:
     else:
         return TIME_STRETCH_CHOICES[0]
 
-def time_stretch_segment(segment: AudioSegment, factor: float) -> AudioSegment:
+def time_stretch_segment(
+    pcm: np.ndarray,
+    factor: float,
+    sr: int = TARGET_SAMPLE_RATE,
+    x: Optional[np.ndarray] = None
+) -> np.ndarray:
     """
-    Apply time-stretch (preserving pitch) to an AudioSegment using torchaudio/sox.
+    Apply time-stretch (preserving pitch) to mono int16 samples using torchaudio/sox.
     Args:
-        segment: AudioSegment
+        pcm: int16 samples
         factor: time-stretch factor (0.5~2.0)
+        sr: sample rate
+        x: optional float32 view of the same samples in [-1, 1]; when given it is fed
+           to sox directly instead of converting pcm again
     Returns:
-        AudioSegment: time-stretched segment
+        np.ndarray: time-stretched int16 samples
     """
-    if abs(factor - 1.0) < 1e-6:
-        return segment
+    if abs(factor - 1.0) < 1e-6 or pcm.size == 0:
+        return pcm
+    import torch
+    import torchaudio
     assert 0.5 <= factor <= 2.0, "factor must be in [0.5, 2.0]"
     try:
-        seg16 = segment.set_sample_width(2)
-        sr = seg16.frame_rate
-        ch = seg16.channels
-        pcm = np.frombuffer(seg16.raw_data, dtype=np.int16)
-        frames = pcm.size // ch
-        if frames == 0:
-            return segment
-        pcm = pcm.reshape(-1, ch).T.astype(np.float32) / 32768.0
-        wav = torch.from_numpy(pcm)
+        if x is None:
+            x = pcm_to_float32(pcm)
+        wav = torch.from_numpy(x).unsqueeze(0)
         effects = [["tempo", f"{factor}"]]
-        y, sr_out = torchaudio.sox_effects.apply_effects_tensor(wav, sr, effects)
-        y_i16 = (y.clamp(-1, 1) * 32767.0).round().to(torch.int16).cpu().numpy()
-        y_interleaved = y_i16.T.reshape(-1)
-        return AudioSegment(
-            data=y_interleaved.tobytes(),
-            sample_width=2,
-            frame_rate=int(sr_out),
-            channels=y.shape[0],
-        )
+        y, _ = torchaudio.sox_effects.apply_effects_tensor(wav, sr, effects)
+        return (y[0].clamp(-1, 1) * 32767.0).round().to(torch.int16).numpy()
     except Exception as e:
         print(f"[WARN] Time-stretch failed: {e}")
-        return segment
+        return pcm
+
+
+def group_stretch_spans(
+    sample_spans: List[Tuple[int, int]],
+    factors: List[float],
+    max_samples: int
+) -> List[List[int]]:
+    """
+    Group indices of consecutive spans that share a stretch factor, each group holding
+    at most max_samples of input (a single longer span forms its own group).
+    """
+    groups: List[List[int]] = []
+    size = 0
+    for i, (s, e) in enumerate(sample_spans):
+        if groups and factors[groups[-1][-1]] == factors[i] and size + (e - s) <= max_samples:
+            groups[-1].append(i)
+            size += e - s
+        else:
+            groups.append([i])
+            size = e - s
+    return groups
+
+def stretch_spans(
+    pcm: np.ndarray,
+    waveform: np.ndarray,
+    sample_spans: List[Tuple[int, int]],
+    factors: List[float],
+    sr: int = TARGET_SAMPLE_RATE,
+    workers: int = 1,
+    max_batch_sec: float = STRETCH_BATCH_MAX_SEC
+) -> List[np.ndarray]:
+    """
+    Time-stretch many spans with one sox call per group of consecutive equal factors,
+    instead of one call per span. The stretched group is cut back into spans at the
+    input boundaries scaled by the group's actual output/input length ratio, so the
+    per-span lengths add up exactly to the written audio and SegmentMapping stays
+    consistent with the processed file (boundaries land within one WSOLA segment of
+    where a per-span stretch would have put them).
+    Args:
+        pcm: int16 samples of the whole recording
+        waveform: float32 view of the same samples
+        sample_spans: (start, end) sample indices of each span
+        factors: stretch factor per span
+        sr: sample rate
+        workers: threads used to stretch groups concurrently
+        max_batch_sec: upper bound on the input audio per sox call
+    Returns:
+        list of int16 arrays, one per span
+    """
+    groups = group_stretch_spans(sample_spans, factors, int(max_batch_sec * sr))
+
+    def run_group(group: List[int]) -> List[np.ndarray]:
+        factor = factors[group[0]]
+        pieces = [pcm[sample_spans[i][0]:sample_spans[i][1]] for i in group]
+        if abs(factor - 1.0) < 1e-6:
+            return pieces
+        if len(group) == 1:
+            s, e = sample_spans[group[0]]
+            return [time_stretch_segment(pieces[0], factor, sr, x=waveform[s:e])]
+        joined = np.concatenate(pieces)
+        x = np.concatenate([waveform[sample_spans[i][0]:sample_spans[i][1]] for i in group])
+        stretched = time_stretch_segment(joined, factor, sr, x=x)
+        # 按输入长度比例切回每个片段，切点之和等于实际输出长度
+        bounds = np.cumsum([0] + [len(p) for p in pieces])
+        cuts = np.round(bounds * (len(stretched) / max(len(joined), 1))).astype(np.int64)
+        cuts[-1] = len(stretched)
+        return [stretched[cuts[k]:cuts[k + 1]] for k in range(len(group))]
+
+    if workers > 1 and len(groups) > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(run_group, groups))
+    else:
+        results = [run_group(g) for g in groups]
+    metrics.observe("preprocess.stretch_calls", sum(
+        1 for g in groups if abs(factors[g[0]] - 1.0) >= 1e-6))
+    return [piece for group_pieces in results for piece in group_pieces]
 
 
 def preprocess_audio(
     input_path: str,
-    output_path: Optional[str] = None
+    output_path: Optional[str] = None,
+    vad_workers: int = 1,
+    codec: str = "wav",
+    bitrate: Optional[str] = None,
+    bypass_min_savings: float = BYPASS_MIN_SAVINGS,
+    stretch_workers: int = 1
 ):
     """
     Main audio preprocessing pipeline: VAD, segment merge, optional time-stretch, output.
     Also returns a mapping from processed audio time to original audio time.
+    If VAD would trim less than bypass_min_savings of the recording, nothing is written
+    and an identity mapping is returned (see is_identity_mapping): transcribe the original.
     Args:
         input_path: path to input audio file
-        output_path: path to output wav file
+        output_path: path to output audio file
+        vad_workers: threads for chunked VAD (1 = single pass over the waveform)
+        codec: output codec, wav / flac / opus
+        bitrate: Opus bitrate (e.g. "32k")
+        bypass_min_savings: minimum fraction VAD must trim to run stretch/export (0 = never bypass)
+        stretch_workers: threads for batched time-stretch (see stretch_spans)
     Returns:
-        mapping: list of dicts with processed/original time intervals and time_stretch
+        (mapping, stats): list of SegmentMapping with processed/original time intervals and
+        time_stretch, and the PreprocessStats of this run
     Output:
-        Writes processed wav to output_path
+        Writes processed audio to output_path
     """
+    stats = PreprocessStats()
     # 1. Load and normalize
-    audio = load_audio(input_path)
-    total_duration = audio.duration_seconds
-    waveform = audiosegment_to_np_array(audio)
+    with stats.stage("decode"):
+        pcm = load_audio(input_path)
+        waveform = pcm_to_float32(pcm)
+    sr = TARGET_SAMPLE_RATE
+    total_duration = len(pcm) / sr
+    stats.input_duration = total_duration
 
     # 2. Voice Activity Detection (VAD)
-    t0 = time.time()
-    speech_timestamps = get_speech_timestamps(
-        waveform, VAD_MODEL, sampling_rate=TARGET_SAMPLE_RATE,
-        threshold=0.5, min_speech_duration_ms=600,
-        min_silence_duration_ms=200, return_seconds=True
-    )
-    t1 = time.time()
+    with stats.stage("vad"):
+        speech_spans = detect_speech(waveform, sr, workers=vad_workers)
 
     # 3. Merge and pad segments
-    speech_spans = [(float(d["start"]), float(d["end"])) for d in speech_timestamps]
-    speech_spans = merge_and_pad_segments(speech_spans, total_duration)
+    with stats.stage("merge"):
+        speech_spans = merge_and_pad_segments(speech_spans, total_duration)
+
+    # 3b. Early bypass decision: stretch factors are close to 1, so the VAD trim
+    # is the bulk of what the remaining stages would save
+    metrics.incr("preprocess.runs")
+    speech_duration = sum(e - s for s, e in speech_spans)
+    projected_savings = 1 - speech_duration / max(total_duration, 1e-9)
+    if projected_savings < bypass_min_savings:
+        metrics.incr("preprocess.bypass")
+        print(f"Input: {total_duration:.2f}s  speech occupancy {(1 - projected_savings) * 100:.1f}%  "
+              f"→  bypass (projected saving {projected_savings * 100:.1f}% < {bypass_min_savings * 100:.1f}%)")
+        mapping = identity_mapping(total_duration)
+        stats.bypassed = True
+        return mapping, stats.finish(mapping)
 
-    # 4. Process and concatenate segments, record mapping
-    processed = AudioSegment.silent(duration=0, frame_rate=TARGET_SAMPLE_RATE)
+    # 4. Process segments into one preallocated buffer, record mapping
+    # Stretch factors are >= 1.0, so the unstretched span lengths bound the output size.
+    sample_spans = [(int(s * sr), int(e * sr)) for s, e in speech_spans]
+    if USE_TIME_STRETCH:
+        with stats.stage("features"):
+            factors = [choose_time_stretch(waveform[s:e], orig_end - orig_start)
+                       for (orig_start, orig_end), (s, e) in zip(speech_spans, sample_spans)]
+        with stats.stage("stretch"):
+            stretched = stretch_spans(pcm, waveform, sample_spans, factors, sr, workers=stretch_workers)
+    else:
+        factors = [1.0] * len(sample_spans)
+        stretched = [pcm[s:e] for s, e in sample_spans]
+    with stats.stage("export"):
+        processed = PcmBuffer(sum(e - s for s, e in sample_spans))
+        mapping: List[SegmentMapping] = []
+        processed_cursor = 0.0  # seconds in processed audio
+        for idx, ((orig_start, orig_end), segment_stretched) in enumerate(zip(speech_spans, stretched)):
+            processed.append(segment_stretched)
+
+            # build mapping
+            proc_end = processed_cursor + len(segment_stretched) / sr
+            mapping.append(make_segment_mapping(idx, orig_start, orig_end, processed_cursor, proc_end, factors[idx]))
+            processed_cursor = proc_end
+
+        # 5. Save output
+        os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+        write_audio(output_path, processed.view(), sr, codec, bitrate)
+    processed_duration = len(processed) / sr
+    print(f"Input: {total_duration:.2f}s  →  Output: {processed_duration:.2f}s  "
+          f"(Saved {(1 - processed_duration / total_duration) * 100:.1f}% )  in {stats.total_seconds:.2f}s")
+    return mapping, stats.finish(mapping, output_path)
+
+def preprocess_audio_streaming(
+    input_path: str,
+    output_path: Optional[str] = None,
+    window_sec: float = STREAM_WINDOW_SEC,
+    overlap_sec: float = STREAM_OVERLAP_SEC,
+    block_sec: float = STREAM_BLOCK_SEC,
+    codec: str = "wav",
+    bitrate: Optional[str] = None,
+    bypass_min_savings: float = BYPASS_MIN_SAVINGS
+):
+    """
+    Bounded-memory variant of preprocess_audio for multi-hour recordings.
+    Decodes the input in fixed-size blocks through ffmpeg, runs VAD over windows that
+    overlap by overlap_sec, and stretches/writes merged speech spans as soon as they are
+    final. Speech that crosses a window's commit point is re-detected in the next window.
+    Merged spans longer than window_sec are emitted in window_sec pieces, so the retained
+    audio never exceeds roughly two windows regardless of recording length.
+    Span boundaries are converted to sample indices with round(), the same way everywhere,
+    so written samples always match the mapping.
+    The bypass check of preprocess_audio can only run once the whole recording has been
+    seen: if VAD trimmed less than bypass_min_savings, the written output is removed and
+    an identity mapping is returned (transcribe the original), as in preprocess_audio.
+    Args:
+        input_path: path to input audio file
+        output_path: path to output audio file
+        window_sec: VAD window length (sec), bounds peak memory
+        overlap_sec: overlap between consecutive VAD windows (sec)
+        block_sec: decode block size (sec)
+        codec: output codec, wav / flac / opus
+        bitrate: Opus bitrate (e.g. "32k")
+        bypass_min_savings: minimum fraction VAD must trim to keep the output (0 = never bypass)
+    Returns:
+        (mapping, stats): same format as preprocess_audio
+    Output:
+        Writes processed audio to output_path
+    """
+    stats = PreprocessStats(streaming=True)
+    sr = TARGET_SAMPLE_RATE
+    if overlap_sec < VAD_PADDING_SEC or window_sec <= 2 * overlap_sec:
+        raise ValueError("window_sec must exceed 2 * overlap_sec, and overlap_sec must cover VAD_PADDING_SEC")
+    win = int(window_sec * sr)
+    ovl = int(overlap_sec * sr)
+    vad_model, get_speech_timestamps = get_vad_model()
+    blocks = iter_pcm_blocks(input_path, sr, int(block_sec * sr))
+
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    writer = open_audio_writer(output_path, sr, codec, bitrate)
     mapping: List[SegmentMapping] = []
-    processed_cursor = 0.0  # seconds in processed audio
-    for idx, (orig_start, orig_end) in enumerate(speech_spans):
-        segment = audio[int(orig_start * 1000):int(orig_end * 1000)]
-        orig_duration = orig_end - orig_start
+    state = {
+        "buf": np.empty(0, dtype=np.int16),  # retained samples, buf[0] is absolute sample buf_start
+        "buf_start": 0,
+        "pending": None,        # merged padded span [start, end] (sec) not yet emitted
+        "emitted_until": 0.0,   # original-time end of the last emitted span (sec)
+        "proc_cursor": 0.0,     # seconds in processed audio
+    }
+
+    def to_sample(t: float) -> int:
+        return int(round(t * sr))
+
+    def emit(orig_start: float, orig_end: float):
+        buf_len = len(state["buf"])
+        s_start = min(max(0, to_sample(orig_start) - state["buf_start"]), buf_len)
+        s_end = min(max(s_start, to_sample(orig_end) - state["buf_start"]), buf_len)
+        # 映射按实际写出的样本区间记录，保证与输出音频一致
+        orig_start = (state["buf_start"] + s_start) / sr
+        orig_end = (state["buf_start"] + s_end) / sr
+        segment = state["buf"][s_start:s_end]
         if USE_TIME_STRETCH:
-            x = audiosegment_to_np_array(segment)
-            atempo = choose_time_stretch(x, orig_duration)
-            segment_stretched = time_stretch_segment(segment, atempo)
+            with stats.stage("features"):
+                x = pcm_to_float32(segment)
+                atempo = choose_time_stretch(x, orig_end - orig_start)
+            with stats.stage("stretch"):
+                segment_stretched = time_stretch_segment(segment, atempo, sr, x=x)
         else:
             atempo = 1.0
             segment_stretched = segment
-        processed += segment_stretched
-
-        # build mapping
-        proc_duration = segment_stretched.duration_seconds
-        proc_start = processed_cursor
-        proc_end = processed_cursor + proc_duration
-        # Linear mapping: orig = a * proc + b (within this segment)
-        if proc_end - proc_start > 1e-6:
-            a = (orig_end - orig_start) / (proc_end - proc_start)
-            b = orig_start - a * proc_start
+        with stats.stage("export"):
+            writer.write(segment_stretched)
+        proc_end = state["proc_cursor"] + len(segment_stretched) / sr
+        mapping.append(make_segment_mapping(len(mapping), orig_start, orig_end, state["proc_cursor"], proc_end, atempo))
+        state["proc_cursor"] = proc_end
+        state["emitted_until"] = orig_end
+
+    def add_span(start: float, end: float, available: float):
+        # incremental equivalent of merge_and_pad_segments for spans arriving in order
+        s2 = max(0.0, start - VAD_PADDING_SEC, state["emitted_until"])
+        e2 = min(available, end + VAD_PADDING_SEC)
+        if e2 <= s2:
+            return
+        pending = state["pending"]
+        if pending is not None and s2 <= pending[1]:
+            pending[1] = max(pending[1], e2)
         else:
-            a = 1.0
-            b = orig_start
-        mapping.append(SegmentMapping(
-            index=idx,
-            orig_start=orig_start,
-            orig_end=orig_end,
-            proc_start=proc_start,
-            proc_end=proc_end,
-            atempo=atempo,
-            a=a,
-            b=b
-        ))
-        processed_cursor = proc_end
-
-    # 5. Save output
-    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
-    processed.export(output_path, format="wav")
-    processed_duration = processed.duration_seconds
-    print(f"Input: {total_duration:.2f}s  →  Output: {processed_duration:.2f}s  "
-          f"(Saved {(1 - processed_duration / total_duration) * 100:.1f}% )")
-    return mapping
+            if pending is not None:
+                emit(*pending)
+            pending = state["pending"] = [s2, e2]
+        if pending[1] - pending[0] >= window_sec:
+            emit(*pending)
+            state["pending"] = None
+
+    try:
+        eof = False
+        win_start = 0
+        while True:
+            # 1. Decode until the buffer covers [win_start, win_start + win)
+            chunks = [state["buf"]]
+            have = state["buf_start"] + len(state["buf"])
+            while not eof and have < win_start + win:
+                with stats.stage("decode"):
+                    block = next(blocks, None)
+                if block is None:
+                    eof = True
+                    break
+                chunks.append(block)
+                have += len(block)
+            if len(chunks) > 1:
+                state["buf"] = np.concatenate(chunks)
+            available = state["buf_start"] + len(state["buf"])
+            win_end = min(win_start + win, available)
+            is_last = eof and win_end == available
+
+            # 2. VAD over the window
+            if win_end > win_start:
+                with stats.stage("vad"):
+                    x = pcm_to_float32(state["buf"][win_start - state["buf_start"]:win_end - state["buf_start"]])
+                    speech_timestamps = get_speech_timestamps(
+                        x, vad_model, sampling_rate=sr, return_seconds=True, **VAD_OPTIONS
+                    )
+            else:
+                speech_timestamps = []
+
+            # 3. Commit spans that end before the overlap tail; re-detect the crossing one next window
+            commit = win_end if is_last else win_end - ovl
+            next_start = commit
+            for d in speech_timestamps:
+                start = win_start / sr + float(d["start"])
+                end = win_start / sr + float(d["end"])
+                # 最后一个窗口全部提交（秒级时间戳取整后可能略超出音频末尾）
+                if is_last or end * sr <= commit:
+                    add_span(start, end, available / sr)
+                elif start * sr < commit:
+                    if to_sample(start) > win_start:
+                        next_start = to_sample(start)
+                    else:
+                        # speech covers the whole window: cut it at the commit point
+                        add_span(start, commit / sr, available / sr)
+                    break
+                else:
+                    break
+
+            if is_last:
+                if state["pending"] is not None:
+                    emit(*state["pending"])
+                    state["pending"] = None
+                total_duration = available / sr
+                break
+
+            # 4. Drop samples no longer needed by the next window or the pending span
+            win_start = next_start
+            # keep VAD_PADDING_SEC before the window so spans found at its start can be padded
+            keep_from = max(state["buf_start"], win_start - int(VAD_PADDING_SEC * sr))
+            if state["pending"] is not None:
+                keep_from = min(keep_from, to_sample(state["pending"][0]))
+            keep_from = max(keep_from, state["buf_start"])
+            state["buf"] = state["buf"][keep_from - state["buf_start"]:].copy()
+            state["buf_start"] = keep_from
+    finally:
+        blocks.close()
+        with stats.stage("export"):
+            writer.close()
+
+    metrics.incr("preprocess.runs")
+    stats.input_duration = total_duration
+    speech_duration = sum(m.orig_end - m.orig_start for m in mapping)
+    projected_savings = 1 - speech_duration / max(total_duration, 1e-9)
+    if projected_savings < bypass_min_savings:
+        metrics.incr("preprocess.bypass")
+        print(f"[streaming] Input: {total_duration:.2f}s  speech occupancy {(1 - projected_savings) * 100:.1f}%  "
+              f"→  bypass (saving {projected_savings * 100:.1f}% < {bypass_min_savings * 100:.1f}%)")
+        try:
+            os.remove(output_path)
+        except OSError:
+            pass
+        mapping = identity_mapping(total_duration)
+        stats.bypassed = True
+        return mapping, stats.finish(mapping)
+    processed_duration = state["proc_cursor"]
+    print(f"[streaming] Input: {total_duration:.2f}s  →  Output: {processed_duration:.2f}s  "
+          f"(Saved {(1 - processed_duration / max(total_duration, 1e-9)) * 100:.1f}% )  in {stats.total_seconds:.2f}s")
+    return mapping, stats.finish(mapping, output_path)
 
 def processed_time_to_original_time(processed_time: float, mapping: List[SegmentMapping]) -> float:
     """
@@ -315,9 +924,42 @@ def processed_time_to_original_time(processed_time: float, mapping: List[Segment
     # If not found, return last
     return mapping[-1].orig_end if mapping else processed_time
 
+class TimelineIndex:
+    """
+    Sorted-array view of a SegmentMapping list for O(log n) processed -> original lookups.
+    Zero-length spans are dropped (they can never contain a time); the remaining spans are
+    disjoint, so searchsorted finds the same span as the linear scan in
+    processed_time_to_original_time, and times outside every span fall through to the
+    last span's orig_end exactly as before.
+    """
+
+    def __init__(self, mapping: List[SegmentMapping]):
+        spans = sorted((m for m in mapping if m.proc_end > m.proc_start), key=lambda m: m.proc_start)
+        self.proc_start = np.array([m.proc_start for m in spans], dtype=np.float64)
+        self.proc_end = np.array([m.proc_end for m in spans], dtype=np.float64)
+        self.a = np.array([m.a for m in spans], dtype=np.float64)
+        self.b = np.array([m.b for m in spans], dtype=np.float64)
+        self.fallback = mapping[-1].orig_end if mapping else None
+
+    def to_original(self, processed_times: np.ndarray) -> np.ndarray:
+        """
+        Map an array of processed-audio times to original-audio times in one pass.
+        """
+        t = np.asarray(processed_times, dtype=np.float64)
+        if self.fallback is None:
+            return t.copy()
+        if self.proc_start.size == 0:
+            return np.full_like(t, self.fallback)
+        idx = np.searchsorted(self.proc_start, t, side="right") - 1
+        safe = np.clip(idx, 0, None)
+        found = (idx >= 0) & (t < self.proc_end[safe])
+        return np.where(found, self.a[safe] * t + self.b[safe], self.fallback)
+
 def remap_segments_to_original_timeline(segments: List[dict], mapping: List[SegmentMapping]) -> List[dict]:
     """
     Remap transcription segments from processed audio timeline to original audio timeline.
+    All segment- and word-level timestamps are collected first and remapped with a single
+    vectorized lookup (see TimelineIndex) instead of a linear scan per timestamp.
     Args:
         segments: list of transcription segments
         mapping: list of SegmentMapping as output by preprocess_audio
@@ -327,24 +969,33 @@ def remap_segments_to_original_timeline(segments: List[dict], mapping: List[Segm
     if not mapping:
         return segments
     remapped_segments = segments.copy()
+    targets = []  # (dict, key) pairs, in the same order as values
+    values = []
     for seg in remapped_segments:
-        # remap segment-level
+        # segment-level
         for k in ("start", "end"):
             v = seg.get(k)
             if v is not None:
-                seg[k] = float(processed_time_to_original_time(float(v), mapping))
-        # remap word-level (if exist)
+                targets.append((seg, k))
+                values.append(float(v))
+        # word-level (if exist)
         words = seg.get("words")
         if isinstance(words, list):
             for w in words:
                 for k in ("start", "end"):
                     v = w.get(k)
                     if v is not None:
-                        w[k] = float(processed_time_to_original_time(float(v), mapping))
+                        targets.append((w, k))
+                        values.append(float(v))
+    if not values:
+        return remapped_segments
+    remapped = TimelineIndex(mapping).to_original(np.array(values, dtype=np.float64))
+    for (obj, k), v in zip(targets, remapped.tolist()):
+        obj[k] = v
     return remapped_segments
 
 if __name__ == "__main__":
-    mapping = preprocess_audio(
+    mapping, stats = preprocess_audio(
         "/home/lifeng/asr_benchmark/EN2001b.Mix-Headset.wav",
         "/home/lifeng/asr_benchmark/EN2001b.Mix-Headset_trim.wav"
     )
@@ -352,3 +1003,4 @@ if __name__ == "__main__":
     t_proc = 10.0
     t_orig = processed_time_to_original_time(t_proc, mapping)
     print(f"Processed {t_proc}s maps to original {t_orig:.2f}s")
+    print(stats.to_dict())
@@ -0,0 +1,174 @@
+# preprocess_cache.py
+# Local-disk cache for preprocessing outputs (processed audio + SegmentMapping),
+# keyed by a hash of the source file content and the preprocessing parameters.
+# A retried process_audio (e.g. after a transcription backend failure) reuses the
+# cached output instead of redoing VAD, time-stretch and export.
+
+import os
+import json
+import time
+import fcntl
+import shutil
+import hashlib
+import logging
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import List, Optional, Tuple
+
+from app.utils import metrics
+from app.utils.result_cache import hash_file
+from app.workers.algos.preprocess_audio import SegmentMapping, mapping_to_dicts, mapping_from_dicts
+
+logger = logging.getLogger(__name__)
+
+CACHE_VERSION = 1
+AUDIO_STEM = "audio"
+MAPPING_FILE = "mapping.json"
+LOCK_FILE = ".lock"
+
+
+class PreprocessCache:
+    """
+    Size-bounded LRU cache of preprocessing outputs on local disk.
+    Each entry is a directory <cache_dir>/<key>/ holding the processed audio and the
+    serialized mapping. Entries are published with an atomic rename, so concurrent
+    workers never see partial entries; recency is tracked through the directory mtime.
+    Celery prefork workers are separate processes sharing cache_dir, so get() and evict()
+    also hold an flock on <cache_dir>/.lock, and entries used within grace_sec are never
+    evicted (a worker may still be uploading / transcribing a file returned by get()).
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int, grace_sec: float = 3600.0):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.grace_sec = grace_sec
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._lock_path = os.path.join(cache_dir, LOCK_FILE)
+
+    @contextmanager
+    def _locked(self):
+        """Exclusive across threads (threading.Lock) and worker processes (flock)."""
+        with self._lock, open(self._lock_path, "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def key_for(self, input_path: str, params: dict) -> str:
+        """
+        Cache key: source content hash + preprocessing parameters.
+        """
+        payload = json.dumps(
+            {"version": CACHE_VERSION, "source": hash_file(input_path), "params": params},
+            sort_keys=True,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _entry_dir(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key)
+
+    def get(self, key: str) -> Optional[Tuple[Optional[str], List[SegmentMapping]]]:
+        """
+        Return (processed_audio_path, mapping) for a cached key, or None on a miss.
+        processed_audio_path is None for bypassed runs (identity mapping, no processed audio).
+        """
+        entry = self._entry_dir(key)
+        try:
+            # 与其他进程的 evict 互斥：读取并刷新 mtime 后，该条目在 grace_sec 内不会被淘汰
+            with self._locked():
+                with open(os.path.join(entry, MAPPING_FILE), "r", encoding="utf-8") as f:
+                    meta = json.load(f)
+                mapping = mapping_from_dicts(meta["mapping"])
+                audio_path = os.path.join(entry, meta["audio"]) if meta["audio"] else None
+                if audio_path and not os.path.exists(audio_path):
+                    raise FileNotFoundError(audio_path)
+                os.utime(entry)  # mark as recently used
+        except (OSError, ValueError, TypeError, KeyError):
+            metrics.incr("preprocess_cache.miss")
+            return None
+        metrics.incr("preprocess_cache.hit")
+        return audio_path, mapping
+
+    def put(self, key: str, processed_path: Optional[str], mapping: List[SegmentMapping]) -> Optional[str]:
+        """
+        Move a freshly processed file into the cache and store its mapping.
+        processed_path is None for bypassed runs; only the mapping is stored.
+        Returns:
+            path of the cached processed audio (use it instead of processed_path)
+        """
+        entry = self._entry_dir(key)
+        # 保留扩展名，转写后端按文件名识别格式
+        audio_name = AUDIO_STEM + os.path.splitext(processed_path)[1] if processed_path else None
+        tmp = tempfile.mkdtemp(prefix=".tmp-", dir=self.cache_dir)
+        try:
+            if audio_name:
+                shutil.move(processed_path, os.path.join(tmp, audio_name))
+            with open(os.path.join(tmp, MAPPING_FILE), "w", encoding="utf-8") as f:
+                json.dump({"audio": audio_name, "mapping": mapping_to_dicts(mapping)}, f)
+            try:
+                os.rename(tmp, entry)
+            except OSError:
+                # 其他 worker 已写入相同 key，保留已有条目
+                shutil.rmtree(tmp, ignore_errors=True)
+        except Exception:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+        self.evict(keep=key)
+        with open(os.path.join(entry, MAPPING_FILE), "r", encoding="utf-8") as f:
+            audio_name = json.load(f)["audio"]
+        return os.path.join(entry, audio_name) if audio_name else None
+
+    def evict(self, keep: Optional[str] = None) -> None:
+        """
+        Remove least recently used entries until the cache fits in max_bytes. Entries used
+        within grace_sec are kept even if the cache stays above max_bytes.
+        Args:
+            keep: key that must survive this pass (the entry just written, still in use)
+        """
+        with self._locked():
+            entries = []
+            total = 0
+            in_use_after = time.time() - self.grace_sec
+            for name in os.listdir(self.cache_dir):
+                path = os.path.join(self.cache_dir, name)
+                if name.startswith(".tmp-") or not os.path.isdir(path):
+                    continue
+                try:
+                    size = sum(e.stat().st_size for e in os.scandir(path) if e.is_file())
+                    mtime = os.stat(path).st_mtime
+                except OSError:
+                    continue
+                total += size
+                if name != keep and mtime < in_use_after:
+                    entries.append((mtime, size, path))
+            entries.sort()
+            while total > self.max_bytes and entries:
+                _, size, path = entries.pop(0)
+                shutil.rmtree(path, ignore_errors=True)
+                total -= size
+                metrics.incr("preprocess_cache.evicted")
+                logger.info(f"Evicted preprocessing cache entry {os.path.basename(path)}")
+
+
+_CACHE: Optional[PreprocessCache] = None
+
+
+def get_preprocess_cache() -> Optional[PreprocessCache]:
+    """
+    Process-wide cache configured from settings, or None when caching is disabled
+    (PREPROCESS_CACHE_MAX_MB <= 0).
+    """
+    global _CACHE
+    from app.core.config import settings
+
+    max_mb = settings.PREPROCESS_CACHE_MAX_MB
+    if max_mb <= 0:
+        return None
+    if _CACHE is None:
+        _CACHE = PreprocessCache(
+            settings.PREPROCESS_CACHE_DIR, int(max_mb * 1024 * 1024), settings.PREPROCESS_CACHE_GRACE_SEC
+        )
+    return _CACHE
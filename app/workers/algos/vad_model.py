@@ -0,0 +1,125 @@
+# vad_model.py
+# Process-wide Silero VAD model provider.
+# The model is loaded lazily from local weights on first use (never via torch.hub over the network),
+# so processes that never run VAD (API pods) do not pay for torch or the model at all.
+
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Callable, List, Optional, Tuple
+
+from app.core.config import settings
+from app.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+_LOCK = threading.Lock()
+_VAD_MODEL = None
+_GET_SPEECH_TIMESTAMPS: Optional[Callable] = None
+# Extra instances for concurrent VAD (chunked mode), reused across calls
+_POOL: List[Tuple[object, Callable]] = []
+
+
+def _resolve_model_path() -> Optional[str]:
+    """
+    Return the configured local model location, or None to use the weights bundled with silero-vad.
+    VAD_MODEL_PATH may point to a TorchScript file (silero_vad.jit) or to a local checkout of
+    the snakers4/silero-vad repo (loaded with torch.hub source='local').
+    """
+    path = getattr(settings, "VAD_MODEL_PATH", None) or os.getenv("VAD_MODEL_PATH")
+    if not path:
+        return None
+    path = os.path.expanduser(path)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"VAD_MODEL_PATH does not exist: {path}")
+    return path
+
+
+def load_vad_model() -> Tuple[object, Callable]:
+    """
+    Load a new Silero VAD model instance from local weights.
+    Silero models keep internal state between calls, so callers that run VAD
+    concurrently should load one instance per worker thread.
+    Returns:
+        (model, get_speech_timestamps)
+    """
+    import torch
+
+    t0 = time.perf_counter()
+    path = _resolve_model_path()
+    if path and os.path.isdir(path):
+        model, utils = torch.hub.load(
+            repo_or_dir=path,
+            model="silero_vad",
+            source="local",
+            trust_repo=True,
+        )
+        get_speech_timestamps = utils[0]
+    else:
+        from silero_vad import load_silero_vad, get_speech_timestamps
+        if path:
+            model = torch.jit.load(path, map_location="cpu")
+            model.eval()
+        else:
+            model = load_silero_vad()
+    elapsed = time.perf_counter() - t0
+    metrics.incr("vad.model_load.count")
+    metrics.observe("vad.model_load.seconds", elapsed)
+    logger.info(f"Silero VAD loaded from {path or 'silero-vad package'} in {elapsed:.2f}s")
+    return model, get_speech_timestamps
+
+
+def get_vad_model() -> Tuple[object, Callable]:
+    """
+    Return the process-wide VAD model, loading it on first use.
+    Returns:
+        (model, get_speech_timestamps)
+    """
+    global _VAD_MODEL, _GET_SPEECH_TIMESTAMPS
+    if _VAD_MODEL is None:
+        with _LOCK:
+            if _VAD_MODEL is None:
+                _VAD_MODEL, _GET_SPEECH_TIMESTAMPS = load_vad_model()
+    return _VAD_MODEL, _GET_SPEECH_TIMESTAMPS
+
+
+@contextmanager
+def acquire_vad_model():
+    """
+    Borrow a VAD model instance that no other thread is using.
+    Instances are created on demand and returned to a process-wide pool afterwards,
+    so a chunked VAD run with N workers loads at most N models per process.
+    Yields:
+        (model, get_speech_timestamps)
+    """
+    with _LOCK:
+        instance = _POOL.pop() if _POOL else None
+    if instance is None:
+        instance = load_vad_model()
+    try:
+        yield instance
+    finally:
+        with _LOCK:
+            _POOL.append(instance)
+
+
+def warmup_vad_model() -> None:
+    """
+    Load the model and run one dummy inference so the first real upload
+    does not pay for TorchScript optimisation. Intended for worker_process_init.
+    """
+    try:
+        import torch
+
+        t0 = time.perf_counter()
+        model, _ = get_vad_model()
+        with torch.no_grad():
+            model(torch.zeros(512), 16000)
+        if hasattr(model, "reset_states"):
+            model.reset_states()
+        metrics.observe("vad.warmup.seconds", time.perf_counter() - t0)
+    except Exception as e:
+        # 预热失败不影响 worker 启动，首次使用时会再次尝试加载
+        logger.warning(f"VAD warmup failed: {e}")
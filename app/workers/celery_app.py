@@ -1,4 +1,5 @@
 from celery import Celery
+from celery.signals import worker_process_init
 from app.core.config import settings
 
 celery_app = Celery(
@@ -19,3 +20,12 @@ celery_app.conf.update(
     timezone="UTC",
     enable_utc=True,
 )
+
+
+@worker_process_init.connect
+def warmup_worker_process(**kwargs):
+    """每个 worker 子进程启动时预加载一次 VAD 模型（API 进程不会触发）"""
+    if not settings.VAD_WARMUP_ON_WORKER_INIT:
+        return
+    from app.workers.algos.vad_model import warmup_vad_model
+    warmup_vad_model()
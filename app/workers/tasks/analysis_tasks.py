@@ -1,7 +1,9 @@
 from app.workers.celery_app import celery_app
 from app.services.analysis_service import AnalysisService
 from app.crud.crud_line import crud_line
-from app.workers.algos.analysis_conversation import analyze_conversation_with_threshold, analyze_conversation_summary
+from app.workers.algos.analysis_conversation import (
+    analyze_conversation_with_threshold, analyze_conversation_parallel, analyze_conversation_summary
+)
 from app.core.config import settings
 from app.core.database import SessionLocal
 from app.crud.crud_speaker import crud_speaker
@@ -9,6 +11,7 @@ from app.crud.crud_audio import crud_audio
 from app.crud.crud_segment import crud_segment
 from app.crud.crud_conversation import crud_conversation
 from app.utils.tools import parse_iso_datetime
+from app.utils.progress import publish_progress
 from datetime import datetime, timezone
 import json
 
@@ -16,6 +19,7 @@ import json
 def process_segments_analysis(audio_id: int):
     """异步执行智能分析"""
     db = SessionLocal()
+    publish_progress(audio_id, "segment_analysis", "started")
     try:
         # 1. 获取转录结果（查询所有 lines）
         lines = crud_line.get_multi_by_audio(db=db, audio_id=audio_id)
@@ -40,10 +44,22 @@ def process_segments_analysis(audio_id: int):
         temperature = getattr(settings, 'ANALYSIS_TEMPERATURE', 0.2)
         max_tokens = getattr(settings, 'ANALYSIS_MAX_TOKENS', 4096)
         model_name = getattr(settings, 'ANALYSIS_MODEL_NAME', 'gpt-3.5-turbo')
+        progress_cb = lambda done, total: publish_progress(
+            audio_id, "segment_analysis", "progress", 90.0 * done / max(total, 1)
+        )
         # conversation 作为输入
-        result = analyze_conversation_with_threshold(conversation=conversation, max_input_token=max_input_token,
-                                                     temperature=temperature, max_tokens=max_tokens,
-                                                     model_name=model_name)
+        if settings.ANALYSIS_PARALLEL_WORKERS > 1:
+            # 窗口预切 + 并发分析，耗时约为最慢窗口而非所有块之和
+            result = analyze_conversation_parallel(conversation=conversation, max_input_token=max_input_token,
+                                                   temperature=temperature, max_tokens=max_tokens,
+                                                   model_name=model_name,
+                                                   overlap_tokens=settings.ANALYSIS_OVERLAP_TOKENS,
+                                                   max_workers=settings.ANALYSIS_PARALLEL_WORKERS,
+                                                   progress_cb=progress_cb)
+        else:
+            result = analyze_conversation_with_threshold(conversation=conversation, max_input_token=max_input_token,
+                                                         temperature=temperature, max_tokens=max_tokens,
+                                                         model_name=model_name, progress_cb=progress_cb)
         print(f"Processing analysis for conversation {result}")
         # 3. 保存分析结果到 segments 表
         from app.crud.crud_segment import crud_segment
@@ -146,9 +162,11 @@ def process_segments_analysis(audio_id: int):
                     crud_note.create(db, obj_in=note_data)
         # 4. 更新状态
         # TODO: 更新 conversation 分析状态
+        publish_progress(audio_id, "segment_analysis", "completed", segments=len(result.get('segments', [])))
         return {"status": "completed", "conversation_id": conversation_id, "lines": len(lines)}
     except Exception as e:
         print(f"Analysis failed for conversation {conversation_id}: {str(e)}")
+        publish_progress(audio_id, "segment_analysis", "failed", error=str(e))
         return {"status": "failed", "error": str(e)}
     finally:
         db.close()
@@ -157,6 +175,7 @@ def process_segments_analysis(audio_id: int):
 def process_conversation_analysis(audio_id: int):
     """异步执行conversation总结"""
     print(f"Conversation analysis started for audio {audio_id}")
+    publish_progress(audio_id, "conversation_summary", "started")
     db = SessionLocal()
     try:
         # 1. 获取分析结果（）
@@ -195,9 +214,11 @@ def process_conversation_analysis(audio_id: int):
         }
         conversation_info = crud_conversation.update(db, db_obj=conversation_info, obj_in=new_conversation_data)
         print(f"Conversation analysis done for audio {audio_id}")
+        publish_progress(audio_id, "conversation_summary", "completed", conversation_id=conversation_info.id)
         return {"status": "completed", "conversation_id": conversation_info.id, "audio_id": audio_id}
     except Exception as e:
         print(f"Conversation analysis failed for audio {audio_id}: {str(e)}")
+        publish_progress(audio_id, "conversation_summary", "failed", error=str(e))
         return {"status": "failed", "error": str(e)}
     finally:
         db.close()
\ No newline at end of file
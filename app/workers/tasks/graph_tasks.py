@@ -6,6 +6,7 @@ import json
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from app.utils.llm_selector import chat_with_llm
+from app.utils import prompt_registry
 from sqlalchemy.orm import Session
 from app.schemas.relationship import Relationship
 from app.schemas.base import Base
@@ -61,17 +62,13 @@ def parse_llm_response_with_relationship(response):
     except json.JSONDecodeError:
         return [], None
 
-def load_relationship_types():
-    """
-    Load relationship types from the event_relationship.json file.
+# 使用绝对路径避免文件找不到的问题
+RELATIONSHIP_TYPES_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "workers", "algos", "event_relationship.json"
+)
 
-    Returns:
-        A list of relationship types.
-    """
-    # 使用绝对路径避免文件找不到的问题
-    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    file_path = os.path.join(base_dir, "workers", "algos", "event_relationship.json")
-    
+def read_relationship_types(file_path):
+    """Parse the relationship types out of event_relationship.json."""
     try:
         with open(file_path, "r") as file:
             data = json.load(file)
@@ -80,6 +77,18 @@ def load_relationship_types():
         print(f"Warning: Relationship types file not found at {file_path}")
         return ["FOLLOWS", "PRECEDES", "RELATED_TO"]  # 默认关系类型
 
+prompt_registry.register_fragment("relationship_types", read_relationship_types, RELATIONSHIP_TYPES_PATH)
+
+def load_relationship_types():
+    """
+    Load relationship types from the event_relationship.json file
+    (parsed once per process, reloaded when the file changes).
+
+    Returns:
+        A list of relationship types.
+    """
+    return prompt_registry.get_fragment("relationship_types")
+
 def generate_llm_prompt(isolated, group):
     """
     Generate a prompt for the LLM to evaluate the relationship between an isolated segment and a group.
@@ -3,24 +3,36 @@ from app.services.transcription_service import TranscriptionService
 from app.crud.crud_audio import crud_audio
 from app.crud.crud_line import crud_line
 from app.core.config import settings
-from app.workers.algos.preprocess_audio import preprocess_audio, remap_segments_to_original_timeline
+from app.workers.algos.audio_io import output_extension
+from app.workers.algos.preprocess_audio import (
+    preprocess_audio, preprocess_audio_streaming, preprocess_params, is_identity_mapping,
+    remap_segments_to_original_timeline, mapping_to_dicts, mapping_from_dicts,
+)
+from app.workers.algos.preprocess_cache import get_preprocess_cache
+from app.workers.algos.chunked_transcription import transcribe_chunked
 from app.core.database import SessionLocal
+from app.utils.progress import publish_progress
+from app.utils.transcription_client import (
+    AssemblyAIClient, get_backend, get_transcript_cache, get_transcription_client,
+    transcribe_cached, transcript_cache_key, utterances_to_segments,
+)
+from celery.exceptions import Ignore, Retry
 import os
-import requests
+import json
 import time
 from datetime import timedelta
 from app.crud.crud_tenant import crud_tenant
 
-@celery_app.task
-def process_audio(audio_id: int):
+@celery_app.task(bind=True)
+def process_audio(self, audio_id: int):
     """异步处理音频分析主入口，供上传后调用"""
     db = SessionLocal()
     print("db.bind.url", db.bind.url)
     preproc_path = None
+    stage = "preprocess"
     try:
         # 查询 audio 记录
         audio = crud_audio.get(db, id=audio_id)
-        audio_start_time = getattr(audio, 'started_at', None)
         print("Processing audio for transcription:", audio.source_path)
         if not audio:
             print(f"Audio {audio_id} not found")
@@ -28,55 +40,104 @@ def process_audio(audio_id: int):
         # 获取音频文件绝对路径
         audio_path = os.path.join(settings.UPLOAD_DIR, str(audio.tenant_id), os.path.basename(audio.source_path))
 
-        # === (1) 先做预处理 ===
-        base, ext = os.path.splitext(audio_path)
-        preproc_path = f"{base}_preproc{ext}"
-        print(f"Preprocessing audio: {audio_path} -> {preproc_path}")
-        mapping = preprocess_audio(input_path=audio_path, output_path=preproc_path)
-
-        # === (2) 调用转录服务 ===
-        print(f"Transcribing audio: {preproc_path}")
-        segments = transcribe(preproc_path)
+        # === (1) 先做预处理（命中缓存则直接复用） ===
+        publish_progress(audio_id, stage, "started")
+        codec = settings.PREPROCESS_OUTPUT_CODEC.lower()
+        bitrate = settings.PREPROCESS_OPUS_BITRATE
+        base, _ = os.path.splitext(audio_path)
+        preproc_path = f"{base}_preproc{output_extension(codec)}"
+        cache = get_preprocess_cache()
+        cache_key = None
+        cached = None
+        preprocess_stats = None
+        if cache is not None:
+            params = preprocess_params(
+                streaming=settings.PREPROCESS_STREAMING,
+                window_sec=settings.PREPROCESS_STREAM_WINDOW_SEC,
+                vad_workers=settings.VAD_WORKERS,
+                codec=codec,
+                bitrate=bitrate,
+                bypass_min_savings=settings.PREPROCESS_BYPASS_MIN_SAVINGS,
+            )
+            cache_key = cache.key_for(audio_path, params)
+            cached = cache.get(cache_key)
+        if cached is not None:
+            transcribe_path, mapping = cached
+            print(f"Preprocessing cache hit for audio {audio_id}: {transcribe_path}")
+        else:
+            print(f"Preprocessing audio: {audio_path} -> {preproc_path}")
+            if settings.PREPROCESS_STREAMING:
+                mapping, preprocess_stats = preprocess_audio_streaming(
+                    input_path=audio_path, output_path=preproc_path,
+                    window_sec=settings.PREPROCESS_STREAM_WINDOW_SEC,
+                    codec=codec, bitrate=bitrate,
+                    bypass_min_savings=settings.PREPROCESS_BYPASS_MIN_SAVINGS
+                )
+            else:
+                mapping, preprocess_stats = preprocess_audio(
+                    input_path=audio_path, output_path=preproc_path,
+                    vad_workers=settings.VAD_WORKERS,
+                    codec=codec, bitrate=bitrate,
+                    bypass_min_savings=settings.PREPROCESS_BYPASS_MIN_SAVINGS,
+                    stretch_workers=settings.PREPROCESS_STRETCH_WORKERS
+                )
+            # 各阶段耗时等统计写入 metrics，并随任务结果返回
+            preprocess_stats.emit()
+            print(f"Preprocessing stats for audio {audio_id}: {json.dumps(preprocess_stats.to_dict())}")
+            # VAD 节省过少时跳过预处理，直接转写原始文件
+            transcribe_path = None if is_identity_mapping(mapping) else preproc_path
+            if cache is not None:
+                # 文件移入缓存目录，由缓存淘汰负责清理
+                transcribe_path = cache.put(cache_key, transcribe_path, mapping)
+        if transcribe_path is None:
+            transcribe_path = audio_path
 
-        # === (3) 将转录结果的时间戳映射回原始音频时间轴 ===
-        segments = remap_segments_to_original_timeline(segments, mapping)
+        preprocess = preprocess_stats.to_dict() if preprocess_stats is not None else None
+        publish_progress(audio_id, stage, "completed", cached=cached is not None)
 
-        print(f"Transcribe {len(segments)} segments for audio {audio_id}")
-        # 写入 lines 表
-        for seg in segments:
-            started_at = None
-            if audio_start_time is not None and seg.get("start") is not None:
-                started_at = audio_start_time + timedelta(seconds=seg.get("start"))
-            ended_at = None
-            if audio_start_time is not None and seg.get("end") is not None:
-                ended_at = audio_start_time + timedelta(seconds=seg.get("end"))
-            # 优化 line_data 字段，支持 seg 结构
-            # speaker_id_in_audio 从 words[0]['speaker'] 获取（如有）
-            speaker_id_in_audio = None
-            if seg.get("words") and isinstance(seg["words"], list) and seg["words"]:
-                speaker_id_in_audio = seg["words"][0].get("speaker")
-            confidence = None
-            if seg.get("words") and isinstance(seg["words"], list) and seg["words"]:
-                confidence = seg["words"][0].get("score")
-            line_data = {
-                "tenant_id": audio.tenant_id,
-                "audio_id": audio_id,
-                "speaker_id": None,  # 可为 None，目前无法知道
-                "speaker_id_in_audio": speaker_id_in_audio,  # 优先用 words[0]['speaker']
-                "started_at": started_at,
-                "ended_at": ended_at,
-                "text": seg.get("text"),
-                "confidence": confidence,
-            }
-            # 写入数据库
-            line = crud_line.create(db, obj_in=line_data)
-            # print(f"Line created: {line.id} for audio {audio_id}")
-        # 可选：更新 audio 状态
-        db_obj = crud_audio.get(db, audio_id)
-        crud_audio.update(db, db_obj=db_obj, obj_in={"transcription_status": "transcribed"})
-        return {"status": "completed", "audio_id": audio_id, "lines": len(segments)}
+        # === (2) 调用转录服务 ===
+        stage = "transcribe"
+        publish_progress(audio_id, stage, "started")
+        print(f"Transcribing audio: {transcribe_path}")
+        if settings.TRANSCRIBE_ASYNC_POLL and get_backend() == "ASSEMBLYAI":
+            # 只上传并提交任务，轮询交给 collect_transcription（countdown 重试），不占用 worker
+            client = AssemblyAIClient()
+            cache = get_transcript_cache()
+            cache_key = transcript_cache_key(client, transcribe_path) if cache is not None else None
+            segments = cache.get(cache_key) if cache is not None else None
+            if segments is not None:
+                # 相同音频 + 参数已转写过（重跑 / 重放），不再上传
+                print(f"[transcript_cache] hit {client.backend} {cache_key[:12]}")
+                return store_transcription(db, audio, segments, mapping, preprocess)
+            transcript_id = client.submit(client.upload(transcribe_path))
+            print(f"Submitted AssemblyAI transcript {transcript_id} for audio {audio_id}")
+            publish_progress(audio_id, stage, "progress", 10, transcript_id=transcript_id)
+            # replace 会把 chain 中的后续任务（分析任务）挂到 collect_transcription 之后
+            raise self.replace(collect_transcription.si(
+                audio_id, transcript_id, mapping_to_dicts(mapping), preprocess, time.time(), cache_key
+            ))
+        if settings.TRANSCRIBE_CHUNK_SEC > 0 and not is_identity_mapping(mapping):
+            # 长录音按静音边界分块并行转写，分块结果偏移回预处理时间轴
+            client = get_transcription_client()
+            print(f"Using transcription backend: {client.backend} (chunked, {settings.TRANSCRIBE_CHUNK_SEC:.0f}s chunks)")
+            segments = transcribe_chunked(
+                transcribe_path, mapping, lambda path: transcribe_cached(client, path),
+                chunk_sec=settings.TRANSCRIBE_CHUNK_SEC,
+                overlap_sec=settings.TRANSCRIBE_CHUNK_OVERLAP_SEC,
+                workers=settings.TRANSCRIBE_CHUNK_WORKERS,
+                max_attempts=settings.TRANSCRIBE_CHUNK_ATTEMPTS,
+                progress_cb=lambda done, total: publish_progress(
+                    audio_id, "transcribe", "progress", 90.0 * done / total, chunks_done=done, chunks=total
+                ),
+            )
+        else:
+            segments = transcribe(transcribe_path)
+        return store_transcription(db, audio, segments, mapping, preprocess)
+    except (Ignore, Retry):
+        raise
     except Exception as e:
         print(f"Audio processing failed for {audio_id}: {str(e)}")
+        publish_progress(audio_id, stage, "failed", error=str(e))
         return {"status": "failed", "error": str(e)}
     finally:
         # === (4) 清理临时预处理文件 ===
@@ -88,77 +149,99 @@ def process_audio(audio_id: int):
             pass
         db.close()
 
-def transcribe(audio_path: str):
-    backend = os.getenv("TRANSCRIBE_BACKEND", "WHISPERX").upper() # WHISPERX or ASSEMBLYAI
-    print(f"Using transcription backend: {backend}")
+def store_transcription(db, audio, segments, mapping, preprocess=None):
+    """将转录结果映射回原始时间轴并写入 lines 表，更新 audio 状态"""
+    audio_id = audio.id
+    audio_start_time = getattr(audio, 'started_at', None)
+    # === (3) 将转录结果的时间戳映射回原始音频时间轴 ===
+    segments = remap_segments_to_original_timeline(segments, mapping)
 
-    if backend == "WHISPERX":
-        url = os.getenv("WHISPERX_URL") # "http://10.183.155.10:5525/transcribe"
-        response = requests.post(
-            url,
-            files={"file": open(audio_path, "rb")},
-            data={"batch_size": 16, "diarize": "true", "return_char_alignments": "false"}
-        )
-        result = response.json()
-        return result["segments"]
-    elif backend == "ASSEMBLYAI":
-        base_url = os.getenv("ASSEMBLYAI_URL")   # "https://api.assemblyai.com"
-        api_key = os.getenv("ASSEMBLYAI_API_KEY") # "4f65babe18ad449ab666849fb26eab4b"
-        if not api_key:
-            raise RuntimeError("ASSEMBLYAI_API_KEY is required for ASSEMBLYAI backend")
-        headers = {"authorization": api_key}
-        # 1. upload file for transcription
-        with open(audio_path, "rb") as f:
-            response = requests.post(
-                url=base_url + "/v2/upload",
-                headers=headers,
-                data=f
-            )
-        # 2. get transcript id
-        upload_url = response.json()["upload_url"]
-        data = {
-            "audio_url": upload_url,
-            "speaker_labels": True,
-            "language_detection": True,
-            "punctuate": True,
-            "format_text": True,
-            "speech_model": "universal"
+    print(f"Transcribe {len(segments)} segments for audio {audio_id}")
+    # 写入 lines 表（单事务批量插入）
+    lines_data = []
+    for seg in segments:
+        started_at = None
+        if audio_start_time is not None and seg.get("start") is not None:
+            started_at = audio_start_time + timedelta(seconds=seg.get("start"))
+        ended_at = None
+        if audio_start_time is not None and seg.get("end") is not None:
+            ended_at = audio_start_time + timedelta(seconds=seg.get("end"))
+        # 优化 line_data 字段，支持 seg 结构
+        # speaker_id_in_audio 从 words[0]['speaker'] 获取（如有）
+        speaker_id_in_audio = None
+        if seg.get("words") and isinstance(seg["words"], list) and seg["words"]:
+            speaker_id_in_audio = seg["words"][0].get("speaker")
+        confidence = None
+        if seg.get("words") and isinstance(seg["words"], list) and seg["words"]:
+            confidence = seg["words"][0].get("score")
+        line_data = {
+            "tenant_id": audio.tenant_id,
+            "audio_id": audio_id,
+            "speaker_id": None,  # 可为 None，目前无法知道
+            "speaker_id_in_audio": speaker_id_in_audio,  # 优先用 words[0]['speaker']
+            "started_at": started_at,
+            "ended_at": ended_at,
+            "text": seg.get("text"),
+            "confidence": confidence,
         }
-        response = requests.post(
-            url=base_url + "/v2/transcript",
-            json=data,
-            headers=headers
-        )
-        transcript_id = response.json()['id']
-        # 3. get transcript
-        start_ts = time.time()
-        while True:
-            results = requests.get(
-                url=base_url + "/v2/transcript/" + transcript_id,
-                headers=headers
-            ).json()
-            if results['status'] == 'completed':
-                print(f"Transcript ID:{transcript_id}")
-                utterances = results.get('utterances', [])
-                return _assembly_utterances_to_segments(utterances)
-            elif results['status'] == 'error':
-                raise RuntimeError(f"Transcription failed: {results['error']}")
-            if time.time() - start_ts > 600:
-                raise TimeoutError(f"Polling timed out after 300 seconds (id={transcript_id})")
-            time.sleep(1)
+        lines_data.append(line_data)
+    # 写入数据库
+    line_ids = crud_line.bulk_insert(db, lines_data=lines_data, chunk_size=settings.LINE_INSERT_CHUNK_SIZE)
+    print(f"Inserted {len(line_ids)} lines for audio {audio_id}")
+    # 可选：更新 audio 状态
+    db_obj = crud_audio.get(db, audio_id)
+    crud_audio.update(db, db_obj=db_obj, obj_in={"transcription_status": "transcribed"})
+    result = {"status": "completed", "audio_id": audio_id, "lines": len(segments)}
+    publish_progress(audio_id, "transcribe", "completed", lines=len(segments))
+    if preprocess is not None:
+        result["preprocess"] = preprocess
+    return result
+
 
-def _assembly_utterances_to_segments(utterances):
+@celery_app.task(bind=True)
+def collect_transcription(self, audio_id: int, transcript_id: str, mapping: list, preprocess=None, submitted_at=None,
+                          cache_key=None):
     """
-    将 AssemblyAI 的 utterances 时间戳转换为 ms。
+    AssemblyAI 收集阶段：查询一次任务状态，未完成则以指数退避的 countdown 重新调度自身，
+    不在 worker 中 sleep。完成后写入转写缓存（cache_key）和 lines，chain 中的后续分析任务随后自动执行。
     """
-    segments = []
-    for u in utterances:
-        words = u.get("words", [])
-        for w in words:
-            w["start"] = w["start"] / 1000.0 if w.get("start") is not None else None
-            w["end"] = w["end"] / 1000.0 if w.get("end") is not None else None
-        u["start"] = u.get("start") / 1000.0 if u.get("start") is not None else None
-        u["end"] = u.get("end") / 1000.0 if u.get("end") is not None else None
-        segments.append(u)
-    return segments
+    try:
+        results = AssemblyAIClient().get(transcript_id)
+    except Exception as e:
+        print(f"Polling transcript {transcript_id} failed for audio {audio_id}: {e}")
+        results = {"status": "processing"}
+    status = results.get("status")
+    if status == "error":
+        print(f"Transcription failed for audio {audio_id}: {results.get('error')}")
+        publish_progress(audio_id, "transcribe", "failed", error=results.get("error"))
+        return {"status": "failed", "error": results.get("error")}
+    if status != "completed":
+        if submitted_at and time.time() - submitted_at > settings.ASSEMBLYAI_POLL_TIMEOUT:
+            print(f"Polling timed out for audio {audio_id} (id={transcript_id})")
+            publish_progress(audio_id, "transcribe", "failed", error=f"polling timed out (id={transcript_id})")
+            return {"status": "failed", "error": f"polling timed out (id={transcript_id})"}
+        publish_progress(audio_id, "transcribe", "progress", 50 if status == "processing" else 10,
+                         transcript_id=transcript_id, backend_status=status)
+        countdown = min(settings.ASSEMBLYAI_POLL_INITIAL * 2 ** min(self.request.retries, 16), settings.ASSEMBLYAI_POLL_MAX)
+        raise self.retry(countdown=countdown, max_retries=None)
 
+    print(f"Transcript ID:{transcript_id}")
+    segments = utterances_to_segments(results.get("utterances") or [])
+    cache = get_transcript_cache()
+    if cache is not None and cache_key:
+        cache.set(cache_key, segments)
+    db = SessionLocal()
+    try:
+        audio = crud_audio.get(db, id=audio_id)
+        return store_transcription(db, audio, segments, mapping_from_dicts(mapping), preprocess)
+    except Exception as e:
+        print(f"Audio processing failed for {audio_id}: {str(e)}")
+        publish_progress(audio_id, "transcribe", "failed", error=str(e))
+        return {"status": "failed", "error": str(e)}
+    finally:
+        db.close()
+
+def transcribe(audio_path: str):
+    client = get_transcription_client()
+    print(f"Using transcription backend: {client.backend}")
+    return transcribe_cached(client, audio_path)
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Benchmark: chunk boundary search of analyze_conversation_with_threshold.
+
+Compares the original scan (grow the chunk one utterance at a time, rebuild and re-encode
+the whole prompt each step) with ChunkBoundaryFinder (per-utterance token counts + prefix
+sums + binary search, corrected with exact counts), and checks that both produce identical
+chunk boundaries. Chunk offsets advance like the real loop, stepping back --overlap
+utterances to mimic the dropped overlap segment.
+
+    python benchmarks/bench_chunk_boundaries.py --utterances 5000
+    python benchmarks/bench_chunk_boundaries.py --utterances 5000 --offline   # no tiktoken download
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tiktoken
+
+from app.workers.algos.analysis_conversation import ChunkBoundaryFinder, build_full_dialogue_segmentation_prompt
+
+WORDS = ("we should move the launch to next week because the vendor still has not sent the contract "
+         "and Tracy wants to review budget numbers before Friday meeting okay sounds good").split()
+
+
+def make_conversation(n, seed=0):
+    rng = random.Random(seed)
+    return [
+        {
+            "speaker_id": f"SPEAKER_{rng.randrange(3):02d}",
+            "speaker_name": "",
+            "sentence": " ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 40))),
+        }
+        for _ in range(n)
+    ]
+
+
+def offline_encoding():
+    """Byte-level encoding with the cl100k split pattern; needs no downloaded BPE ranks."""
+    pat = r"""(?i:'s|'t|'re|'ve|'m|'ll|'d)|[^\r\n\p{L}\p{N}]?\p{L}+|\p{N}{1,3}| ?[^\s\p{L}\p{N}]+[\r\n]*|\s*[\r\n]+|\s+(?!\S)|\s+"""
+    return tiktoken.Encoding(
+        name="bytes_cl100k_pattern",
+        pat_str=pat,
+        mergeable_ranks={bytes([i]): i for i in range(256)},
+        special_tokens={},
+    )
+
+
+def linear_chunk_end(conversation, offset, max_input_token, enc):
+    """The original per-utterance scan, kept verbatim for comparison."""
+    n = len(conversation)
+    end = offset
+    while end < n:
+        test_chunk = conversation[offset:end + 1]
+        prompt = build_full_dialogue_segmentation_prompt(test_chunk, save_debug=False)
+        token_count = len(enc.encode(prompt))
+        if token_count > max_input_token:
+            if end == offset:
+                break
+            else:
+                end -= 1
+                break
+        end += 1
+    real_end = end - 1
+    if real_end < offset:
+        real_end = offset
+    return real_end
+
+
+def chunk_ends(conversation, find_end, overlap):
+    ends = []
+    offset = 0
+    n = len(conversation)
+    while offset < n:
+        real_end = find_end(offset)
+        ends.append((offset, real_end))
+        if real_end >= n - 1:
+            break
+        offset = max(offset + 1, real_end + 1 - overlap)
+    return ends
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--utterances", type=int, default=5000)
+    parser.add_argument("--max-input-token", type=int, default=12800)
+    parser.add_argument("--overlap", type=int, default=10, help="utterances re-analysed by the next chunk")
+    parser.add_argument("--model", default="gpt-3.5-turbo")
+    parser.add_argument("--offline", action="store_true", help="byte-level encoding instead of tiktoken BPE")
+    parser.add_argument("--skip-linear", action="store_true", help="only time ChunkBoundaryFinder")
+    args = parser.parse_args()
+
+    enc = offline_encoding() if args.offline else tiktoken.encoding_for_model(args.model)
+    conversation = make_conversation(args.utterances)
+
+    t0 = time.perf_counter()
+    finder = ChunkBoundaryFinder(conversation, args.max_input_token, enc)
+    t_init = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    new = chunk_ends(conversation, finder.chunk_end, args.overlap)
+    t_new = time.perf_counter() - t0
+    print(f"prefix-sum search : {t_init + t_new:8.3f}s  (init {t_init:.3f}s, {len(new)} chunks, "
+          f"{finder.exact_calls} exact prompt encodes)")
+
+    if not args.skip_linear:
+        t0 = time.perf_counter()
+        old = chunk_ends(conversation, lambda o: linear_chunk_end(conversation, o, args.max_input_token, enc),
+                         args.overlap)
+        t_old = time.perf_counter() - t0
+        print(f"linear scan       : {t_old:8.3f}s  speedup {t_old / (t_init + t_new):.0f}x")
+        assert old == new, f"boundaries differ: {old} vs {new}"
+        print("boundaries identical")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Benchmark: decode + float32 conversion, legacy pydub chain vs direct ffmpeg pipe.
+
+Encodes a synthetic recording to webm/m4a/mp3 with ffmpeg, then measures wall time
+and Python-heap peak (tracemalloc, numpy buffers included) for both decode paths.
+The legacy path is only measured when pydub is installed.
+
+    python benchmarks/bench_decode.py --minutes 30
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import subprocess
+import tracemalloc
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.workers.algos.audio_io import FFMPEG_BIN, write_audio
+from app.workers.algos.preprocess_audio import TARGET_SAMPLE_RATE, load_audio, pcm_to_float32
+
+FORMATS = {
+    "webm": ["-c:a", "libopus", "-b:a", "32k"],
+    "m4a": ["-c:a", "aac", "-b:a", "64k"],
+    "mp3": ["-c:a", "libmp3lame", "-b:a", "64k"],
+}
+
+
+def legacy_decode(path):
+    """The previous load_audio + audiosegment_to_np_array path."""
+    from pydub import AudioSegment
+    audio = AudioSegment.from_file(path).set_channels(1).set_frame_rate(TARGET_SAMPLE_RATE).set_sample_width(2)
+    arr = np.array(audio.get_array_of_samples(), dtype=np.float32)
+    arr /= np.iinfo(np.int16).max
+    return arr
+
+
+def direct_decode(path):
+    return pcm_to_float32(load_audio(path))
+
+
+def measure(fn, path):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    out = fn(path)
+    elapsed = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, len(out)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--minutes", type=float, default=30.0)
+    args = parser.parse_args()
+
+    try:
+        import pydub  # noqa: F401
+        has_pydub = True
+    except ImportError:
+        has_pydub = False
+
+    sr = 48000  # typical browser capture rate, so both paths have to resample
+    n = int(args.minutes * 60 * sr)
+    t = np.arange(n) / sr
+    x = (0.2 * np.sin(2 * np.pi * 220 * t) * (np.sin(2 * np.pi * 0.5 * t) > 0)).astype(np.float32)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        src = os.path.join(tmp, "src.wav")
+        write_audio(src, (x * 32767).astype(np.int16), sr)
+        del x, t
+        for ext, codec in FORMATS.items():
+            path = os.path.join(tmp, f"src.{ext}")
+            subprocess.run([FFMPEG_BIN, "-nostdin", "-v", "error", "-y", "-i", src, *codec, path], check=True)
+            size_mb = os.path.getsize(path) / 1e6
+            t_new, m_new, n_new = measure(direct_decode, path)
+            line = f"{ext:5s} ({size_mb:6.1f} MB)  ffmpeg pipe: {t_new:6.2f}s  peak {m_new / 1e6:7.1f} MB"
+            if has_pydub:
+                t_old, m_old, n_old = measure(legacy_decode, path)
+                line = (f"{ext:5s} ({size_mb:6.1f} MB)  pydub: {t_old:6.2f}s  peak {m_old / 1e6:7.1f} MB  |  "
+                        f"ffmpeg pipe: {t_new:6.2f}s  peak {m_new / 1e6:7.1f} MB  |  samples {n_old} vs {n_new}")
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Benchmark: transcript ingestion into `lines`, per-line crud_line.create vs crud_line.bulk_insert.
+
+Runs against the configured PostgreSQL database (or --database-url). Rows are written
+with a random negative audio_id and deleted afterwards, so the benchmark can run on a
+dev database; --tenant-id / --segment-id must reference existing rows because of the
+foreign keys on `lines`.
+
+    python benchmarks/bench_line_insert.py --lines 10000 --tenant-id 1 --segment-id 1
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+from datetime import datetime, timedelta, timezone
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, delete
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+from app.crud.crud_line import crud_line
+from app.schemas.line import Line
+
+
+def make_lines(n, tenant_id, segment_id, audio_id):
+    t0 = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    return [
+        {
+            "tenant_id": tenant_id,
+            "audio_id": audio_id,
+            "segment_id": segment_id,
+            "speaker_id": None,
+            "speaker_id_in_audio": f"SPEAKER_{i % 4:02d}",
+            "started_at": t0 + timedelta(seconds=3 * i),
+            "ended_at": t0 + timedelta(seconds=3 * i + 2.5),
+            "text": f"synthetic transcript line {i} " + "lorem ipsum " * 8,
+            "confidence": 0.9,
+        }
+        for i in range(n)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lines", type=int, default=10000)
+    parser.add_argument("--chunk-size", type=int, default=settings.LINE_INSERT_CHUNK_SIZE)
+    parser.add_argument("--tenant-id", type=int, required=True)
+    parser.add_argument("--segment-id", type=int, required=True)
+    parser.add_argument("--database-url", default=settings.DATABASE_URL)
+    parser.add_argument("--skip-per-line", action="store_true", help="only time bulk_insert")
+    args = parser.parse_args()
+
+    engine = create_engine(args.database_url, pool_pre_ping=True)
+    Session = sessionmaker(bind=engine, autocommit=False, autoflush=False, expire_on_commit=False)
+    audio_id = -random.randint(1, 2 ** 30)
+    rows = make_lines(args.lines, args.tenant_id, args.segment_id, audio_id)
+
+    db = Session()
+    try:
+        if not args.skip_per_line:
+            t0 = time.perf_counter()
+            for line_data in rows:
+                crud_line.create(db, obj_in=line_data)
+            t_old = time.perf_counter() - t0
+            print(f"per-line create : {t_old:8.2f}s  ({args.lines / t_old:8.0f} lines/s)")
+            db.execute(delete(Line).where(Line.audio_id == audio_id))
+            db.commit()
+
+        t0 = time.perf_counter()
+        ids = crud_line.bulk_insert(db, lines_data=rows, chunk_size=args.chunk_size)
+        t_new = time.perf_counter() - t0
+        assert len(ids) == args.lines
+        line = f"bulk_insert     : {t_new:8.2f}s  ({args.lines / t_new:8.0f} lines/s, chunk {args.chunk_size})"
+        if not args.skip_per_line:
+            line += f"  speedup {t_old / t_new:.0f}x"
+        print(line)
+    finally:
+        db.execute(delete(Line).where(Line.audio_id == audio_id))
+        db.commit()
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Benchmark: preprocessed-output codec, encode cost vs upload bytes saved.
+
+Encodes a synthetic processed recording (16 kHz mono int16) as WAV, FLAC and Opus,
+then reports encode time, file size and the projected upload time at --uplink-mbps.
+Each output is decoded back to check that the processed timeline is intact: the
+sample count must match the input and the signal must not be shifted, otherwise
+SegmentMapping offsets would no longer line up with transcript timestamps.
+
+    python benchmarks/bench_output_codec.py --minutes 60 --uplink-mbps 20
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.workers.algos.audio_io import decode_audio, output_extension, write_audio
+from app.workers.algos.preprocess_audio import TARGET_SAMPLE_RATE
+
+CODECS = [("wav", None), ("flac", None), ("opus", "48k"), ("opus", "32k"), ("opus", "24k")]
+
+
+def synth_speech(seconds, sr=TARGET_SAMPLE_RATE, seed=0):
+    """Voiced harmonic bursts with short pauses, as left after VAD trimming."""
+    rng = np.random.default_rng(seed)
+    x = 0.003 * rng.standard_normal(int(seconds * sr)).astype(np.float32)
+    t = 0.0
+    while t < seconds:
+        dur = rng.uniform(1.0, 8.0)
+        a, b = int(t * sr), min(len(x), int((t + dur) * sr))
+        n = np.arange(b - a) / sr
+        phase = 2 * np.pi * np.cumsum(rng.uniform(100, 220) * (1 + 0.05 * np.sin(2 * np.pi * 3 * n))) / sr
+        voiced = sum(np.sin(k * phase) / k for k in range(1, 12))
+        x[a:b] += (0.1 * voiced * 0.5 * (1 + np.sin(2 * np.pi * 4 * n)) ** 2).astype(np.float32)
+        t += dur + rng.uniform(0.2, 0.6)
+    return (np.clip(x, -1, 1) * 32767).astype(np.int16)
+
+
+def alignment_lag(ref, out, sr, max_lag_ms=20):
+    """Lag (samples) maximising the correlation of the first 10 s of ref and out."""
+    n = min(len(ref), len(out), 10 * sr)
+    a = ref[:n].astype(np.float64)
+    b = out[:n].astype(np.float64)
+    max_lag = int(max_lag_ms * sr / 1000)
+    lags = range(-max_lag, max_lag + 1)
+    scores = [np.dot(a[max(0, -k):n - max(0, k)], b[max(0, k):n - max(0, -k)]) for k in lags]
+    return lags[int(np.argmax(scores))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--minutes", type=float, default=60.0)
+    parser.add_argument("--uplink-mbps", type=float, default=20.0, help="upload bandwidth to the ASR backend")
+    args = parser.parse_args()
+
+    sr = TARGET_SAMPLE_RATE
+    pcm = synth_speech(args.minutes * 60)
+    print(f"Processed audio: {len(pcm) / sr / 60:.0f} min, uplink {args.uplink_mbps:.0f} Mbit/s")
+
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp:
+        for codec, bitrate in CODECS:
+            path = os.path.join(tmp, f"out_{codec}_{bitrate or ''}{output_extension(codec)}")
+            t0 = time.perf_counter()
+            write_audio(path, pcm, sr, codec, bitrate)
+            t_encode = time.perf_counter() - t0
+            size = os.path.getsize(path)
+            t_upload = size * 8 / (args.uplink_mbps * 1e6)
+
+            out = decode_audio(path, sr)
+            lag = alignment_lag(pcm, out, sr)
+            ok = len(out) == len(pcm) and lag == 0
+            failed |= not ok
+            label = f"{codec}{'@' + bitrate if bitrate else ''}"
+            print(f"{label:10s} encode {t_encode:6.2f}s  size {size / 1e6:7.1f} MB  upload {t_upload:7.1f}s  "
+                  f"total {t_encode + t_upload:7.1f}s  |  samples {len(out) - len(pcm):+d}  lag {lag:+d}  "
+                  f"{'ok' if ok else 'TIMELINE MISMATCH'}")
+    if failed:
+        raise SystemExit("an output codec changed the processed timeline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Benchmark: sequential analyze_conversation_with_threshold vs analyze_conversation_parallel.
+
+Runs both modes on a synthetic conversation against an OpenAI-compatible endpoint (by default
+the local mock from scripts/mock_services.py) and reports wall-clock time, LLM calls, prompt /
+completion tokens, and whether the merged segments cover every utterance exactly once.
+
+    MOCK_LLM_LATENCY_MS=3000 MOCK_LLM_MS_PER_TOKEN=5 python scripts/mock_services.py --port 8099
+    python benchmarks/bench_parallel_analysis.py --utterances 2000 --workers 4
+    python benchmarks/bench_parallel_analysis.py --offline --max-input-token 40000   # no tiktoken download
+"""
+
+import os
+import sys
+import time
+import threading
+import argparse
+from datetime import datetime, timedelta, timezone
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def coverage_errors(segments, n):
+    seen = [0] * n
+    for seg in segments:
+        start, end = seg["chunk_range"]
+        for i in range(start, end + 1):
+            seen[i] += 1
+    return sum(1 for c in seen if c == 0), sum(1 for c in seen if c > 1)
+
+
+def run(name, fn, conversation, stats):
+    stats.reset_llm_token_stats()
+    calls = stats.LLM_CALLS
+    t0 = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - t0
+    tokens = stats.get_llm_token_stats()
+    missing, doubled = coverage_errors(result["segments"], len(conversation))
+    print(f"{name:<10} {elapsed:8.2f}s  calls {stats.LLM_CALLS - calls:4d}  prompt {tokens['input']:8d}  "
+          f"completion {tokens['output']:7d}  segments {len(result['segments']):4d}  "
+          f"uncovered {missing}  double-covered {doubled}")
+    return elapsed, tokens
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--utterances", type=int, default=2000)
+    parser.add_argument("--max-input-token", type=int, default=12800)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--overlap-tokens", type=int, default=1500)
+    parser.add_argument("--model", default="gpt-3.5-turbo")
+    parser.add_argument("--llm-url", default="http://127.0.0.1:8099/v1")
+    parser.add_argument("--offline", action="store_true", help="byte-level encoding instead of tiktoken BPE")
+    args = parser.parse_args()
+
+    os.environ["LLM_MODEL"] = "QWEN"
+    os.environ["QWEN_API_BASE"] = args.llm_url
+    os.environ.setdefault("DASHSCOPE_API_KEY", "mock")
+    # 不走 LLM 响应缓存，否则第二种模式会命中第一种模式的结果
+    os.environ["LLM_CACHE_BACKEND"] = "none"
+
+    # LLM 客户端在导入时按环境变量创建，先设置环境变量再导入
+    import app.utils.qianwen_chat as stats
+    from bench_chunk_boundaries import make_conversation, offline_encoding
+    from app.utils import prompt_registry
+    from app.workers.algos.analysis_conversation import (
+        analyze_conversation_parallel, analyze_conversation_with_threshold
+    )
+
+    # 统计 LLM 调用次数（并行模式下由多个线程累加）
+    stats.LLM_CALLS = 0
+    calls_lock = threading.Lock()
+    chat = stats.client.chat.completions.create
+
+    def counted_create(*a, **kw):
+        with calls_lock:
+            stats.LLM_CALLS += 1
+        return chat(*a, **kw)
+
+    stats.client.chat.completions.create = counted_create
+
+    if args.offline:
+        prompt_registry.register_encoding(args.model, offline_encoding())
+    conversation = make_conversation(args.utterances)
+    t0 = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    for i, utt in enumerate(conversation):
+        utt["start_time"] = t0 + timedelta(seconds=4 * i)
+        utt["end_time"] = t0 + timedelta(seconds=4 * i + 3)
+
+    t_seq, tok_seq = run("sequential", lambda: analyze_conversation_with_threshold(
+        conversation, max_input_token=args.max_input_token, model_name=args.model), conversation, stats)
+    t_par, tok_par = run("parallel", lambda: analyze_conversation_parallel(
+        conversation, max_input_token=args.max_input_token, model_name=args.model,
+        overlap_tokens=args.overlap_tokens, max_workers=args.workers), conversation, stats)
+    print(f"speedup {t_seq / t_par:.2f}x, prompt tokens {tok_par['input'] / max(tok_seq['input'], 1):.2f}x of sequential")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark: single-pass VAD vs chunked parallel VAD with the real Silero model.
+
+Both runs go through merge_and_pad_segments, as in preprocess_audio, and the fraction of the
+timeline on which the two speech masks agree is reported. The correctness check itself is
+tests/test_detect_speech.py.
+
+    python benchmarks/bench_parallel_vad.py --minutes 60 --workers 8
+"""
+
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.workers.algos.preprocess_audio import TARGET_SAMPLE_RATE, detect_speech, merge_and_pad_segments
+from app.workers.algos.vad_model import get_vad_model
+
+
+def synth_conversation(seconds, sr=TARGET_SAMPLE_RATE, seed=0):
+    """Voiced, syllable-modulated harmonic bursts separated by noisy pauses."""
+    rng = np.random.default_rng(seed)
+    x = 0.003 * rng.standard_normal(int(seconds * sr)).astype(np.float32)
+    t = 0.0
+    while t < seconds:
+        dur = rng.uniform(1.0, 12.0)
+        a, b = int(t * sr), min(len(x), int((t + dur) * sr))
+        n = np.arange(b - a) / sr
+        f0 = rng.uniform(100, 220) * (1 + 0.05 * np.sin(2 * np.pi * 3 * n))
+        phase = 2 * np.pi * np.cumsum(f0) / sr
+        voiced = sum(np.sin(k * phase) / k for k in range(1, 12))
+        syllables = 0.5 * (1 + np.sin(2 * np.pi * rng.uniform(3, 5) * n)) ** 2
+        x[a:b] += (0.1 * voiced * syllables).astype(np.float32)
+        t += dur + rng.uniform(0.3, 6.0)
+    return np.clip(x, -1, 1)
+
+
+def speech_mask(spans, total, resolution=0.01):
+    mask = np.zeros(int(total / resolution) + 1, dtype=bool)
+    for s, e in spans:
+        mask[int(s / resolution):int(e / resolution)] = True
+    return mask
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--minutes", type=float, default=60.0)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4)
+    parser.add_argument("--chunk-sec", type=float, default=300.0)
+    args = parser.parse_args()
+
+    sr = TARGET_SAMPLE_RATE
+    x = synth_conversation(args.minutes * 60)
+    total = len(x) / sr
+    get_vad_model()  # exclude model load from the timings
+
+    t0 = time.perf_counter()
+    single = merge_and_pad_segments(detect_speech(x, sr, workers=1), total)
+    t_single = time.perf_counter() - t0
+
+    detect_speech(x[:int(args.chunk_sec * sr) * 2], sr, workers=args.workers, chunk_sec=args.chunk_sec)  # load pool
+    t0 = time.perf_counter()
+    chunked = merge_and_pad_segments(detect_speech(x, sr, workers=args.workers, chunk_sec=args.chunk_sec), total)
+    t_chunked = time.perf_counter() - t0
+
+    agreement = float((speech_mask(single, total) == speech_mask(chunked, total)).mean())
+    print(f"Audio: {total / 60:.0f} min, spans single={len(single)} chunked={len(chunked)}, "
+          f"timeline agreement {agreement * 100:.3f}%")
+    print(f"single pass: {t_single:7.2f}s ({total / t_single:7.0f}x realtime)")
+    print(f"{args.workers:2d} workers : {t_chunked:7.2f}s ({total / t_chunked:7.0f}x realtime)  "
+          f"speedup {t_single / t_chunked:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
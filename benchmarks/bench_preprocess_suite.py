@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+Preprocessing benchmark suite.
+
+Synthesizes recordings over a grid of length / speech density / SNR / clipping, runs
+the preprocess_audio stages one by one (decode, VAD, merge, features, stretch, export,
+remap) and records the wall time of each stage plus the peak RSS of the run. Every
+scenario runs in a fresh process so peak RSS is per scenario. Results are written as
+JSON so runs on different commits can be diffed.
+
+Runs offline on a CPU-only box. --stub-vad replaces Silero with a deterministic
+energy detector (no torch, no model weights) for CI; without torchaudio the stretch
+stage is reported as skipped.
+
+    python benchmarks/bench_preprocess_suite.py --minutes 10,60 --density 0.3,0.8 \\
+        --snr 30,5 --clipping 0,0.02 --output bench.json
+    python benchmarks/bench_preprocess_suite.py --stub-vad --minutes 2 --output ci.json
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import itertools
+import resource
+import subprocess
+import tempfile
+import multiprocessing
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+# --- Synthetic recordings ---
+
+def synth_recording(seconds, density, snr_db, clipping, sr=16000, seed=0):
+    """
+    Voiced utterances over background noise.
+    Args:
+        seconds: recording length
+        density: target fraction of the timeline that is speech (0~1)
+        snr_db: speech RMS over noise RMS (dB)
+        clipping: fraction of speech samples driven past full scale
+    Returns:
+        (int16 pcm, list of ground-truth (start, end) speech spans in seconds)
+    """
+    rng = np.random.default_rng(seed)
+    n = int(seconds * sr)
+    speech = np.zeros(n, dtype=np.float32)
+    spans = []
+    mean_utt = 4.0
+    mean_gap = mean_utt * (1 - density) / max(density, 1e-3)
+    t = rng.uniform(0, mean_gap)
+    while t < seconds:
+        dur = min(rng.uniform(0.5, 2 * mean_utt - 0.5), seconds - t)
+        a, b = int(t * sr), int((t + dur) * sr)
+        m = np.arange(b - a) / sr
+        phase = 2 * np.pi * np.cumsum(rng.uniform(100, 220) * (1 + 0.05 * np.sin(2 * np.pi * 3 * m))) / sr
+        voiced = sum(np.sin(k * phase) / k for k in range(1, 12))
+        envelope = (0.5 * (1 + np.sin(2 * np.pi * rng.uniform(3, 5) * m))) ** 2
+        speech[a:b] = voiced * envelope
+        spans.append((a / sr, b / sr))
+        t += dur + rng.exponential(mean_gap) if mean_gap > 0 else dur
+
+    active = np.abs(speech) > 0
+    speech_rms = float(np.sqrt(np.mean(speech[active] ** 2))) if active.any() else 1.0
+    if clipping > 0 and active.any():
+        # gain so that `clipping` of the speech samples exceed full scale
+        gain = 1.0 / np.quantile(np.abs(speech[active]), 1 - clipping)
+    else:
+        gain = 0.3 / max(float(np.abs(speech).max()), 1e-9)  # peaks around -10 dBFS
+    speech *= gain
+    noise_rms = speech_rms * gain / (10 ** (snr_db / 20))
+    x = speech + (noise_rms * rng.standard_normal(n)).astype(np.float32)
+    return (np.clip(x, -1, 1) * 32767).astype(np.int16), spans
+
+
+# --- Stub VAD ---
+
+def stub_get_speech_timestamps(audio, model, sampling_rate=16000, return_seconds=False,
+                               threshold=0.5, min_speech_duration_ms=250, min_silence_duration_ms=100, **_):
+    """
+    Energy-based stand-in for silero's get_speech_timestamps (same call signature and output).
+    Frames are 32 ms; a frame is speech when its RMS is above the geometric mean of the
+    10th (noise floor) and 95th (loud speech) frame-RMS percentiles.
+    """
+    x = np.asarray(audio, dtype=np.float32)
+    hop = int(0.032 * sampling_rate)
+    n = len(x) // hop
+    if n == 0:
+        return []
+    rms = np.sqrt(np.mean(x[:n * hop].reshape(n, hop) ** 2, axis=1) + 1e-12)
+    voiced = rms > np.sqrt(np.quantile(rms, 0.1) * np.quantile(rms, 0.95))
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], voiced.astype(np.int8), [0]))))
+    spans = []
+    for s, e in zip(edges[::2], edges[1::2]):
+        s, e = s * hop, e * hop
+        if spans and s - spans[-1][1] < min_silence_duration_ms * sampling_rate / 1000:
+            spans[-1][1] = e
+        else:
+            spans.append([s, e])
+    min_len = min_speech_duration_ms * sampling_rate / 1000
+    div = sampling_rate if return_seconds else 1
+    return [{"start": s / div, "end": e / div} for s, e in spans if e - s >= min_len]
+
+
+def install_stub_vad():
+    from app.workers.algos import vad_model
+    vad_model.load_vad_model = lambda: (None, stub_get_speech_timestamps)
+
+
+# --- Stage runner ---
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # ru_maxrss is KB on Linux
+
+
+def run_scenario(scenario):
+    """Run all stages for one scenario (in a fresh process); returns its result dict."""
+    if scenario["stub_vad"]:
+        install_stub_vad()
+    from app.workers.algos import preprocess_audio as pa
+    from app.workers.algos.audio_io import output_extension, write_audio
+
+    try:
+        import torchaudio  # noqa: F401
+        has_stretch = True
+    except ImportError:
+        has_stretch = False
+
+    sr = pa.TARGET_SAMPLE_RATE
+    pcm, truth = synth_recording(scenario["minutes"] * 60, scenario["density"], scenario["snr_db"],
+                                 scenario["clipping"], sr=sr, seed=scenario["seed"])
+    timings = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        src = os.path.join(tmp, "input.wav")
+        write_audio(src, pcm, sr)
+        del pcm
+        rss_before = peak_rss_mb()
+
+        t0 = time.perf_counter()
+        pcm = pa.load_audio(src)
+        waveform = pa.pcm_to_float32(pcm)
+        timings["decode"] = time.perf_counter() - t0
+        total = len(pcm) / sr
+
+        pa.detect_speech(waveform[:sr], sr)  # exclude model load from the VAD timing
+        t0 = time.perf_counter()
+        spans = pa.detect_speech(waveform, sr, workers=scenario["vad_workers"])
+        timings["vad"] = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        spans = pa.merge_and_pad_segments(spans, total)
+        sample_spans = [(int(s * sr), int(e * sr)) for s, e in spans]
+        timings["merge"] = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        factors = [pa.choose_time_stretch(waveform[s:e], (e - s) / sr) for s, e in sample_spans]
+        timings["features"] = time.perf_counter() - t0
+
+        if has_stretch and pa.USE_TIME_STRETCH:
+            t0 = time.perf_counter()
+            stretched = pa.stretch_spans(pcm, waveform, sample_spans, factors, sr,
+                                         workers=scenario["stretch_workers"])
+            timings["stretch"] = time.perf_counter() - t0
+        else:
+            stretched = [pcm[s:e] for s, e in sample_spans]
+            timings["stretch"] = None
+
+        t0 = time.perf_counter()
+        processed = pa.PcmBuffer(sum(len(p) for p in stretched))
+        mapping, cursor = [], 0.0
+        for idx, ((o_start, o_end), piece) in enumerate(zip(spans, stretched)):
+            processed.append(piece)
+            end = cursor + len(piece) / sr
+            mapping.append(pa.make_segment_mapping(idx, o_start, o_end, cursor, end, factors[idx]))
+            cursor = end
+        out = os.path.join(tmp, "output" + output_extension(scenario["codec"]))
+        pa.write_audio(out, processed.view(), sr, scenario["codec"])
+        timings["export"] = time.perf_counter() - t0
+        bytes_written = os.path.getsize(out)
+
+        # one transcript segment per span, a word every 300 ms
+        segments = [{"start": m.proc_start, "end": m.proc_end,
+                     "words": [{"start": w, "end": min(w + 0.25, m.proc_end)}
+                               for w in np.arange(m.proc_start, m.proc_end, 0.3).tolist()]}
+                    for m in mapping]
+        t0 = time.perf_counter()
+        pa.remap_segments_to_original_timeline(segments, mapping)
+        timings["remap"] = time.perf_counter() - t0
+
+    truth_speech = sum(e - s for s, e in truth)
+    return {
+        "scenario": {k: v for k, v in scenario.items() if k != "seed"},
+        "stages": timings,
+        "total_seconds": sum(v for v in timings.values() if v is not None),
+        "peak_rss_mb": peak_rss_mb(),
+        "peak_rss_before_decode_mb": rss_before,
+        "input_sec": total,
+        "output_sec": cursor,
+        "speech_sec_ground_truth": truth_speech,
+        "spans": len(spans),
+        "stretch_histogram": {str(f): factors.count(f) for f in sorted(set(factors))},
+        "bytes_written": bytes_written,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def floats(value):
+    return [float(v) for v in value.split(",")]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--minutes", type=floats, default=[10.0], help="comma-separated lengths")
+    parser.add_argument("--density", type=floats, default=[0.3, 0.8], help="speech fraction(s)")
+    parser.add_argument("--snr", type=floats, default=[30.0, 5.0], help="SNR(s) in dB")
+    parser.add_argument("--clipping", type=floats, default=[0.0], help="clipped fraction(s) of speech")
+    parser.add_argument("--codec", default="wav")
+    parser.add_argument("--vad-workers", type=int, default=1)
+    parser.add_argument("--stretch-workers", type=int, default=1)
+    parser.add_argument("--stub-vad", action="store_true", help="energy VAD instead of Silero (CI)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="JSON results file (default: stdout)")
+    args = parser.parse_args()
+
+    scenarios = [
+        dict(minutes=m, density=d, snr_db=s, clipping=c, codec=args.codec, vad_workers=args.vad_workers,
+             stretch_workers=args.stretch_workers, stub_vad=args.stub_vad, seed=args.seed)
+        for m, d, s, c in itertools.product(args.minutes, args.density, args.snr, args.clipping)
+    ]
+    ctx = multiprocessing.get_context("spawn")
+    results = []
+    for scenario in scenarios:
+        with ctx.Pool(1) as pool:
+            result = pool.apply(run_scenario, (scenario,))
+        results.append(result)
+        stages = "  ".join(f"{k} {v:.2f}s" if v is not None else f"{k} -" for k, v in result["stages"].items())
+        print(f"{scenario['minutes']:g}min density {scenario['density']:g} snr {scenario['snr_db']:g}dB "
+              f"clip {scenario['clipping']:g}: {stages}  | peak RSS {result['peak_rss_mb']:.0f} MB",
+              file=sys.stderr)
+
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "stub_vad": args.stub_vad,
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
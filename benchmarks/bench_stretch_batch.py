@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Benchmark: per-span time-stretch vs batched stretch_spans on chatty audio.
+
+Synthesizes a conversation of many short utterances (500+ spans by default), picks
+stretch factors with choose_time_stretch, then stretches every span once per call
+(the previous loop) and once with stretch_spans. Reports sox calls, wall time and
+how far the batched span boundaries in processed time drift from the per-span ones.
+
+    python benchmarks/bench_stretch_batch.py --spans 800 --workers 4
+"""
+
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.workers.algos.preprocess_audio import (
+    TARGET_SAMPLE_RATE, choose_time_stretch, group_stretch_spans, pcm_to_float32,
+    stretch_spans, time_stretch_segment, STRETCH_BATCH_MAX_SEC,
+)
+
+
+def synth_chatty(n_spans, sr=TARGET_SAMPLE_RATE, seed=0):
+    """Short voiced utterances (0.8-6 s) separated by short pauses; returns pcm and spans."""
+    rng = np.random.default_rng(seed)
+    durations = rng.uniform(0.8, 6.0, n_spans)
+    gaps = rng.uniform(0.3, 1.5, n_spans)
+    total = int((durations.sum() + gaps.sum()) * sr)
+    x = 0.003 * rng.standard_normal(total).astype(np.float32)
+    spans = []
+    t = 0.0
+    for dur, gap in zip(durations, gaps):
+        a, b = int(t * sr), int((t + dur) * sr)
+        n = np.arange(b - a) / sr
+        phase = 2 * np.pi * np.cumsum(rng.uniform(100, 220) * (1 + 0.05 * np.sin(2 * np.pi * 3 * n))) / sr
+        voiced = sum(np.sin(k * phase) / k for k in range(1, 12))
+        # uneven syllable envelope so choose_time_stretch picks a mix of factors
+        envelope = (0.5 * (1 + np.sin(2 * np.pi * rng.uniform(2, 5) * n))) ** rng.uniform(0.5, 4)
+        x[a:b] += (0.1 * voiced * envelope).astype(np.float32)
+        spans.append((a, b))
+        t += dur + gap
+    pcm = (np.clip(x, -1, 1) * 32767).astype(np.int16)
+    return pcm, spans
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--spans", type=int, default=600)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4)
+    args = parser.parse_args()
+
+    sr = TARGET_SAMPLE_RATE
+    pcm, spans = synth_chatty(args.spans)
+    waveform = pcm_to_float32(pcm)
+    factors = [choose_time_stretch(waveform[s:e], (e - s) / sr) for s, e in spans]
+    groups = group_stretch_spans(spans, factors, int(STRETCH_BATCH_MAX_SEC * sr))
+    hist = {f: factors.count(f) for f in sorted(set(factors))}
+    print(f"Audio: {len(pcm) / sr / 60:.1f} min, {len(spans)} spans, factors {hist}, "
+          f"{sum(1 for g in groups if factors[g[0]] != 1.0)} batched sox calls")
+
+    time_stretch_segment(pcm[:sr], 1.05, sr)  # exclude torchaudio import/initialisation
+
+    t0 = time.perf_counter()
+    per_span = [time_stretch_segment(pcm[s:e], f, sr, x=waveform[s:e]) for (s, e), f in zip(spans, factors)]
+    t_loop = time.perf_counter() - t0
+
+    results = {}
+    for workers in sorted({1, args.workers}):
+        t0 = time.perf_counter()
+        results[workers] = (stretch_spans(pcm, waveform, spans, factors, sr, workers=workers), time.perf_counter() - t0)
+
+    ref = np.cumsum([len(p) for p in per_span]) / sr
+    print(f"per-span loop      : {t_loop:6.2f}s  ({sum(1 for f in factors if f != 1.0)} sox calls)")
+    for workers, (pieces, elapsed) in results.items():
+        got = np.cumsum([len(p) for p in pieces]) / sr
+        drift_ms = np.abs(got - ref).max() * 1000
+        print(f"batched, {workers:2d} workers: {elapsed:6.2f}s  speedup {t_loop / elapsed:5.1f}x  "
+              f"max boundary drift {drift_ms:.1f} ms  output {got[-1]:.2f}s vs {ref[-1]:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
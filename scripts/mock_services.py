@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+本地模拟服务：复现转写后端和 LLM 的 HTTP 接口，用于联调、压测和离线复现性能问题，不访问外部服务。
+
+- WhisperX:   POST /transcribe (multipart: file, batch_size, diarize, ...)
+- AssemblyAI: POST /v2/upload, POST /v2/transcript, GET /v2/transcript/{id}
+- LLM:        POST /v1/chat/completions（OpenAI 兼容，Qwen DashScope compatible-mode）
+              POST /openai/deployments/{deployment}/chat/completions（Azure OpenAI）
+
+返回的 segments 按上传音频时长生成（WAV 读取文件头，其他格式按 MOCK_DEFAULT_DURATION 估计）。
+LLM 按 prompt 类型返回确定性的 JSON：对话分段（覆盖全部 utterance index）、会话总结、检索 plan、
+片段关系；其他 prompt 返回固定文本。MOCK_CANNED_DIR 下的 <kind>.json / <kind>.txt 可覆盖对应输出
+（kind: segmentation / summary / plan / relationship / text）。
+
+延迟与错误率（可按服务覆盖，如 MOCK_LLM_LATENCY_MS；服务名 WHISPERX / ASSEMBLYAI / LLM）：
+    MOCK_LATENCY_MS=200 MOCK_LATENCY_JITTER_MS=50 MOCK_ERROR_RATE=0.05 MOCK_SEED=0
+    MOCK_LLM_MS_PER_TOKEN=0   # LLM 每个输出 token 额外耗时，模拟生成速度
+
+    python scripts/mock_services.py --port 8099
+    TRANSCRIBE_BACKEND=WHISPERX WHISPERX_URL=http://127.0.0.1:8099/transcribe
+    TRANSCRIBE_BACKEND=ASSEMBLYAI ASSEMBLYAI_URL=http://127.0.0.1:8099 ASSEMBLYAI_API_KEY=mock
+    LLM_MODEL=QWEN QWEN_API_BASE=http://127.0.0.1:8099/v1
+    LLM_MODEL=CHATGPT AZURE_OPENAI_ENDPOINT=http://127.0.0.1:8099
+"""
+
+import io
+import os
+import re
+import json
+import time
+import uuid
+import wave
+import random
+import asyncio
+import argparse
+from typing import Dict, Optional
+
+from fastapi import FastAPI, File, Form, Header, HTTPException, Request, UploadFile
+
+MOCK_DEFAULT_DURATION = float(os.getenv("MOCK_DEFAULT_DURATION", "60"))
+# AssemblyAI 任务从提交到 completed 的模拟耗时（秒）
+MOCK_ASSEMBLYAI_PROCESSING_SEC = float(os.getenv("MOCK_ASSEMBLYAI_PROCESSING_SEC", "3"))
+# LLM 分段结果中每个 segment 包含的 utterance 数
+MOCK_SEGMENT_UTTERANCES = int(os.getenv("MOCK_SEGMENT_UTTERANCES", "8"))
+SEGMENT_SEC = 5.0
+
+app = FastAPI(title="CapsoulAI mock services")
+
+_UPLOADS: Dict[str, float] = {}      # upload id -> audio duration (sec)
+_TRANSCRIPTS: Dict[str, dict] = {}   # transcript id -> job
+_RNG = random.Random(int(os.getenv("MOCK_SEED", "0")))
+
+
+def _setting(name: str, service: str, default: float) -> float:
+    """MOCK_<SERVICE>_<NAME>，未设置时回退到 MOCK_<NAME>"""
+    value = os.getenv(f"MOCK_{service}_{name}", os.getenv(f"MOCK_{name}"))
+    return float(value) if value not in (None, "") else default
+
+
+async def simulate(service: str, extra_sec: float = 0.0):
+    """按配置注入延迟和错误（503，客户端应按可重试错误处理）"""
+    latency = _setting("LATENCY_MS", service, 0.0)
+    jitter = _setting("LATENCY_JITTER_MS", service, 0.0)
+    delay = max(0.0, latency + _RNG.uniform(-jitter, jitter)) / 1000.0 + extra_sec
+    if delay > 0:
+        await asyncio.sleep(delay)
+    if _RNG.random() < _setting("ERROR_RATE", service, 0.0):
+        raise HTTPException(status_code=503, detail=f"mock {service.lower()} injected error")
+
+
+def audio_duration(data: bytes) -> float:
+    """WAV 按文件头计算时长，其他格式返回默认时长"""
+    try:
+        with wave.open(io.BytesIO(data)) as wf:
+            return wf.getnframes() / float(wf.getframerate())
+    except (wave.Error, EOFError):
+        return MOCK_DEFAULT_DURATION
+
+
+def canned_segments(duration: float, speakers: int = 2):
+    """每 SEGMENT_SEC 一段、两位说话人交替的固定转写结果（时间单位：秒）"""
+    segments = []
+    t = 0.0
+    i = 0
+    while t < duration:
+        end = min(t + SEGMENT_SEC, duration)
+        speaker = f"SPEAKER_{i % speakers:02d}"
+        words = []
+        w = t
+        for k in range(max(1, int((end - t) / 0.5))):
+            words.append({"word": f"word{k}", "start": round(w, 3), "end": round(min(w + 0.4, end), 3),
+                          "score": 0.9, "speaker": speaker})
+            w += 0.5
+        segments.append({"start": round(t, 3), "end": round(end, 3), "speaker": speaker,
+                         "text": " ".join(x["word"] for x in words), "words": words})
+        t = end
+        i += 1
+    return segments
+
+
+# --- WhisperX ---
+
+@app.post("/transcribe")
+async def whisperx_transcribe(
+    file: UploadFile = File(...),
+    batch_size: int = Form(16),
+    diarize: str = Form("true"),
+    return_char_alignments: str = Form("false"),
+):
+    data = await file.read()
+    await simulate("WHISPERX")
+    return {"segments": canned_segments(audio_duration(data)), "language": "en"}
+
+
+# --- AssemblyAI ---
+
+def _check_auth(authorization):
+    if not authorization:
+        raise HTTPException(status_code=401, detail="missing authorization header")
+
+
+@app.post("/v2/upload")
+async def assemblyai_upload(request: Request, authorization: str = Header(None)):
+    _check_auth(authorization)
+    data = await request.body()
+    await simulate("ASSEMBLYAI")
+    upload_id = uuid.uuid4().hex
+    _UPLOADS[upload_id] = audio_duration(data)
+    return {"upload_url": f"{str(request.base_url).rstrip('/')}/files/{upload_id}"}
+
+
+@app.post("/v2/transcript")
+async def assemblyai_submit(request: Request, authorization: str = Header(None)):
+    _check_auth(authorization)
+    body = await request.json()
+    await simulate("ASSEMBLYAI")
+    upload_id = str(body.get("audio_url", "")).rsplit("/", 1)[-1]
+    if upload_id not in _UPLOADS:
+        raise HTTPException(status_code=400, detail="unknown audio_url")
+    transcript_id = uuid.uuid4().hex
+    _TRANSCRIPTS[transcript_id] = {"submitted_at": time.time(), "duration": _UPLOADS[upload_id], "options": body}
+    return {"id": transcript_id, "status": "queued"}
+
+
+@app.get("/v2/transcript/{transcript_id}")
+async def assemblyai_get(transcript_id: str, authorization: str = Header(None)):
+    _check_auth(authorization)
+    job = _TRANSCRIPTS.get(transcript_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="transcript not found")
+    elapsed = time.time() - job["submitted_at"]
+    if elapsed < MOCK_ASSEMBLYAI_PROCESSING_SEC / 2:
+        return {"id": transcript_id, "status": "queued"}
+    if elapsed < MOCK_ASSEMBLYAI_PROCESSING_SEC:
+        return {"id": transcript_id, "status": "processing"}
+    utterances = []
+    for seg in canned_segments(job["duration"]):
+        # AssemblyAI 返回毫秒
+        utterances.append({
+            "speaker": seg["speaker"][-1],
+            "text": seg["text"],
+            "start": int(seg["start"] * 1000),
+            "end": int(seg["end"] * 1000),
+            "confidence": 0.9,
+            "words": [{"text": w["word"], "start": int(w["start"] * 1000), "end": int(w["end"] * 1000),
+                       "confidence": 0.9, "speaker": seg["speaker"][-1]} for w in seg["words"]],
+        })
+    return {"id": transcript_id, "status": "completed", "audio_duration": job["duration"],
+            "text": " ".join(u["text"] for u in utterances), "utterances": utterances}
+
+
+# --- LLM (OpenAI-compatible chat completions) ---
+
+def _canned_override(kind: str) -> Optional[str]:
+    """MOCK_CANNED_DIR/<kind>.json 或 <kind>.txt 存在时原样返回其内容"""
+    canned_dir = os.getenv("MOCK_CANNED_DIR")
+    if not canned_dir:
+        return None
+    for ext in (".json", ".txt"):
+        path = os.path.join(canned_dir, kind + ext)
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                return f.read()
+    return None
+
+
+def _conversation_size(prompt: str) -> int:
+    """分段 prompt 中 "--- Conversation (JSON) ---" 之后的 utterance 数"""
+    body = prompt.split("--- Conversation (JSON) ---", 1)[1].split("\n---", 1)[0].strip()
+    try:
+        return len(json.loads(body))
+    except ValueError:
+        return len(re.findall(r'"index"\s*:', body))
+
+
+def segmentation_output(n: int) -> dict:
+    """每 MOCK_SEGMENT_UTTERANCES 条 utterance 一个 segment，无重叠地覆盖 0..n-1"""
+    size = max(1, MOCK_SEGMENT_UTTERANCES)
+    segments = []
+    for k, start in enumerate(range(0, n, size)):
+        end = min(start + size, n) - 1
+        segments.append({
+            "chunk_range": [start, end],
+            "reason": "Mock segmentation.",
+            "current_title": f"Mock Segment {k + 1}",
+            "summary": f"Mock summary of utterances {start}-{end}.",
+            "main_topic": {"name": "Work", "description": "Mock topic"},
+            "subcategory": {"name": "Meeting", "description": "Mock subcategory"},
+            "hashtags": ["#Mock", "#Benchmark"],
+            "attention_items": [{
+                "type": "To-Do",
+                "description": f"Follow up on segment {k + 1}",
+                "date": "unspecified",
+                "related_people": "SPEAKER_00",
+                "source_text": [start],
+                "temporal": "Atemporal",
+                "valid_from": None,
+                "valid_to": None,
+            }],
+            "suspicious_utterances": [],
+        })
+    relationships = [
+        {
+            "source_event": {"chunk_range": a["chunk_range"]},
+            "target_event": {"chunk_range": b["chunk_range"]},
+            "relationship_type": "follow_up",
+            "confidence": 0.9,
+            "reason": "Mock relationship.",
+        }
+        for a, b in zip(segments, segments[1:])
+    ]
+    return {
+        "segments": segments,
+        "speaker_role": [
+            {"speaker_id": "SPEAKER_00", "name": "unknown", "role_info": "unknown", "other_identity": None},
+            {"speaker_id": "SPEAKER_01", "name": "unknown", "role_info": "unknown", "other_identity": None},
+        ],
+        "named_of_context": [],
+        "event_relationships": relationships,
+    }
+
+
+def plan_output(prompt: str) -> dict:
+    m = re.search(r'User Question: "(.*)"', prompt)
+    keywords = m.group(1) if m else None
+    return {
+        "plan": f"Find all entities with keywords '{keywords}'.",
+        "entities": ["conversation", "segment", "task", "note", "schedule", "reminder", "line"],
+        "keywords": keywords,
+        "time_range": None,
+        "granularity": "coarse",
+    }
+
+
+def chat_output(prompt: str):
+    """(kind, content)：按 prompt 特征选择确定性输出"""
+    if "--- Conversation (JSON) ---" in prompt:
+        kind, value = "segmentation", lambda: segmentation_output(_conversation_size(prompt))
+    elif "SLICES:" in prompt:
+        kind, value = "summary", lambda: {
+            "title": "Mock Conversation Summary Title",
+            "summary": "Mock summary covering goals, decisions, actions and context of the conversation.",
+            "topics": ["mock topic", "benchmark", "load test"],
+        }
+    elif "query planner" in prompt:
+        kind, value = "plan", lambda: plan_output(prompt)
+    elif "related_segments" in prompt:
+        kind, value = "relationship", lambda: {"related_segments": [], "relationship_type": None}
+    else:
+        kind, value = "text", lambda: "Mock response."
+    override = _canned_override(kind)
+    if override is not None:
+        return kind, override
+    content = value()
+    return kind, content if isinstance(content, str) else json.dumps(content, ensure_ascii=False)
+
+
+def _approx_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+async def _chat_completion(request: Request, model: str = None):
+    body = await request.json()
+    messages = body.get("messages") or []
+    prompt = "\n".join(str(m.get("content") or "") for m in messages)
+    kind, content = chat_output(prompt)
+    completion_tokens = _approx_tokens(content)
+    await simulate("LLM", completion_tokens * _setting("MS_PER_TOKEN", "LLM", 0.0) / 1000.0)
+    return {
+        "id": "chatcmpl-" + uuid.uuid4().hex,
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model or body.get("model") or "mock",
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop",
+        }],
+        "usage": {
+            "prompt_tokens": _approx_tokens(prompt),
+            "completion_tokens": completion_tokens,
+            "total_tokens": _approx_tokens(prompt) + completion_tokens,
+        },
+        "mock_kind": kind,
+    }
+
+
+@app.post("/v1/chat/completions")
+async def openai_chat_completions(request: Request):
+    return await _chat_completion(request)
+
+
+@app.post("/openai/deployments/{deployment}/chat/completions")
+async def azure_chat_completions(deployment: str, request: Request):
+    return await _chat_completion(request, deployment)
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency-ms", type=float, help="所有服务的基础延迟，等同 MOCK_LATENCY_MS")
+    parser.add_argument("--error-rate", type=float, help="所有服务的错误率，等同 MOCK_ERROR_RATE")
+    parser.add_argument("--canned-dir", help="覆盖 LLM 输出的目录，等同 MOCK_CANNED_DIR")
+    args = parser.parse_args()
+    for flag, env in ((args.latency_ms, "MOCK_LATENCY_MS"), (args.error_rate, "MOCK_ERROR_RATE"),
+                      (args.canned_dir, "MOCK_CANNED_DIR")):
+        if flag is not None:
+            os.environ[env] = str(flag)
+    uvicorn.run(app, host=args.host, port=args.port)
@@ -0,0 +1,63 @@
+"""
+Parallel analysis: planned windows plus overlap merge must cover every utterance exactly once,
+including overlaps close to or larger than half a window.
+"""
+
+import bisect
+import random
+
+import pytest
+
+from app.workers.algos.analysis_conversation import merge_window_results, plan_analysis_windows
+
+
+class PrefixBoundaries:
+    """Stand-in for ChunkBoundaryFinder: prompt tokens = overhead + utterance tokens."""
+
+    def __init__(self, lengths, max_input_token, overhead=100):
+        self.conversation = [{"start_time": i, "end_time": i} for i in range(len(lengths))]
+        self.prefix = [0]
+        for length in lengths:
+            self.prefix.append(self.prefix[-1] + length)
+        self.max_input_token = max_input_token
+        self.overhead = overhead
+
+    def first_exceeding(self, offset):
+        budget = self.prefix[offset] + self.max_input_token - self.overhead
+        end = bisect.bisect_right(self.prefix, budget, lo=offset + 1) - 1
+        return min(max(end, offset), len(self.conversation))
+
+
+def random_segments(start, end, rng):
+    """A random partition of [start, end] into segments, as a window result."""
+    segments = []
+    lo = start
+    while lo <= end:
+        hi = min(end, lo + rng.randint(0, 8))
+        segments.append({"chunk_range": [lo, hi]})
+        lo = hi + 1
+    return {"segments": segments}
+
+
+@pytest.mark.parametrize("budget,overlap", [(2000, 1500), (2000, 3000), (5000, 3000), (12800, 1500)])
+def test_windows_cover_each_utterance_once(budget, overlap):
+    rng = random.Random(budget * 31 + overlap)
+    for _ in range(200):
+        lengths = [rng.randint(5, 400) for _ in range(rng.randint(1, 300))]
+        boundaries = PrefixBoundaries(lengths, budget)
+        windows = plan_analysis_windows(boundaries, overlap)
+
+        assert windows[0][0] == 0 and windows[-1][1] == len(lengths) - 1
+        for i in range(1, len(windows)):
+            assert windows[i][0] > windows[i - 1][0]
+            assert windows[i][0] <= windows[i - 1][1] + 1
+            if i >= 2:
+                assert windows[i][0] > windows[i - 2][1]
+
+        results = [random_segments(start, end, rng) for start, end in windows]
+        merged = merge_window_results(windows, results, boundaries.conversation)
+        seen = [0] * len(lengths)
+        for seg in merged["segments"]:
+            for idx in range(seg["chunk_range"][0], seg["chunk_range"][1] + 1):
+                seen[idx] += 1
+        assert seen == [1] * len(lengths)
@@ -0,0 +1,22 @@
+"""
+FfmpegWriter must fail loudly (with ffmpeg's stderr) when ffmpeg exits mid-stream, instead of
+silently leaving a truncated output.
+"""
+
+import sys
+
+import numpy as np
+import pytest
+
+from app.workers.algos import audio_io
+
+
+@pytest.mark.parametrize("exit_code", [0, 1])
+def test_ffmpeg_exit_during_write_raises(monkeypatch, tmp_path, exit_code):
+    crash = [sys.executable, "-c", f"import sys; sys.stderr.write('Unknown encoder'); sys.exit({exit_code})"]
+    monkeypatch.setattr(audio_io, "ffmpeg_encode_cmd", lambda *a, **kw: crash)
+    writer = audio_io.FfmpegWriter(str(tmp_path / "out.flac"), 16000, "flac")
+    writer._proc.wait()
+    with pytest.raises(RuntimeError, match="Unknown encoder"):
+        writer.write(np.zeros(16000 * 60, dtype=np.int16))
+    writer.close()  # already finished: no second error
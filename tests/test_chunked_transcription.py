@@ -0,0 +1,71 @@
+"""
+Chunked transcription: per-chunk diarization labels are matched across chunks on the overlap,
+so one person keeps one label and every segment is kept exactly once.
+"""
+
+import random
+
+from app.workers.algos.chunked_transcription import reconcile_chunk_speakers
+
+SPEAKERS = ["alice", "bob", "carol"]
+
+
+def conversation(seconds, rng):
+    """Short turns rotating among all speakers, so everyone talks in every overlap."""
+    segments, t = [], 0.0
+    while t < seconds:
+        order = SPEAKERS[:]
+        rng.shuffle(order)
+        for person in order:
+            length = rng.uniform(1.0, 4.0)
+            segments.append({"start": t, "end": t + length, "text": f"{t:.3f}", "person": person})
+            t += length + rng.uniform(0.0, 0.5)
+    return segments
+
+
+def diarize_chunks(segments, chunks, overlap_sec, rng, label_format="SPEAKER_{:02d}"):
+    """What each chunk request returns: its segments with its own arbitrary speaker labels."""
+    results = []
+    for i, (start, end) in enumerate(chunks):
+        audio_start = start if i == 0 else max(chunks[i - 1][0], start - overlap_sec)
+        labels = [label_format.format(n) for n in range(len(SPEAKERS))]
+        rng.shuffle(labels)
+        names = dict(zip(SPEAKERS, labels))
+        results.append([
+            dict(seg, speaker=names[seg["person"]], words=[{"word": "x", "speaker": names[seg["person"]]}])
+            for seg in segments if audio_start <= (seg["start"] + seg["end"]) / 2 < end
+        ])
+    return results
+
+
+def test_speakers_consistent_across_chunks():
+    for seed in range(20):
+        rng = random.Random(seed)
+        segments = conversation(1000.0, rng)
+        total = segments[-1]["end"]
+        # chunk lengths as plan_chunks produces them: at least chunk_sec, cut wherever a span ends
+        cuts = [0.0]
+        while cuts[-1] + 240.0 < total:
+            cuts.append(cuts[-1] + rng.uniform(120.0, 240.0))
+        cuts.append(total + 1.0)
+        chunks = list(zip(cuts[:-1], cuts[1:]))
+        merged = reconcile_chunk_speakers(diarize_chunks(segments, chunks, 30.0, rng), chunks)
+
+        assert [seg["text"] for seg in merged] == [seg["text"] for seg in segments]
+        label_of = {}
+        for seg in merged:
+            assert label_of.setdefault(seg["person"], seg["speaker"]) == seg["speaker"]
+            assert seg["words"][0]["speaker"] == seg["speaker"]
+        assert len(set(label_of.values())) == len(SPEAKERS)
+
+
+def test_speaker_missing_from_overlap_gets_new_label():
+    chunks = [(0.0, 100.0), (100.0, 200.0)]
+    results = [
+        [{"start": 0.0, "end": 50.0, "speaker": "A"}, {"start": 80.0, "end": 100.0, "speaker": "B"}],
+        # chunk 2 starts 30 s early: its A is the B talking in the overlap, its B is someone new
+        [{"start": 80.0, "end": 100.0, "speaker": "A"}, {"start": 110.0, "end": 150.0, "speaker": "B"},
+         {"start": 150.0, "end": 180.0, "speaker": "A"}],
+    ]
+    merged = reconcile_chunk_speakers(results, chunks)
+    assert [seg["speaker"] for seg in merged] == ["A", "B", "C", "B"]
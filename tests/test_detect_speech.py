@@ -0,0 +1,86 @@
+"""
+Chunked parallel VAD (detect_speech with workers > 1) must give the same speech spans as a
+single pass once both go through merge_and_pad_segments, as in preprocess_audio.
+The VAD model is a frame-energy stub with silero's min_speech / min_silence behaviour.
+"""
+
+import random
+import sys
+import types
+from contextlib import contextmanager
+
+import numpy as np
+import pytest
+
+from app.workers.algos import preprocess_audio as pa
+
+SR = pa.TARGET_SAMPLE_RATE
+FRAME = 160  # 10 ms, divides every chunk and overlap length used below
+
+
+def stub_get_speech_timestamps(x, model, sampling_rate, return_seconds, threshold,
+                               min_speech_duration_ms, min_silence_duration_ms, **options):
+    """Frames above threshold; gaps shorter than min_silence are closed, runs shorter than min_speech dropped."""
+    n = len(x) // FRAME
+    voiced = np.abs(x[:n * FRAME]).reshape(n, FRAME).mean(axis=1) > threshold * 0.1
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], voiced.astype(np.int8), [0]))))
+    runs = [[s, e] for s, e in zip(edges[0::2], edges[1::2])]
+    min_silence = min_silence_duration_ms * sampling_rate / 1000 / FRAME
+    min_speech = min_speech_duration_ms * sampling_rate / 1000 / FRAME
+    merged = []
+    for run in runs:
+        if merged and run[0] - merged[-1][1] < min_silence:
+            merged[-1][1] = run[1]
+        else:
+            merged.append(run)
+    return [{"start": round(s * FRAME / sampling_rate, 1), "end": round(e * FRAME / sampling_rate, 1)}
+            for s, e in merged if e - s >= min_speech]
+
+
+def synthetic_waveform(seconds, rng):
+    """Speech-like bursts, short blips and short pauses over a silent background."""
+    x = np.zeros(int(seconds * SR), dtype=np.float32)
+    t = rng.uniform(0.0, 2.0)
+    while t < seconds:
+        length = rng.choice([rng.uniform(0.1, 0.7), rng.uniform(0.7, 15.0)])
+        s, e = int(t * SR), min(int((t + length) * SR), len(x))
+        x[s:e] = 0.2
+        t += length + rng.choice([rng.uniform(0.05, 0.3), rng.uniform(0.3, 4.0)])
+    return x
+
+
+@pytest.fixture
+def stub_vad(monkeypatch):
+    calls = []
+
+    @contextmanager
+    def acquire():
+        calls.append(1)
+        yield None, stub_get_speech_timestamps
+
+    threads = {"n": 4}
+    torch = types.SimpleNamespace(
+        get_num_threads=lambda: threads["n"],
+        set_num_threads=lambda n: threads.update(n=n),
+    )
+    monkeypatch.setitem(sys.modules, "torch", torch)
+    monkeypatch.setattr(pa, "get_vad_model", lambda: (None, stub_get_speech_timestamps))
+    monkeypatch.setattr(pa, "acquire_vad_model", acquire)
+    return calls
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_chunked_vad_matches_single_pass(stub_vad, seed):
+    rng = random.Random(seed)
+    x = synthetic_waveform(rng.uniform(100.0, 300.0), rng)
+    total = len(x) / SR
+
+    single = pa.merge_and_pad_segments(pa.detect_speech(x, SR, workers=1), total)
+    chunked = pa.merge_and_pad_segments(
+        pa.detect_speech(x, SR, workers=4, chunk_sec=20.0, overlap_sec=2.0), total
+    )
+
+    assert len(stub_vad) == -(-len(x) // (20 * SR))  # one model call per chunk
+    assert len(single) == len(chunked)
+    for (s1, e1), (s2, e2) in zip(single, chunked):
+        assert s1 == pytest.approx(s2) and e1 == pytest.approx(e2)
@@ -0,0 +1,116 @@
+"""
+preprocess_audio_streaming on synthetic PCM with a stub decoder, VAD and writer: the written
+samples must be exactly the source spans recorded in the mapping, and all speech must be kept.
+"""
+
+import random
+
+import numpy as np
+import pytest
+
+from app.workers.algos import preprocess_audio as pa
+
+SR = pa.TARGET_SAMPLE_RATE
+SPEECH_AMPLITUDE = 8000
+
+
+def synthetic_pcm(seconds, rng):
+    """Alternating silence and constant-amplitude "speech" bursts (+1 sample index noise)."""
+    pcm = np.zeros(int(seconds * SR), dtype=np.int16)
+    t = rng.uniform(0.0, 2.0)
+    while t < seconds:
+        length = rng.uniform(0.7, 20.0)
+        s, e = int(t * SR), min(int((t + length) * SR), len(pcm))
+        pcm[s:e] = SPEECH_AMPLITUDE + (np.arange(e - s) % 7)
+        t += length + rng.uniform(0.1, 3.0)
+    return pcm
+
+
+def stub_get_speech_timestamps(x, model, sampling_rate, return_seconds, **options):
+    """Runs of non-silent samples, in seconds rounded to 0.1 like silero with return_seconds."""
+    voiced = np.abs(x) > 0.1
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], voiced.astype(np.int8), [0]))))
+    return [{"start": round(s / sampling_rate, 1), "end": round(e / sampling_rate, 1)}
+            for s, e in zip(edges[0::2], edges[1::2])]
+
+
+class CollectingWriter:
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, pcm):
+        self.chunks.append(np.array(pcm, dtype=np.int16))
+
+    def close(self):
+        pass
+
+
+# seed 40 puts a speech start right at a window boundary, where truncating the trim point to
+# whole samples used to cut into the buffer; seed 177 ends on a burst whose rounded end lies
+# past the end of the audio
+@pytest.mark.parametrize("seed", [*range(10), 40, 177])
+def test_streaming_output_matches_mapping(monkeypatch, tmp_path, seed):
+    rng = random.Random(seed)
+    pcm = synthetic_pcm(rng.uniform(120.0, 260.0), rng)
+    block = int(3.0 * SR)
+    writer = CollectingWriter()
+
+    def blocks(path, sr, block_samples):
+        for i in range(0, len(pcm), block):
+            yield pcm[i:i + block]
+
+    monkeypatch.setattr(pa, "USE_TIME_STRETCH", False)
+    monkeypatch.setattr(pa, "get_vad_model", lambda: (None, stub_get_speech_timestamps))
+    monkeypatch.setattr(pa, "iter_pcm_blocks", blocks)
+    monkeypatch.setattr(pa, "open_audio_writer", lambda *a, **kw: writer)
+
+    mapping, stats = pa.preprocess_audio_streaming(
+        "in.wav", str(tmp_path / "out.wav"), window_sec=30.0, overlap_sec=5.0, block_sec=3.0,
+        bypass_min_savings=0.0
+    )
+
+    assert stats.input_duration == pytest.approx(len(pcm) / SR)
+    written = np.concatenate(writer.chunks) if writer.chunks else np.empty(0, dtype=np.int16)
+    expected = []
+    proc = 0
+    prev_end = 0.0
+    for m in mapping:
+        assert m.orig_start >= prev_end - 1e-9 and m.orig_end >= m.orig_start
+        s, e = round(m.orig_start * SR), round(m.orig_end * SR)
+        expected.append(pcm[s:e])
+        assert m.proc_start == pytest.approx(proc / SR)
+        proc += e - s
+        assert m.proc_end == pytest.approx(proc / SR)
+        prev_end = m.orig_end
+    np.testing.assert_array_equal(written, np.concatenate(expected))
+
+    # every voiced sample is inside an emitted span
+    covered = np.zeros(len(pcm), dtype=bool)
+    for m in mapping:
+        covered[round(m.orig_start * SR):round(m.orig_end * SR)] = True
+    assert not np.any((pcm != 0) & ~covered)
+
+
+def test_streaming_applies_bypass(monkeypatch, tmp_path):
+    pcm = np.full(60 * SR, SPEECH_AMPLITUDE, dtype=np.int16)  # speech throughout: nothing to trim
+    out = tmp_path / "out.wav"
+
+    def blocks(path, sr, block_samples):
+        for i in range(0, len(pcm), block_samples):
+            yield pcm[i:i + block_samples]
+
+    class FileWriter(CollectingWriter):
+        def __init__(self, path):
+            super().__init__()
+            open(path, "wb").close()
+
+    monkeypatch.setattr(pa, "USE_TIME_STRETCH", False)
+    monkeypatch.setattr(pa, "get_vad_model", lambda: (None, stub_get_speech_timestamps))
+    monkeypatch.setattr(pa, "iter_pcm_blocks", blocks)
+    monkeypatch.setattr(pa, "open_audio_writer", lambda path, *a, **kw: FileWriter(path))
+
+    mapping, stats = pa.preprocess_audio_streaming(
+        "in.wav", str(out), window_sec=30.0, overlap_sec=5.0, bypass_min_savings=0.05
+    )
+    assert pa.is_identity_mapping(mapping) and stats.bypassed
+    assert not out.exists()
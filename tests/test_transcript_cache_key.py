@@ -0,0 +1,22 @@
+"""
+Transcript cache keys must differ per backend endpoint, so transcripts from a mock server are
+never served for the real service (and vice versa).
+"""
+
+from app.utils.transcription_client import AssemblyAIClient, WhisperXClient, transcript_cache_key
+
+
+def test_cache_key_includes_endpoint(tmp_path):
+    audio = tmp_path / "a.wav"
+    audio.write_bytes(b"RIFF" + bytes(1000))
+
+    real = WhisperXClient(url="http://whisperx:9000/transcribe")
+    mock = WhisperXClient(url="http://127.0.0.1:8099/transcribe")
+    assert transcript_cache_key(real, str(audio)) != transcript_cache_key(mock, str(audio))
+    assert transcript_cache_key(real, str(audio)) == transcript_cache_key(
+        WhisperXClient(url="http://whisperx:9000/transcribe"), str(audio)
+    )
+
+    assemblyai = AssemblyAIClient(api_key="test")
+    assemblyai_mock = AssemblyAIClient(base_url="http://127.0.0.1:8099", api_key="test")
+    assert transcript_cache_key(assemblyai, str(audio)) != transcript_cache_key(assemblyai_mock, str(audio))